@@ -0,0 +1,274 @@
+import hashlib
+import json
+import re
+import zlib
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+import numpy as np
+
+# MinHash signature length and LSH banding: 32 bands of 4 rows make pairs with a Jaccard similarity of
+# 0.5 candidates with a probability of about 0.87 (0.99 at 0.6), while unrelated entries (similarity
+# below 0.1) practically never share a band; candidates are then checked against the threshold
+NUM_PERM = 128
+LSH_BANDS = 32
+SIMILARITY_THRESHOLD = 0.5
+# Word n-grams: a reworded copy keeps most of them, unrelated entries share almost none
+SHINGLE_SIZE = 2
+
+# Query parameters that only track where a link was shared
+_TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|ref|source)$')
+_DOI = re.compile(r'(10\.\d{4,9}/[^\s?#]+)', re.IGNORECASE)
+_ZENODO_DOI = re.compile(r'^10\.5281/zenodo\.(\d+)$', re.IGNORECASE)
+_ZENODO_RECORD = re.compile(r'^/(?:records?|deposit|uploads?)/(\d+)')
+_WORDS = re.compile(r'\w+')
+
+# Mersenne prime for the universal hash functions of the MinHash permutations
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, (1 << 31) - 1, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, (1 << 31) - 1, NUM_PERM, dtype=np.uint64)
+
+
+def canonical_url(url):
+    """
+    Reduces a URL to a key that is equal for all spellings of the same resource.
+
+    Scheme, 'www.', trailing slashes, fragments and tracking parameters are dropped. DOIs in any form
+    (doi:, doi.org, dx.doi.org or bare) become 'doi:<doi>', and Zenodo records and their DOIs become
+    'zenodo:<record>', so a Zenodo record page and its DOI link are recognized as the same resource.
+
+    Returns:
+        str: The key, or None for empty values.
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None
+    url = unquote(url.strip())
+    doi = None
+    if url.lower().startswith('doi:') or url.startswith('10.'):
+        doi = url.split(':', 1)[1].strip() if url.lower().startswith('doi:') else url
+    parts = urlsplit(url if '//' in url else '//' + url)
+    host = parts.netloc.lower().split('@')[-1].split(':')[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    path = re.sub(r'/+', '/', parts.path).rstrip('/')
+    if doi is None and (host in ('doi.org', 'dx.doi.org') or host.endswith('zenodo.org') and '/doi/' in path):
+        match = _DOI.search(path)
+        doi = match.group(1) if match else None
+    if doi:
+        doi = doi.rstrip('/').lower()
+        zenodo = _ZENODO_DOI.match(doi)
+        return f"zenodo:{zenodo.group(1)}" if zenodo else f"doi:{doi}"
+    if host.endswith('zenodo.org'):
+        record = _ZENODO_RECORD.match(path)
+        if record:
+            return f"zenodo:{record.group(1)}"
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query)
+                             if not _TRACKING_PARAMS.match(key.lower())))
+    return f"{host}{path}" + (f"?{query}" if query else '')
+
+
+def resource_urls(resource):
+    """
+    Returns the canonical keys of all URLs of a resource.
+    """
+    urls = resource.get('url')
+    urls = urls if isinstance(urls, list) else [urls]
+    return sorted({key for key in map(canonical_url, urls) if key})
+
+
+def shingles(resource, size=SHINGLE_SIZE):
+    """
+    Hashes the word shingles of a resource's name and description to 31-bit integers.
+    """
+    words = _WORDS.findall(f"{resource.get('name') or ''} {resource.get('description') or ''}".lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    grams = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) & 0x7fffffff for gram in grams),
+                       dtype=np.uint64, count=len(grams))
+
+
+def minhash(hashes):
+    """
+    Computes the MinHash signature of a set of shingle hashes, one universal hash per permutation.
+    """
+    if not len(hashes):
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def resource_key(resource):
+    """
+    Identifies a resource by its content, so unchanged entries are recognized across versions of the file.
+    """
+    content = json.dumps(resource, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:20]
+
+
+class DuplicateIndex:
+    """
+    Finds resources that are likely the same material as another one.
+
+    Two lookups are combined: resources sharing a canonical URL (see canonical_url) are duplicates, and
+    resources whose name and description shingles have a MinHash-estimated Jaccard similarity of at least
+    the threshold are near-duplicates. Near-duplicate candidates come from LSH buckets, so a lookup
+    touches only the few resources sharing a band with the query instead of the whole catalogue.
+
+    The index is updated incrementally: update() only hashes the entries that are new since the last
+    version of the catalogue and drops the ones that disappeared.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.entries = {}
+        self.by_url = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _add(self, key, resource):
+        hashes = shingles(resource)
+        signature = minhash(hashes)
+        urls = resource_urls(resource)
+        self.entries[key] = {
+            'name': resource.get('name'),
+            'url': resource.get('url'),
+            'urls': urls,
+            'signature': signature,
+            # Entries without any text are only compared by URL
+            'bands': self._band_keys(signature) if len(hashes) else [],
+        }
+        for url in urls:
+            self.by_url.setdefault(url, set()).add(key)
+        for band, band_key in enumerate(self.entries[key]['bands']):
+            self.buckets[band].setdefault(band_key, set()).add(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        for url in entry['urls']:
+            self.by_url[url].discard(key)
+            if not self.by_url[url]:
+                del self.by_url[url]
+        for band, band_key in enumerate(entry['bands']):
+            self.buckets[band][band_key].discard(key)
+            if not self.buckets[band][band_key]:
+                del self.buckets[band][band_key]
+
+    def update(self, resources):
+        """
+        Brings the index in line with the given resources, hashing only new or changed entries.
+
+        Returns:
+            dict: Number of entries 'added' and 'removed'.
+        """
+        current = {}
+        for resource in resources:
+            if isinstance(resource, dict):
+                key = resource_key(resource)
+                # Identical entries are kept apart so they are reported as duplicates of each other
+                occurrence = 1
+                while f"{key}#{occurrence}" in current:
+                    occurrence += 1
+                current[f"{key}#{occurrence}"] = resource
+        removed = [key for key in self.entries if key not in current]
+        for key in removed:
+            self._remove(key)
+        added = [key for key in current if key not in self.entries]
+        for key in added:
+            self._add(key, current[key])
+        return {'added': len(added), 'removed': len(removed)}
+
+    def similarity(self, signature, key):
+        return float(np.mean(self.entries[key]['signature'] == signature))
+
+    def lookup(self, resource, exclude=None):
+        """
+        Finds the indexed resources that duplicate the given one.
+
+        Args:
+            resource (dict): A resource entry, e.g. a new submission.
+            exclude (str): Key of an indexed entry to leave out (the resource itself).
+
+        Returns:
+            list: Matches as dicts with 'name', 'url', 'reason' ('url' or 'similar') and 'similarity',
+            URL matches first, then by decreasing similarity.
+        """
+        matches = {}
+        for url in resource_urls(resource):
+            for key in self.by_url.get(url, ()):
+                matches[key] = ('url', 1.0)
+        hashes = shingles(resource)
+        signature = minhash(hashes)
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(signature) if len(hashes) else []):
+            candidates |= self.buckets[band].get(band_key, set())
+        for key in candidates - matches.keys():
+            similarity = self.similarity(signature, key)
+            if similarity >= self.threshold:
+                matches[key] = ('similar', similarity)
+        matches.pop(exclude, None)
+        return [
+            {'name': self.entries[key]['name'], 'url': self.entries[key]['url'],
+             'reason': reason, 'similarity': round(similarity, 2)}
+            for key, (reason, similarity) in sorted(matches.items(), key=lambda item: (item[1][0] != 'url',
+                                                                                        -item[1][1]))
+        ]
+
+    def report(self):
+        """
+        Groups the whole catalogue into sets of duplicates.
+
+        Entries are grouped transitively: A and C end up together if both duplicate B.
+
+        Returns:
+            list: Groups as dicts with 'reason' ('url' if any pair in the group shares a URL, else
+            'similar'), the lowest pairwise 'similarity' found and the 'items' (name and url), largest
+            groups first.
+        """
+        parent = {}
+
+        def find(key):
+            while parent.get(key, key) != key:
+                key = parent[key]
+            return key
+
+        pairs = {}
+        for keys in self.by_url.values():
+            keys = sorted(keys)
+            for other in keys[1:]:
+                pairs[(keys[0], other)] = ('url', 1.0)
+        for band in self.buckets:
+            for keys in band.values():
+                if len(keys) < 2:
+                    continue
+                keys = sorted(keys)
+                for i, first in enumerate(keys):
+                    for second in keys[i + 1:]:
+                        if (first, second) in pairs:
+                            continue
+                        similarity = self.similarity(self.entries[first]['signature'], second)
+                        if similarity >= self.threshold:
+                            pairs[(first, second)] = ('similar', similarity)
+        groups = {}
+        for first, second in pairs:
+            root, other = find(first), find(second)
+            if root != other:
+                parent[root] = other
+        for (first, second), (reason, similarity) in pairs.items():
+            group = groups.setdefault(find(first), {'keys': set(), 'reason': 'similar', 'similarity': 1.0})
+            group['keys'] |= {first, second}
+            if reason == 'url':
+                group['reason'] = 'url'
+            group['similarity'] = min(group['similarity'], similarity)
+        return sorted(
+            ({'reason': group['reason'], 'similarity': round(group['similarity'], 2),
+              'items': [{'name': self.entries[key]['name'], 'url': self.entries[key]['url']}
+                        for key in sorted(group['keys'], key=lambda key: str(self.entries[key]['name']))]}
+             for group in groups.values()),
+            key=lambda group: (-len(group['items']), group['reason'] != 'url', -group['similarity']))
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Where submissions wait for the worker; on a volume so queued jobs survive restarts. By default next to
+# this module rather than in the working directory
+SUBMISSION_QUEUE_PATH = os.getenv('SUBMISSION_QUEUE_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'submissions.sqlite3'))
+# Submissions arriving within this many seconds of the oldest waiting one go into the same pull request
+SUBMISSION_BATCH_WINDOW = float(os.getenv('SUBMISSION_BATCH_WINDOW', 60))
+SUBMISSION_BATCH_MAX = int(os.getenv('SUBMISSION_BATCH_MAX', 50))
+# A failed batch is retried after base * 2^(attempts - 1) seconds until it has been tried this often
+SUBMISSION_MAX_ATTEMPTS = int(os.getenv('SUBMISSION_MAX_ATTEMPTS', 3))
+SUBMISSION_RETRY_BASE = float(os.getenv('SUBMISSION_RETRY_BASE', 30))
+# Jobs processing for longer than this belong to a worker that died and are queued again
+SUBMISSION_PROCESSING_TIMEOUT = float(os.getenv('SUBMISSION_PROCESSING_TIMEOUT', 600))
+
+QUEUED, PROCESSING, DONE, FAILED = 'queued', 'processing', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    batch_id TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class SubmissionQueue:
+    """
+    Persistent queue of material submissions in a SQLite database.
+
+    Every submission becomes a job that moves from 'queued' through 'processing' to 'done' or 'failed'.
+    Jobs are claimed in batches inside a write transaction, so several worker processes sharing the
+    database never publish the same submission twice.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SUBMISSION_QUEUE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        return _Closing(connection)
+
+    def enqueue(self, payload):
+        """
+        Stores a submission and returns its job ID.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload), now, now))
+        return job_id
+
+    def get(self, job_id):
+        """
+        Returns the state of a job as a dict, or None for unknown IDs.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'created_at': _timestamp(row['created_at']),
+            'updated_at': _timestamp(row['updated_at']),
+            'attempts': row['attempts'],
+            'batch_id': row['batch_id'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+        }
+
+    def claim_batch(self, window=SUBMISSION_BATCH_WINDOW, limit=SUBMISSION_BATCH_MAX):
+        """
+        Claims the waiting jobs once the oldest of them has waited for the batch window.
+
+        Args:
+            window (float): Seconds the oldest job waits for further submissions to join its batch.
+            limit (int): Maximum number of jobs in one batch.
+
+        Returns:
+            tuple: (batch ID, list of (job ID, payload)), or (None, []) if no batch is due.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = connection.execute(
+                    "SELECT id, payload, created_at FROM jobs WHERE status = ? AND not_before <= ? "
+                    "ORDER BY created_at LIMIT ?", (QUEUED, now, limit)).fetchall()
+                if not rows or now - rows[0]['created_at'] < window and len(rows) < limit:
+                    connection.execute("COMMIT")
+                    return None, []
+                batch_id = uuid.uuid4().hex[:12]
+                connection.executemany(
+                    "UPDATE jobs SET status = ?, batch_id = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(PROCESSING, batch_id, now, row['id']) for row in rows])
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return batch_id, [(row['id'], json.loads(row['payload'])) for row in rows]
+
+    def complete(self, job_ids, result):
+        """
+        Marks the jobs of a batch as done with the published result (e.g. the pull request URL).
+        """
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                [(DONE, json.dumps(result), time.time(), job_id) for job_id in job_ids])
+
+    def fail(self, job_ids, error, max_attempts=SUBMISSION_MAX_ATTEMPTS, retry_base=SUBMISSION_RETRY_BASE):
+        """
+        Records a failed batch; jobs with attempts left are queued again after a backoff.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            for job_id in job_ids:
+                attempts = connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                if attempts < max_attempts:
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, error = ?, not_before = ?, updated_at = ? WHERE id = ?",
+                        (QUEUED, str(error), now + retry_base * 2 ** (attempts - 1), now, job_id))
+                else:
+                    connection.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                                       (FAILED, str(error), now, job_id))
+
+    def requeue_stale(self, older_than):
+        """
+        Returns jobs stuck in 'processing' (their worker died) to the queue.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, PROCESSING, now - older_than))
+        return cursor.rowcount
+
+    def counts(self):
+        """
+        Returns the number of jobs per status.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class SubmissionWorker(threading.Thread):
+    """
+    Background thread that publishes the queued submissions in batches.
+
+    Args:
+        queue (SubmissionQueue): The queue to work on.
+        publish (callable): Called with the list of payloads of one batch; returns a JSON-serializable
+            result stored with every job of the batch, and raises if publishing failed.
+        window (float): Batch window, see SubmissionQueue.claim_batch.
+        poll_interval (float): Seconds between checks for due batches.
+    """
+
+    def __init__(self, queue, publish, window=SUBMISSION_BATCH_WINDOW, poll_interval=1.0):
+        super().__init__(name='submission-worker', daemon=True)
+        self.queue = queue
+        self.publish = publish
+        self.window = window
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                requeued = self.queue.requeue_stale(SUBMISSION_PROCESSING_TIMEOUT)
+                if requeued:
+                    logger.warning(f"Requeued {requeued} submissions whose worker stopped while publishing")
+                if self.process_batch():
+                    continue
+            except Exception as e:
+                logger.error(f"Error in submission worker: {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def process_batch(self):
+        """
+        Publishes one due batch, if any.
+
+        Returns:
+            bool: Whether a batch was processed.
+        """
+        batch_id, jobs = self.queue.claim_batch(self.window)
+        if not jobs:
+            return False
+        job_ids = [job_id for job_id, _ in jobs]
+        try:
+            result = self.publish([payload for _, payload in jobs])
+        except Exception as e:
+            logger.error(f"Error publishing submission batch {batch_id} ({len(jobs)} submissions): {e}")
+            self.queue.fail(job_ids, e)
+        else:
+            logger.info(f"Published submission batch {batch_id} with {len(jobs)} submissions")
+            self.queue.complete(job_ids, result)
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class _Closing:
+    """
+    Context manager closing a SQLite connection on exit (sqlite3's own only ends transactions).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, *exc):
+        self.connection.close()
+
+
+def _timestamp(value):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(value))
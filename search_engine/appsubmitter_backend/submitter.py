@@ -1,55 +1,107 @@
 import os
-import yaml
 import time
 import datetime
-import requests  
-import pandas as pd
+import threading
 from pathlib import Path
 from github import Github
 from flask_cors import CORS
 from flask import Flask, request, jsonify
+from common.snapshot import SnapshotSource
+from common.facets import count_values
+from common.http_cache import cached_response, strong_etag
+from common.metrics import register_metrics, span
+from common.serving import on_worker_start
+from duplicates import DuplicateIndex, resource_urls
+from submission_queue import SubmissionQueue, SubmissionWorker
 
 app = Flask(__name__)
 CORS(app) 
 
-# GitHub raw URL for the latest version of nfdi4bioimage.yml
-github_url = 'https://raw.githubusercontent.com/NFDI4BIOIMAGE/training/refs/heads/main/resources/nfdi4bioimage.yml'
+# Request latencies and resource fetch times in Prometheus format at /metrics
+register_metrics(app, 'submitter')
 
-def download_yaml_file():
-    """
-    Download the latest YAML file from GitHub.
-    """
-    try:
-        response = requests.get(github_url)
-        response.raise_for_status()
-        yaml_content = response.text
-        app.logger.info("Downloaded the latest YAML file from GitHub")
-        return yaml.safe_load(yaml_content) 
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"Error downloading the YAML file: {e}")
-        return None
+# Normalized resources of the current snapshot written by the ingestion command (common/ingest.py)
+resource_source = SnapshotSource()
 
 def all_content():
     """
-    Load all YAML data from GitHub into a list of dictionaries.
+    Load all resources of the current snapshot into a list of dictionaries.
     """
     try:
-        resources = []
-        yaml_data = download_yaml_file()
-        if yaml_data and 'resources' in yaml_data:
-            resources.extend(yaml_data['resources'])
-        else:
+        resources = resource_source.resources()
+        if not resources:
             app.logger.warning("No 'resources' key found in the YAML file.")
-        app.logger.info(f"All content loaded: {resources}")
+        app.logger.info(f"All content loaded: {len(resources)} resources")
         return {'resources': resources}
     except Exception as e:
-        app.logger.error(f"Error loading content from GitHub: {e}")
+        app.logger.error(f"Error loading the resources: {e}")
         return {'resources': []}  # Return empty list in case of error
 
+# Facet vocabulary of the YAML file, recomputed only when its content hash changes
+_vocabulary = {'hash': None, 'values': None}
+_vocabulary_lock = threading.Lock()
+
+def facet_vocabulary(resources):
+    """
+    Returns the values of tags, types and licenses with the number of resources carrying each.
+
+    The counts are computed once per version of the YAML file (identified by its content hash)
+    and served from memory until the file changes.
+    """
+    content_hash = resource_source.content_hash
+    with _vocabulary_lock:
+        if _vocabulary['values'] is None or _vocabulary['hash'] != content_hash:
+            values = count_values(resources, ('tags', 'type', 'license'))
+            # Resources without a type have always been offered as 'Unknown'
+            untyped = sum(1 for item in resources if isinstance(item, dict) and not isinstance(item.get('type'), (str, list)))
+            if untyped:
+                values['type'].append({'key': 'Unknown', 'doc_count': untyped})
+            _vocabulary['values'] = values
+            _vocabulary['hash'] = content_hash
+        return _vocabulary['values']
+
+# Duplicate index of the YAML file, updated incrementally whenever its content hash changes
+duplicate_index = DuplicateIndex()
+_duplicates = {'hash': None, 'report': None}
+_duplicates_lock = threading.Lock()
+
+def current_duplicate_index():
+    """
+    Returns the duplicate index after bringing it up to date with the current version of the YAML file.
+
+    Only entries added or changed since the previous version are hashed. If the file cannot be loaded,
+    the index of the last loaded version is kept.
+    """
+    resources = all_content()['resources']
+    content_hash = resource_source.content_hash
+    with _duplicates_lock:
+        if resources and _duplicates['hash'] != content_hash:
+            changes = duplicate_index.update(resources)
+            app.logger.info(f"Duplicate index updated: {changes['added']} added, {changes['removed']} removed")
+            _duplicates['hash'] = content_hash
+            _duplicates['report'] = None
+    return duplicate_index
+
+@app.route('/api/duplicates', methods=['GET'])
+def get_duplicates():
+    """
+    Reports the groups of catalogue entries that share a URL or have near-identical names and descriptions.
+    """
+    try:
+        index = current_duplicate_index()
+        with _duplicates_lock:
+            if _duplicates['report'] is None:
+                _duplicates['report'] = index.report()
+            groups = _duplicates['report']
+        return jsonify({'groups': groups, 'total': len(groups), 'resources': len(index)})
+    except Exception as e:
+        app.logger.error(f"Error building the duplicate report: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/get_unique_values', methods=['GET'])
 def get_unique_values_from_yamls():
     """
-    Get unique tags, types, and licenses from YAML files using pandas for data processing.
+    Get unique tags, types, and licenses from the YAML file, with the number of resources per value in 'counts'.
     """
     app.logger.info(f"Loading resources from GitHub")
 
@@ -57,34 +109,29 @@ def get_unique_values_from_yamls():
 
     if not content['resources']:
         app.logger.warning("No resources found in the YAML files.")
-        return jsonify({'tags': [], 'types': [], 'licenses': []})
-
-    df = pd.DataFrame(content['resources'])
-
-    # Handle cases where 'tags', 'type', and 'license' might not be present or not lists
-    df['tags'] = df['tags'].apply(lambda x: x if isinstance(x, list) else [])
-    df['type'] = df['type'].apply(lambda x: [x] if isinstance(x, str) else x if isinstance(x, list) else ['Unknown'])
-    df['license'] = df['license'].apply(lambda x: [x] if isinstance(x, str) else x if isinstance(x, list) else [])
-
-    # Extract unique values
-    unique_tags = sorted(set(tag for sublist in df['tags'] for tag in sublist))
-    unique_types = sorted(set(t for sublist in df['type'] for t in sublist))
-    unique_licenses = sorted(set(l for sublist in df['license'] for l in sublist))
+        return jsonify({'tags': [], 'types': [], 'licenses': [], 'counts': {}})
 
-    app.logger.info(f"Unique Tags: {unique_tags}")
-    app.logger.info(f"Unique Types: {unique_types}")
-    app.logger.info(f"Unique Licenses: {unique_licenses}")
+    vocabulary = facet_vocabulary(content['resources'])
 
     return jsonify({
-        'tags': unique_tags,
-        'types': unique_types,
-        'licenses': unique_licenses
+        'tags': sorted(item['key'] for item in vocabulary['tags']),
+        'types': sorted(item['key'] for item in vocabulary['type']),
+        'licenses': sorted(item['key'] for item in vocabulary['license']),
+        'counts': {
+            'tags': {item['key']: item['doc_count'] for item in vocabulary['tags']},
+            'types': {item['key']: item['doc_count'] for item in vocabulary['type']},
+            'licenses': {item['key']: item['doc_count'] for item in vocabulary['license']},
+        }
     })
 
 @app.route('/api/materials', methods=['GET'])
 def get_materials():
     """
     Endpoint to fetch all materials.
+
+    The response carries an ETag of the snapshot's content hash, so clients revalidating with
+    If-None-Match get a 304 until the resources change; the serialized and compressed bodies are
+    built once per snapshot and then served from memory.
     """
     app.logger.info(f"Loading materials from GitHub")
     
@@ -95,8 +142,10 @@ def get_materials():
         return jsonify([]) 
     
     materials = content['resources']
+    content_hash = resource_source.content_hash
+    etag = strong_etag('materials', content_hash) if content_hash else None
     
-    return jsonify(materials)
+    return cached_response(etag, lambda: materials)
 
 def get_github_repository(repository):
     """
@@ -111,79 +160,195 @@ def get_github_repository(repository):
 
     return g.get_repo(repository)
 
+# Repository and file that submissions are proposed to
+SUBMISSION_REPOSITORY = "NFDI4BIOIMAGE/training"
+SUBMISSION_YAML_FILE = 'nfdi4bioimage.yml'
+
 @app.route('/api/submit_material', methods=['POST'])
 def submit_material():
-    data = request.json
-    authors = data.get('authors')
-    license = data.get('license')
-    name = data.get('name')
-    description = data.get('description')
+    """
+    Queues a material submission and returns its job ID immediately.
+
+    A background worker proposes the queued submissions to the training repository, combining those
+    received within SUBMISSION_BATCH_WINDOW seconds into one pull request. Poll
+    /api/submissions/<job_id> for the outcome.
+
+    Submissions with the URL of a catalogued material are rejected with 409. Those resembling catalogued
+    materials are accepted, and the similar entries are listed in the response and the pull request.
+    """
+    data = request.json or {}
     num_downloads = data.get('num_downloads', '')
-    publication_date = data.get('publication_date', '')
-    tags = data.get('tags')
-    type_ = data.get('type')
-    url = data.get('url')
 
-    if num_downloads and int(num_downloads) < 0:
-        return jsonify({"error": "Number of downloads cannot be negative"}), 400
-    
-    # Set the yaml file as default
-    yaml_file = 'nfdi4bioimage.yml'
-    repo = get_github_repository("NFDI4BIOIMAGE/training")
     try:
-        create_pull_request(repo, yaml_file, authors, license, name, description, num_downloads, publication_date, tags, type_, url)
-        return jsonify({"message": "Pull request created successfully"}), 201
+        if num_downloads and int(num_downloads) < 0:
+            return jsonify({"error": "Number of downloads cannot be negative"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Number of downloads must be an integer"}), 400
+
+    fields = ('authors', 'license', 'name', 'description', 'num_downloads', 'publication_date', 'tags', 'type', 'url')
+    submission = {field: data.get(field) for field in fields}
+    submission['submission_date'] = datetime.datetime.now().strftime('%Y-%m-%d')
+
+    index = current_duplicate_index()
+    with _duplicates_lock:
+        duplicates = index.lookup(submission)
+    same_url = [match for match in duplicates if match['reason'] == 'url']
+    if same_url:
+        return jsonify({"error": "This material is already in the catalogue", "duplicates": same_url}), 409
+    if duplicates:
+        submission['possible_duplicates'] = duplicates
+
+    try:
+        job_id = current_submission_queue().enqueue(submission)
     except Exception as e:
+        app.logger.error(f"Error queueing submission: {e}")
         return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "message": "Submission queued",
+        "job_id": job_id,
+        "status_url": f"/api/submissions/{job_id}",
+        "possible_duplicates": duplicates,
+    }), 202
+
+@app.route('/api/submissions/<job_id>', methods=['GET'])
+def submission_status(job_id):
+    """
+    Reports the state of a queued submission: queued, processing, done (with the pull request) or failed.
+    """
+    job = current_submission_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown submission"}), 404
+    return jsonify(job)
+
+def format_entry(submission):
+    """
+    Formats a submission as a YAML list entry with only the non-empty fields.
+    """
+    authors = submission.get('authors')
+    license = submission.get('license')
+    tags = submission.get('tags')
+    type_ = submission.get('type')
+    url = submission.get('url')
+
+    entry = f"- authors: {authors}\n"
+    if submission.get('description'):
+        entry += f"  description: {submission['description']}\n"
+    if license:
+        entry += f"  license: {license if not isinstance(license, list) else ', '.join(license)}\n"
+    entry += f"  name: {submission.get('name')}\n"
+    if submission.get('publication_date'):
+        entry += f"  publication_date: {submission['publication_date']}\n"
+    if tags:
+        entry += f"  tags: {', '.join(tags)}\n"
+    if type_:
+        entry += f"  type: {', '.join(type_)}\n"
+    entry += f"  submission_date: {submission['submission_date']}\n"
+    if url:
+        if isinstance(url, list):
+            url = ''.join(f"\n  - {item}" for item in url)
+        entry += f"  url: {url}\n"
+    return entry.strip()
+
+def create_pull_request(repo, yaml_file, submissions):
+    """
+    Appends a batch of submissions to the YAML file on a new branch and opens one pull request for them.
+
+    Args:
+        repo: The GitHub repository (a PyGithub Repository or an object with the same methods).
+        yaml_file (str): Name of the file in the repository's resources folder.
+        submissions (list): Submissions as queued by submit_material.
 
-def create_pull_request(repo, yaml_file, authors, license, name, description, num_downloads, publication_date, tags, type_, url):
+    Returns:
+        dict: The pull request URL, the branch and the number of entries added.
+    """
     try:
         file_path = f"resources/{yaml_file}"
         file_contents = repo.get_contents(file_path)
         yaml_content = file_contents.decoded_content.decode('utf-8')
 
-        # Preserve original YAML content as is (no re-dumping)
-        original_content_lines = yaml_content.splitlines()
-
-        # Get the current date in yyyy-mm-dd format
-        submission_date = datetime.datetime.now().strftime('%Y-%m-%d')
-
-        # Prepare the new entry with only non-empty fields
-        new_entry = f"- authors: {authors}\n"
-        if description:
-            new_entry += f"  description: {description}\n"
-        if license:
-            new_entry += f"  license: {license if not isinstance(license, list) else ', '.join(license)}\n"
-        new_entry += f"  name: {name}\n"
-        if publication_date:
-            new_entry += f"  publication_date: {publication_date}\n"
-        if tags:
-            new_entry += f"  tags: {', '.join(tags)}\n"
-        if type_:
-            new_entry += f"  type: {', '.join(type_)}\n"
-        new_entry += f"  submission_date: {submission_date}\n"
-        if url:
-            new_entry += f"  url: {url if not isinstance(url, list) else '\n  - ' + '\n  - '.join(url)}\n"
-
-        # Append the new entry at the end of the file
-        original_content_lines.append(new_entry.strip())
-
-        # Combine everything back into the final content (no YAML dumping)
-        new_yaml_content = "\n".join(original_content_lines)
+        # Preserve original YAML content as is (no re-dumping) and append the new entries at the end
+        content_lines = yaml_content.splitlines()
+        content_lines += [format_entry(submission) for submission in submissions]
+        new_yaml_content = "\n".join(content_lines)
 
         base_branch = repo.get_branch("main")
         timestamp = int(time.time())
         branch_name = f"update-{yaml_file.split('.')[0]}-{timestamp}".replace(' ', '-')
         repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=base_branch.commit.sha)
-        repo.update_file(file_path, f"Add new entry", new_yaml_content, file_contents.sha, branch=branch_name)
+
+        count = len(submissions)
+        names = "\n".join(describe_submission(submission) for submission in submissions)
+        repo.update_file(file_path, f"Add {count} new {'entry' if count == 1 else 'entries'}",
+                         new_yaml_content, file_contents.sha, branch=branch_name)
 
         pr_title = f"Add new training materials request to {yaml_file}"
-        pr_body = "Added new training materials."
-        repo.create_pull(title=pr_title, body=pr_body, head=branch_name, base='main')
+        pr_body = f"Added new training materials:\n\n{names}"
+        pull = repo.create_pull(title=pr_title, body=pr_body, head=branch_name, base='main')
+        return {'pull_request': getattr(pull, 'html_url', None), 'branch': branch_name, 'entries': count}
 
     except Exception as e:
         raise Exception(f"Failed to update YAML file and create pull request: {e}")
 
+def describe_submission(submission):
+    """
+    Lists a submission in the pull request body, with the catalogued entries it resembles for the reviewers.
+    """
+    line = f"- {submission.get('name')}"
+    for match in submission.get('possible_duplicates', []):
+        line += f"\n  - possible duplicate of \"{match['name']}\" ({match['url']}), similarity {match['similarity']}"
+    return line
+
+def publish_submissions(submissions):
+    """
+    Publishes one batch of queued submissions as a pull request to the training repository.
+
+    Submissions whose URL reached the catalogue after they were queued, or that repeat the URL of an
+    earlier submission in the batch, are skipped.
+    """
+    index = current_duplicate_index()
+    accepted, skipped, batch_urls = [], [], set()
+    with _duplicates_lock:
+        for submission in submissions:
+            urls = set(resource_urls(submission))
+            if urls & batch_urls or any(match['reason'] == 'url' for match in index.lookup(submission)):
+                skipped.append(submission.get('name'))
+                continue
+            batch_urls |= urls
+            accepted.append(submission)
+    if skipped:
+        app.logger.warning(f"Skipped {len(skipped)} duplicate submissions: {skipped}")
+    if not accepted:
+        return {'pull_request': None, 'entries': 0, 'skipped': skipped}
+    with span('publish', entries=len(accepted)):
+        repo = get_github_repository(SUBMISSION_REPOSITORY)
+        return {**create_pull_request(repo, SUBMISSION_YAML_FILE, accepted), 'skipped': skipped}
+
+# Queued submissions and the worker turning them into pull requests, created on first use so that
+# importing the submitter does not create the database
+_submissions = {'queue': None, 'worker': None}
+_submissions_lock = threading.Lock()
+
+def current_submission_queue():
+    """
+    Returns the submission queue, opening its database and creating its worker on the first call.
+    """
+    with _submissions_lock:
+        if _submissions['queue'] is None:
+            _submissions['queue'] = SubmissionQueue()
+            _submissions['worker'] = SubmissionWorker(_submissions['queue'], publish_submissions)
+        return _submissions['queue']
+
+def start_submission_worker():
+    current_submission_queue()
+    _submissions['worker'].start()
+
+# In every worker before it serves: start publishing, and load the snapshot and its duplicate index.
+# Each worker runs its own submission worker; claiming batches in a transaction keeps them apart
+@on_worker_start
+def warm_up():
+    start_submission_worker()
+    current_duplicate_index()
 
 if __name__ == '__main__':
+    start_submission_worker()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1 @@
+# Benchmarks for the search engine services, run against local stand-ins for Elasticsearch and the LLM.
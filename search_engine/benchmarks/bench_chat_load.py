@@ -0,0 +1,138 @@
+"""
+Load test of the chatbot against a stand-in LLM with injected latency and failures.
+
+Three scenarios run against one chatbot process:
+  steady    - as many concurrent clients as generation slots; throughput and tail latency
+  overload  - far more clients than slots plus queue; excess requests must be rejected fast (429/503)
+  failing   - the LLM answers 503 to everything; retries, then the circuit breaker rejects fast
+
+Every request asks a distinct question so that the answer cache does not hide the LLM.
+
+Usage:
+    python -m benchmarks.bench_chat_load --clients 8 --duration 10
+
+Run from the search_engine directory.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from elasticsearch import Elasticsearch
+from werkzeug.serving import make_server
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.llm_stub import LLMStub
+from benchmarks.synthetic import generate_resources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'search', 'backend'))
+from reindex import reindex  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)], 1)
+
+
+def run_load(url, clients, duration, questions):
+    """
+    Runs closed-loop clients for the given duration and reports throughput and latencies per status.
+    """
+    results = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            question = next(questions)
+            started = time.perf_counter()
+            try:
+                status = session.post(url, json={'query': question}, timeout=300).status_code
+            except requests.RequestException:
+                status = 'error'
+            with lock:
+                results.append((status, (time.perf_counter() - started) * 1000))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    elapsed = time.perf_counter() - started
+
+    report = {'clients': clients, 'seconds': round(elapsed, 2), 'requests': len(results),
+              'status': dict(Counter(str(status) for status, _ in results))}
+    ok = sorted(latency for status, latency in results if status == 200)
+    rejected = sorted(latency for status, latency in results if status in (429, 503))
+    report['ok_per_second'] = round(len(ok) / elapsed, 2)
+    report['ok_latency_ms'] = {'p50': percentile(ok, 0.5), 'p95': percentile(ok, 0.95),
+                               'p99': percentile(ok, 0.99), 'max': round(ok[-1], 1) if ok else None}
+    report['rejected_latency_ms'] = {'p50': percentile(rejected, 0.5), 'p99': percentile(rejected, 0.99),
+                                     'mean': round(statistics.mean(rejected), 1) if rejected else None}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients in the steady scenario')
+    parser.add_argument('--overload-clients', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--first-token-delay', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.01)
+    parser.add_argument('--tokens', type=int, default=100)
+    parser.add_argument('--max-concurrency', type=int, default=8)
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--queue-timeout', type=float, default=5)
+    parser.add_argument('--query', default='napari segmentation tutorial')
+    args = parser.parse_args()
+
+    with ElasticsearchStub(latency=0) as es_stub, \
+            LLMStub(args.first_token_delay, args.token_delay, args.tokens) as llm:
+        reindex(Elasticsearch(es_stub.url), list(generate_resources(args.docs)), force_rebuild=True)
+
+        host, port = es_stub.url.rsplit('//', 1)[1].split(':')
+        os.environ.update(
+            ELASTICSEARCH_HOST=host, ELASTICSEARCH_PORT=port, KISSKI_API_BASE=llm.url, KISSKI_API_KEY='benchmark',
+            LLM_MAX_CONCURRENCY=str(args.max_concurrency), LLM_MAX_QUEUE=str(args.max_queue),
+            LLM_QUEUE_TIMEOUT=str(args.queue_timeout), LLM_BACKOFF_BASE='0.1', BREAKER_RESET_TIMEOUT='60',
+        )
+        sys.path.insert(0, os.path.join(ROOT, 'chatbot'))
+        import chatbot
+
+        server = make_server('127.0.0.1', 0, chatbot.app, threaded=True)
+        server.request_queue_size = 256
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/api/chat"
+        ideal = args.max_concurrency / (args.first_token_delay + args.token_delay * (args.tokens - 1))
+        report = {'llm': {'first_token_delay_s': args.first_token_delay, 'token_delay_s': args.token_delay,
+                          'tokens': args.tokens},
+                  'admission': {'max_concurrency': args.max_concurrency, 'max_queue': args.max_queue,
+                                'queue_timeout_s': args.queue_timeout},
+                  'ideal_ok_per_second': round(ideal, 2)}
+        # Shared by all scenarios so that no question is ever asked twice
+        questions = (f"{args.query} {number}" for number in itertools.count())
+        try:
+            report['steady'] = run_load(url, args.clients, args.duration, questions)
+            report['steady']['upstream_connections'] = llm.connections
+            report['overload'] = run_load(url, args.overload_clients, args.duration, questions)
+            llm.error_rate = 1.0
+            report['failing'] = run_load(url, args.clients, min(args.duration, 5), questions)
+            report['failing']['upstream_requests'] = llm.failed
+            report['llm_stats'] = chatbot.llm_util.stats()
+        finally:
+            server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
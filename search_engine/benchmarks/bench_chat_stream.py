@@ -0,0 +1,123 @@
+"""
+Measures time-to-first-token of the chatbot with and without streaming, and checks that a client
+disconnecting from a stream stops the upstream generation.
+
+The chatbot runs in-process against stand-ins for Elasticsearch and the OpenAI-compatible LLM endpoint.
+
+Usage:
+    python -m benchmarks.bench_chat_stream --first-token-delay 0.5 --token-delay 0.02 --tokens 200
+
+Run from the search_engine directory.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+from elasticsearch import Elasticsearch
+from werkzeug.serving import make_server
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.llm_stub import LLMStub
+from benchmarks.synthetic import generate_resources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'search', 'backend'))
+from reindex import reindex  # noqa: E402
+
+
+def iter_events(response):
+    """Parses a server-sent event stream into (event, data) tuples."""
+    event, data = 'message', []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].strip())
+        elif not line and data:
+            yield event, json.loads('\n'.join(data))
+            event, data = 'message', []
+
+
+def measure_blocking(url, query):
+    started = time.perf_counter()
+    response = requests.post(url, json={'query': query}, timeout=120)
+    response.raise_for_status()
+    elapsed = (time.perf_counter() - started) * 1000
+    return {'sources_ms': round(elapsed, 1), 'first_token_ms': round(elapsed, 1), 'total_ms': round(elapsed, 1)}
+
+
+def measure_streaming(url, query):
+    started = time.perf_counter()
+    marks = {}
+    with requests.post(url, json={'query': query, 'stream': True}, stream=True, timeout=120) as response:
+        response.raise_for_status()
+        for event, data in iter_events(response):
+            elapsed = round((time.perf_counter() - started) * 1000, 1)
+            if event == 'sources':
+                marks['sources_ms'] = elapsed
+            elif event == 'token':
+                marks.setdefault('first_token_ms', elapsed)
+            elif event == 'done':
+                marks['total_ms'] = elapsed
+                marks['server_timing'] = data['timing']
+    return marks
+
+
+def check_cancellation(url, query, llm):
+    """Reads the first token of a stream, disconnects and reports how far the stand-in LLM got."""
+    before = llm.generated_tokens
+    with requests.post(url, json={'query': query, 'stream': True}, stream=True, timeout=120) as response:
+        for event, _ in iter_events(response):
+            if event == 'token':
+                break
+    # Give the server time to notice the disconnect on its next write
+    time.sleep(max(llm.token_delay * 10, 0.5))
+    return {
+        'cancelled_upstream': llm.cancelled,
+        'generated_tokens': llm.generated_tokens - before,
+        'max_tokens': llm.tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--first-token-delay', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--query', default='napari segmentation tutorial')
+    args = parser.parse_args()
+
+    with ElasticsearchStub(latency=0) as es_stub, \
+            LLMStub(args.first_token_delay, args.token_delay, args.tokens) as llm:
+        reindex(Elasticsearch(es_stub.url), list(generate_resources(args.docs)), force_rebuild=True)
+
+        host, port = es_stub.url.rsplit('//', 1)[1].split(':')
+        os.environ.update(ELASTICSEARCH_HOST=host, ELASTICSEARCH_PORT=port,
+                          KISSKI_API_BASE=llm.url, KISSKI_API_KEY='benchmark')
+        sys.path.insert(0, os.path.join(ROOT, 'chatbot'))
+        import chatbot
+
+        server = make_server('127.0.0.1', 0, chatbot.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/api/chat"
+        try:
+            report = {
+                'llm': {'first_token_delay_s': args.first_token_delay, 'token_delay_s': args.token_delay,
+                        'tokens': args.tokens},
+                # Distinct questions, so that no measurement is answered from the chat cache
+                'blocking': measure_blocking(url, f"{args.query} (blocking)"),
+                'streaming': measure_streaming(url, f"{args.query} (streaming)"),
+                'disconnect': check_cancellation(url, f"{args.query} (disconnect)", llm),
+            }
+        finally:
+            server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Measures the duplicate detection of the submitter: build and update time, lookup latency and accuracy.
+
+A synthetic catalogue is indexed, then three kinds of submissions are looked up:
+- URL variants of catalogued entries (DOI link instead of the Zenodo record, trailing slash, www.),
+- near-duplicates: a catalogued entry with a few words of its name and description changed,
+- fresh entries that are not in the catalogue.
+Recall is the share of variants and near-duplicates whose original is found, the false positive rate
+the share of fresh entries reported as duplicates of anything.
+
+Usage:
+    python -m benchmarks.bench_duplicates --docs 100000 --lookups 1000
+
+Run from the search_engine directory.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.synthetic import WORDS, generate_resource, generate_resources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'appsubmitter_backend'))
+from duplicates import DuplicateIndex  # noqa: E402
+
+
+def url_variant(resource, rng):
+    record = resource['url'].rsplit('/', 1)[1]
+    return {**resource, 'url': rng.choice([
+        f"https://doi.org/10.5281/zenodo.{record}",
+        f"http://www.zenodo.org/records/{record}/",
+        f"https://zenodo.org/record/{record}?utm_source=newsletter",
+    ]), 'name': f"Other title {rng.random()}", 'description': ''}
+
+
+def reword(text, rng, changes):
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return ' '.join(words)
+
+
+def near_duplicate(resource, rng):
+    return {**copy.deepcopy(resource), 'url': f"https://example.org/mirror/{rng.random()}",
+            'name': reword(resource['name'], rng, 1), 'description': reword(resource['description'], rng, 2)}
+
+
+def timed_lookups(index, submissions):
+    latencies, found = [], []
+    for submission, expected in submissions:
+        started = time.perf_counter()
+        matches = index.lookup(submission)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append(any(match['name'] == expected for match in matches) if expected else bool(matches))
+    latencies.sort()
+    return {
+        'rate': round(sum(found) / len(found), 3),
+        'latency_ms': {'p50': round(statistics.median(latencies), 3),
+                       'p95': round(latencies[int(len(latencies) * 0.95) - 1], 3)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    resources = list(generate_resources(args.docs))
+    index = DuplicateIndex()
+    started = time.perf_counter()
+    index.update(resources)
+    build_s = time.perf_counter() - started
+
+    # A new version of the file with 1% of the entries edited
+    edited = list(resources)
+    for position in rng.sample(range(len(edited)), max(1, len(edited) // 100)):
+        edited[position] = {**edited[position], 'description': edited[position]['description'] + ' updated'}
+    started = time.perf_counter()
+    changes = index.update(edited)
+    update_s = time.perf_counter() - started
+
+    originals = rng.sample(edited, args.lookups)
+    fresh_rng = random.Random(99)
+    report = {
+        'docs': args.docs,
+        'build_s': round(build_s, 2),
+        'update_1pct_s': round(update_s, 3),
+        'update_changes': changes,
+        'url_variants': timed_lookups(index, [(url_variant(item, rng), item['name']) for item in originals]),
+        'near_duplicates': timed_lookups(index, [(near_duplicate(item, rng), item['name']) for item in originals]),
+        'fresh_false_positives': timed_lookups(
+            index, [(generate_resource(fresh_rng, args.docs + number), None) for number in range(args.lookups)]),
+    }
+    started = time.perf_counter()
+    groups = index.report()
+    report['report'] = {'groups': len(groups), 'seconds': round(time.perf_counter() - started, 2)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares one-request-per-document indexing with the bulk ingest pipeline of the search backend.
+
+Usage:
+    python -m benchmarks.bench_indexing --docs 100000 --latency 0.002
+
+Run from the search_engine directory. Pass --es-url to benchmark against a real cluster instead of
+the in-memory stand-in.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from elasticsearch import Elasticsearch
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.synthetic import generate_resources
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'search', 'backend'))
+from bulk_indexing import bulk_index  # noqa: E402
+
+INDEX_NAME = 'benchmark-bioimage-training'
+
+
+def reset_index(es):
+    es.options(ignore_status=[400, 404]).indices.delete(index=INDEX_NAME)
+    es.indices.create(index=INDEX_NAME)
+
+
+def run_per_document(es, resources):
+    reset_index(es)
+    started = time.perf_counter()
+    for item in resources:
+        es.index(index=INDEX_NAME, body=item)
+    es.indices.refresh(index=INDEX_NAME)
+    return time.perf_counter() - started
+
+
+def run_bulk(es, resources, **kwargs):
+    reset_index(es)
+    summary = bulk_index(es, resources, INDEX_NAME, **kwargs)
+    return summary['seconds']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=100000, help='number of synthetic resources for the bulk runs')
+    parser.add_argument('--baseline-docs', type=int, default=2000,
+                        help='number of resources for the per-document baseline, which is extrapolated')
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated per-request latency of the stand-in')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--es-url', help='benchmark against this Elasticsearch instead of the stand-in')
+    args = parser.parse_args()
+
+    stub = None
+    if args.es_url:
+        url = args.es_url
+    else:
+        stub = ElasticsearchStub(latency=args.latency).start()
+        url = stub.url
+
+    es = Elasticsearch(url, request_timeout=120)
+    resources = list(generate_resources(max(args.docs, args.baseline_docs)))
+    try:
+        baseline = run_per_document(es, resources[:args.baseline_docs])
+        streaming = run_bulk(es, resources[:args.docs], chunk_size=args.chunk_size, thread_count=0)
+        parallel = run_bulk(es, resources[:args.docs], chunk_size=args.chunk_size, thread_count=args.threads)
+    finally:
+        if stub:
+            stub.stop()
+
+    baseline_rate = args.baseline_docs / baseline
+    report = {
+        'docs': args.docs,
+        'per_document': {'docs_per_second': round(baseline_rate),
+                         'estimated_seconds': round(args.docs / baseline_rate, 2)},
+        'streaming_bulk': {'seconds': streaming, 'docs_per_second': round(args.docs / streaming)},
+        'parallel_bulk': {'seconds': parallel, 'docs_per_second': round(args.docs / parallel),
+                          'threads': args.threads},
+        'speedup': {'streaming_bulk': round(args.docs / baseline_rate / streaming, 1),
+                    'parallel_bulk': round(args.docs / baseline_rate / parallel, 1)},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
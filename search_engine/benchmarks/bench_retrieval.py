@@ -0,0 +1,147 @@
+"""
+Compares keyword (BM25), dense and hybrid retrieval of the chatbot: recall@k against latency.
+
+Each query is written for one known document from a few words of its name, with part
+of the words replaced by other forms of the same word (segmentation -> segment), the way users rarely
+phrase a question exactly like the catalogue. Recall@k is the share of queries whose document is among
+the first k results.
+
+Retrieval runs through the chatbot's own ranking against a stand-in for Elasticsearch and the
+embeddings written by the indexer's code path. A second measurement times the vectorized dense top-k
+on a larger random matrix.
+
+Usage:
+    python -m benchmarks.bench_retrieval --docs 2000 --queries 300
+
+Run from the search_engine directory.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from elasticsearch import Elasticsearch
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.synthetic import generate_resources
+from common.embeddings import get_encoder, top_k, update_embeddings
+from common.search_backend import index_generation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'search', 'backend'))
+from reindex import document_id, reindex  # noqa: E402
+
+# Other forms of the catalogue words, as users might type them
+VARIANTS = {
+    'segmentation': 'segment', 'analysis': 'analyze', 'microscopy': 'microscope', 'processing': 'process',
+    'visualization': 'visualize', 'tracking': 'track', 'labeling': 'labels', 'classification': 'classify',
+    'learning': 'learn', 'reproducible': 'reproducibility', 'quantitative': 'quantify',
+    'fluorescence': 'fluorescent', 'management': 'manage', 'sharing': 'share', 'storage': 'store',
+    'introduction': 'introductory', 'training': 'train', 'workflow': 'workflows', 'image': 'images',
+    'cell': 'cells', 'course': 'courses', 'tutorial': 'tutorials', 'pipeline': 'pipelines',
+}
+KS = (1, 5, 10, 20)
+
+
+def make_queries(resources, count, seed=7):
+    """
+    Returns (query, document ID) pairs with up to four words of a document name, half of them in another form.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for resource in rng.sample(resources, min(count, len(resources))):
+        words = [word for word in resource['name'].lower().split() if not word.isdigit()]
+        words = list(dict.fromkeys(words))
+        picked = rng.sample(words, min(4, len(words)))
+        query = ' '.join(VARIANTS.get(word, word) if position % 2 == 0 else word
+                         for position, word in enumerate(picked))
+        queries.append((query, document_id(resource)))
+    return queries
+
+
+def evaluate(rank, queries, depth):
+    """
+    Runs every query through a ranking function and reports recall@k and latency percentiles.
+    """
+    hits = {k: 0 for k in KS}
+    latencies = []
+    for query, expected in queries:
+        started = time.perf_counter()
+        ranking = rank(query, depth)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if expected in ranking:
+            position = ranking.index(expected)
+            for k in KS:
+                hits[k] += position < k
+    latencies.sort()
+    return {
+        'recall': {f"@{k}": round(hits[k] / len(queries), 3) for k in KS},
+        'latency_ms': {'p50': round(statistics.median(latencies), 2),
+                       'p95': round(latencies[int(len(latencies) * 0.95) - 1], 2)},
+    }
+
+
+def dense_scaling(rows, dim, k, repeats=20):
+    """
+    Times the dense top-k (one matrix-vector product and argpartition) against a full sort.
+    """
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((rows, dim), dtype=np.float32)
+    query = rng.standard_normal(dim, dtype=np.float32)
+
+    def timed(select):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            select(matrix @ query)
+        return round((time.perf_counter() - started) * 1000 / repeats, 2)
+
+    return {'rows': rows, 'dim': dim, 'k': k,
+            'argpartition_ms': timed(lambda scores: top_k(scores, k)),
+            'full_sort_ms': timed(lambda scores: np.argsort(-scores)[:k])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--scale-rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    resources = list(generate_resources(args.docs))
+    queries = make_queries(resources, args.queries)
+    embeddings_dir = tempfile.mkdtemp(prefix='embeddings-')
+
+    with ElasticsearchStub(latency=0) as es_stub:
+        es = Elasticsearch(es_stub.url)
+        reindex(es, resources, force_rebuild=True)
+        encoder = get_encoder()
+        indexing = update_embeddings(index_generation(es), {document_id(item): item for item in resources},
+                                     encoder, embeddings_dir)
+
+        host, port = es_stub.url.rsplit('//', 1)[1].split(':')
+        os.environ.update(ELASTICSEARCH_HOST=host, ELASTICSEARCH_PORT=port, EMBEDDINGS_DIR=embeddings_dir,
+                          KISSKI_API_BASE='http://127.0.0.1:9/v1', KISSKI_API_KEY='benchmark')
+        sys.path.insert(0, os.path.join(ROOT, 'chatbot'))
+        import chatbot
+        chatbot.embedding_index.directory = embeddings_dir
+
+        depth = max(KS)
+        report = {
+            'docs': args.docs,
+            'queries': len(queries),
+            'encoder': encoder.name,
+            'embedding': indexing,
+        }
+        for mode in ('bm25', 'dense', 'hybrid'):
+            report[mode] = evaluate(lambda query, size: chatbot.rank_documents(query, size, mode), queries, depth)
+    report['dense_scaling'] = dense_scaling(args.scale_rows, encoder.dim, depth)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Checks that the embedded search engine (SEARCH_BACKEND=local) answers like Elasticsearch, and compares
+their latency and memory.
+
+The same synthetic catalogue is indexed into both backends and the same queries are sent to both
+through the SearchBackend interface:
+
+  browse     - empty queries with filters and every sort, where both must return identical pages
+  keyword    - full-text queries; totals and facet counts must be identical, rankings should overlap
+  phrase     - names (and parts of names) matched with exact_match
+  suggest    - completions of name prefixes, where both must suggest the same texts
+
+Against the in-memory stand-in (the default) scores are not BM25, so the ranking overlap is reported
+but only gated with --es-url, against a real cluster. The process exits with status 1 when an
+agreement falls below its threshold, so it can run in CI.
+
+Usage:
+    python -m benchmarks.bench_search_backends --docs 5000 --queries 300
+    python -m benchmarks.bench_search_backends --es-url http://localhost:9200
+
+Run from the search_engine directory.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.measure import peak_rss_mb, percentiles
+from benchmarks.synthetic import TAGS, TYPES, WORDS, generate_resources
+from common.local_search import LocalSearchBackend
+from common.search_backend import SORT_FIELDS, ElasticsearchBackend
+from common.snapshot import normalize_resource
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'search', 'backend'))
+from reindex import document_id, reindex  # noqa: E402
+from suggestions import completion_source  # noqa: E402
+
+TOP_K = 10
+
+
+def make_queries(resources, count, rng):
+    """
+    Builds the queries of every kind as keyword arguments of SearchBackend.search.
+    """
+    queries = {'browse': [], 'keyword': [], 'phrase': []}
+    for _ in range(count):
+        browse = {'query': '', 'size': TOP_K, 'sort': rng.choice([sort for sort in SORT_FIELDS if sort != 'relevance']),
+                  'order': rng.choice(['asc', 'desc'])}
+        if rng.random() < 0.5:
+            browse['selected'] = {'type': [rng.choice(TYPES[:5])]}
+        if rng.random() < 0.3:
+            year = rng.randint(2012, 2025)
+            browse['date_range'] = {'gte': f"{year}-01-01", 'lte': f"{year + 1}-12-31"}
+        queries['browse'].append(browse)
+
+        keyword = {'query': ' '.join(rng.sample(WORDS, rng.randint(1, 3))), 'size': TOP_K,
+                   'with_facets': rng.random() < 0.5}
+        if rng.random() < 0.3:
+            keyword['selected'] = {'tags': [rng.choice(TAGS[:10])]}
+        queries['keyword'].append(keyword)
+
+        words = rng.choice(resources)['name'].split()
+        start = rng.randrange(len(words))
+        queries['phrase'].append({'query': ' '.join(words[start:start + rng.randint(1, 3)]), 'exact_match': True,
+                                  'size': TOP_K})
+    return queries
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def ids(found):
+    return [hit['id'] for hit in found['hits']]
+
+
+def compare(kind, queries, local, elasticsearch):
+    """
+    Runs every query on both backends and measures how far the answers agree.
+    """
+    totals = ordered = overlap = top1 = facets = faceted = 0
+    latencies = {'local': [], 'elasticsearch': []}
+    mismatches = []
+    for query in queries:
+        local_found, local_ms = timed(local.search, **query)
+        es_found, es_ms = timed(elasticsearch.search, **query)
+        latencies['local'].append(local_ms)
+        latencies['elasticsearch'].append(es_ms)
+        local_ids, es_ids = ids(local_found), ids(es_found)
+        totals += local_found['total'] == es_found['total']
+        ordered += local_ids == es_ids
+        overlap += len(set(local_ids) & set(es_ids)) / max(len(es_ids), 1) if es_ids else not local_ids
+        top1 += local_ids[:1] == es_ids[:1]
+        if query.get('with_facets'):
+            faceted += 1
+            facets += (local_found['facets'] == es_found['facets']
+                       and local_found['publication_years'] == es_found['publication_years'])
+        if local_found['total'] != es_found['total'] and len(mismatches) < 5:
+            mismatches.append({'query': query, 'local': local_found['total'], 'elasticsearch': es_found['total']})
+    count = len(queries)
+    return {
+        'queries': count,
+        'total_agreement': round(totals / count, 4),
+        'identical_pages': round(ordered / count, 4),
+        f"top{TOP_K}_overlap": round(overlap / count, 4),
+        'top1_agreement': round(top1 / count, 4),
+        'facet_agreement': round(facets / faceted, 4) if faceted else None,
+        'latency_ms': {name: percentiles(values) for name, values in latencies.items()},
+        'total_mismatches': mismatches,
+    }
+
+
+def completion_texts(backend, prefix, size=5):
+    """
+    Returns the option texts of a completion as the completion field analyzes them: whitespace collapsed
+    and case folded. The local index stores them that way, Elasticsearch returns the input as written.
+    """
+    return [' '.join(option['text'].split()).casefold() for option in backend.complete(prefix, size)]
+
+
+def compare_completions(resources, count, rng, local, elasticsearch):
+    """
+    Completes name prefixes on both backends; they agree when they suggest the same texts in the same order.
+    """
+    agreed = 0
+    mismatches = []
+    prefixes = [resource['name'][:rng.randint(3, 12)] for resource in rng.sample(resources, min(count, len(resources)))]
+    for prefix in prefixes:
+        local_texts = completion_texts(local, prefix)
+        es_texts = completion_texts(elasticsearch, prefix)
+        agreed += local_texts == es_texts
+        if local_texts != es_texts and len(mismatches) < 5:
+            mismatches.append({'prefix': prefix, 'local': local_texts, 'elasticsearch': es_texts})
+    return {'prefixes': len(prefixes), 'agreement': round(agreed / len(prefixes), 4), 'mismatches': mismatches}
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=300, help='queries per kind')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--es-url', help='compare against this Elasticsearch instead of the stand-in')
+    parser.add_argument('--min-agreement', type=float, default=0.99,
+                        help='minimum share of queries with equal totals, facets, browse pages and completions')
+    parser.add_argument('--min-overlap', type=float, default=0.8,
+                        help=f"minimum top-{TOP_K} overlap of keyword queries, checked with --es-url only")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    resources = [normalize_resource(item) for item in generate_resources(args.docs, args.seed)]
+    stub = None if args.es_url else ElasticsearchStub(latency=0).start()
+    es = Elasticsearch(args.es_url or stub.url, request_timeout=120)
+    try:
+        started = time.perf_counter()
+        reindex(es, resources, force_rebuild=True)
+        es_seconds = time.perf_counter() - started
+        elasticsearch = ElasticsearchBackend(es)
+
+        with tempfile.TemporaryDirectory(prefix='local-index-') as directory:
+            rss_before = peak_rss_mb()
+            local = LocalSearchBackend(directory, document_id, completion_source)
+            build = local.sync(resources, force_rebuild=True)
+            # A fresh reader, as in a process that only maps the index written by another one
+            started = time.perf_counter()
+            reader = LocalSearchBackend(directory)
+            reader.generation()
+            load_ms = (time.perf_counter() - started) * 1000
+
+            queries = make_queries(resources, args.queries, rng)
+            report = {
+                'docs': args.docs,
+                'elasticsearch': args.es_url or 'stand-in',
+                'indexing_seconds': {'local': build['seconds'], 'elasticsearch': round(es_seconds, 3)},
+                'local_index': {'bytes': directory_bytes(directory), 'load_ms': round(load_ms, 2),
+                                'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1)},
+                'kinds': {kind: compare(kind, items, reader, elasticsearch) for kind, items in queries.items()},
+                'suggest': compare_completions(resources, args.queries, rng, reader, elasticsearch),
+            }
+    finally:
+        if stub:
+            stub.stop()
+
+    failures = []
+    for kind, result in report['kinds'].items():
+        if result['total_agreement'] < args.min_agreement:
+            failures.append(f"{kind}: totals agree for {result['total_agreement']:.1%}")
+        if result['facet_agreement'] is not None and result['facet_agreement'] < args.min_agreement:
+            failures.append(f"{kind}: facets agree for {result['facet_agreement']:.1%}")
+    if report['kinds']['browse']['identical_pages'] < args.min_agreement:
+        failures.append(f"browse: pages identical for {report['kinds']['browse']['identical_pages']:.1%}")
+    if report['suggest']['agreement'] < args.min_agreement:
+        failures.append(f"suggest: completions identical for {report['suggest']['agreement']:.1%}")
+    overlap = report['kinds']['keyword'][f"top{TOP_K}_overlap"]
+    if args.es_url and overlap < args.min_overlap:
+        failures.append(f"keyword: top-{TOP_K} overlap {overlap:.1%}")
+    report['failures'] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures per-keystroke latency and payload size of autocomplete, comparing the former bool_prefix
+multi_match (full _source of 10 documents per keystroke) with the completion field and the in-process
+prefix index of the search backend.
+
+Usage:
+    python -m benchmarks.bench_suggest --docs 5000 --words 20
+
+Run from the search_engine directory.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.synthetic import generate_resources
+from common.search_backend import ElasticsearchBackend
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'search', 'backend'))
+from reindex import INDEX_ALIAS, reindex  # noqa: E402
+from suggestions import SUGGEST_MIN_PREFIX, Suggester, build_prefix_index  # noqa: E402
+
+
+def legacy_suggest(es, query):
+    es_response = es.search(
+        index=INDEX_ALIAS,
+        body={"query": {"multi_match": {"query": query, "fields": ["name", "description"], "type": "bool_prefix"}}}
+    )
+    return [suggestion['_source'] for suggestion in es_response['hits']['hits']]
+
+
+def keystrokes(names, count, rng):
+    """Yields the successive prefixes typed for randomly chosen resource names."""
+    for name in rng.sample(names, count):
+        for length in range(1, min(len(name), 15) + 1):
+            yield name[:length]
+
+
+def measure(func, prefixes):
+    latencies, sizes = [], []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        result = func(prefix)
+        latencies.append((time.perf_counter() - started) * 1000)
+        sizes.append(len(json.dumps(result)))
+    latencies.sort()
+    return {
+        'requests': len(prefixes),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        'mean_payload_bytes': round(statistics.mean(sizes)),
+        'total_payload_bytes': sum(sizes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=50, help='number of names typed out keystroke by keystroke')
+    parser.add_argument('--latency', type=float, default=0.001, help='simulated per-request latency of the stand-in')
+    parser.add_argument('--es-url', help='benchmark against this Elasticsearch instead of the stand-in')
+    args = parser.parse_args()
+
+    stub = None if args.es_url else ElasticsearchStub(latency=args.latency).start()
+    es = Elasticsearch(args.es_url or stub.url, request_timeout=120)
+    try:
+        resources = list(generate_resources(args.docs))
+        reindex(es, resources, force_rebuild=True)
+
+        started = time.perf_counter()
+        hits = scan(es, index=INDEX_ALIAS, query={"_source": ['name', 'tags', 'num_downloads']}, size=5000)
+        local = build_prefix_index(hits)
+        build_seconds = time.perf_counter() - started
+
+        suggester = Suggester(ElasticsearchBackend(es), lambda: None)
+        rng = random.Random(7)
+        prefixes = list(keystrokes([resource['name'] for resource in resources], args.words, rng))
+        contract = [prefix for prefix in prefixes if len(prefix.strip()) >= SUGGEST_MIN_PREFIX]
+
+        report = {
+            'docs': args.docs,
+            'keystrokes': len(prefixes),
+            'prefix_index': {'entries': len(local), 'build_seconds': round(build_seconds, 3)},
+            'legacy_bool_prefix': measure(lambda prefix: legacy_suggest(es, prefix), prefixes),
+            'completion_field': measure(lambda prefix: suggester.complete(prefix), contract),
+            'prefix_index_lookup': measure(local.lookup, contract),
+        }
+    finally:
+        if stub:
+            stub.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares two reports of benchmarks.suite and flags regressions.
+
+Latencies, peak RSS and throughput are compared per scenario. A change counts as a regression when
+it is worse than the base by more than --tolerance (relative). Reports measured with different
+settings or corpora are compared anyway, with a warning, since their numbers are not comparable.
+
+Usage:
+    python -m benchmarks.compare base.json head.json --tolerance 0.1
+
+Exits with status 1 if any metric regressed, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+# (path within a scenario, whether higher is better)
+METRICS = [
+    ('docs_per_second', True),
+    ('throughput_rps', True),
+    ('latency_ms.p50', False),
+    ('latency_ms.p95', False),
+    ('latency_ms.p99', False),
+    ('peak_rss_mb', False),
+    ('errors', False),
+]
+
+
+def lookup(scenario, path):
+    value = scenario
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(base, head, tolerance):
+    """
+    Lists every metric present in both reports with its relative change.
+
+    Returns:
+        list: Rows as dicts with 'scenario', 'metric', 'base', 'head', 'change' (relative, None if
+        the base is 0) and 'regression'.
+    """
+    rows = []
+    for name, head_scenario in head['scenarios'].items():
+        base_scenario = base['scenarios'].get(name)
+        if base_scenario is None:
+            continue
+        for path, higher_is_better in METRICS:
+            before, after = lookup(base_scenario, path), lookup(head_scenario, path)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else None
+            worse = after < before if higher_is_better else after > before
+            # Any new error is a regression; otherwise only changes beyond the tolerance count
+            regression = worse and (change is None or abs(change) > tolerance)
+            rows.append({'scenario': name, 'metric': path, 'base': before, 'head': after,
+                         'change': round(change, 4) if change is not None else None, 'regression': regression})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change tolerated (default 0.1)')
+    parser.add_argument('--json', action='store_true', help='print the comparison as JSON')
+    args = parser.parse_args()
+
+    with open(args.base) as file:
+        base = json.load(file)
+    with open(args.head) as file:
+        head = json.load(file)
+
+    warnings = []
+    if base.get('schema_version') != head.get('schema_version'):
+        warnings.append("the reports have different schema versions")
+    # Which scenarios ran does not matter, only the settings and the corpus they ran with
+    for section, keys in (('config', (set(base['config']) | set(head['config'])) - {'scenarios'}),
+                          ('corpus', {'docs', 'seed', 'content_hash'})):
+        differing = sorted(key for key in keys
+                           if (base.get(section) or {}).get(key) != (head.get(section) or {}).get(key))
+        if differing:
+            warnings.append(f"{section} differs in {', '.join(differing)}")
+    for key in ('cpus', 'machine', 'python'):
+        if base['environment'].get(key) != head['environment'].get(key):
+            warnings.append(f"measured on a different environment ({key})")
+
+    rows = compare(base, head, args.tolerance)
+    regressions = [row for row in rows if row['regression']]
+    if args.json:
+        print(json.dumps({'warnings': warnings, 'rows': rows, 'regressions': len(regressions)}, indent=2))
+    else:
+        commits = [(report['environment'].get('commit') or '?')[:10] for report in (base, head)]
+        print(f"base {commits[0]}  head {commits[1]}  tolerance {args.tolerance:.0%}")
+        for warning in warnings:
+            print(f"warning: {warning}")
+        for row in rows:
+            change = f"{row['change']:+.1%}" if row['change'] is not None else 'n/a'
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['scenario']:<10} {row['metric']:<16} {row['base']:>12} {row['head']:>12} {change:>8}{flag}")
+        print(f"{len(regressions)} regressions")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,739 @@
+import datetime
+import fnmatch
+import itertools
+import json
+import re
+import uuid
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ElasticsearchStub:
+    """
+    Minimal in-memory stand-in for the parts of the Elasticsearch REST API used by the services.
+
+    Every request is delayed by `latency` seconds to model the network round trip and request
+    overhead of a real cluster, which is what dominates the cost of one-request-per-document indexing.
+    """
+
+    def __init__(self, latency=0.002, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.indices = {}
+        self.requests = 0
+        self.aliases = {}
+        self.scrolls = {}
+        self.pits = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._routes = [
+            ('GET', r'/', self.info),
+            ('HEAD', r'/', self.info),
+            ('GET', r'/_alias/(?P<name>[^/]+)', self.get_alias),
+            ('HEAD', r'/_alias/(?P<name>[^/]+)', self.get_alias),
+            ('POST', r'/_aliases', self.update_aliases),
+            ('POST', r'/_search/scroll', self.scroll),
+            ('GET', r'/_search/scroll', self.scroll),
+            ('DELETE', r'/_search/scroll', self.clear_scroll),
+            ('DELETE', r'/_pit', self.close_pit),
+            ('GET', r'/_search', self.search),
+            ('POST', r'/_search', self.search),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_pit', self.open_pit),
+            ('GET', r'/(?P<index>[^/_][^/]*)/_mapping', self.get_mapping),
+            ('PUT', r'/(?P<index>[^/_][^/]*)/_mapping', self.put_mapping),
+            ('GET', r'/(?P<index>[^/_][^/]*)/_search', self.search),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_search', self.search),
+            ('POST', r'/_bulk', self.bulk),
+            ('PUT', r'/_bulk', self.bulk),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_bulk', self.bulk),
+            ('GET', r'/(?P<index>[^/_][^/]*)/_settings', self.get_settings),
+            ('PUT', r'/(?P<index>[^/_][^/]*)/_settings', self.put_settings),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_refresh', self.refresh),
+            ('GET', r'/(?P<index>[^/_][^/]*)/_mget', self.mget),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_mget', self.mget),
+            ('GET', r'/(?P<index>[^/_][^/]*)/_count', self.count),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_count', self.count),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_doc', self.index_doc),
+            ('PUT', r'/(?P<index>[^/_][^/]*)/_doc/(?P<doc_id>[^/]+)', self.index_doc),
+            ('POST', r'/(?P<index>[^/_][^/]*)/_doc/(?P<doc_id>[^/]+)', self.index_doc),
+            ('PUT', r'/(?P<index>[^/_][^/]*)', self.create_index),
+            ('DELETE', r'/(?P<index>[^/_][^/]*)', self.delete_index),
+            ('HEAD', r'/(?P<index>[^/_][^/]*)', self.index_exists),
+            ('GET', r'/(?P<index>[^/_][^/]*)', self.get_index),
+        ]
+        self._routes = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in self._routes]
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def resolve(self, expression):
+        """
+        Expands a comma-separated list of index names, aliases and wildcard patterns to concrete indices.
+        """
+        names = []
+        for part in expression.split(','):
+            if part in self.indices:
+                names.append(part)
+            elif part in self.aliases:
+                names.extend(sorted(self.aliases[part]))
+            else:
+                names.extend(sorted(fnmatch.filter(self.indices, part)))
+        return list(dict.fromkeys(names))
+
+    def documents(self, index):
+        resolved = self.resolve(index)
+        if len(resolved) == 1:
+            return self.indices[resolved[0]]['docs']
+        return {doc_id: source for name in resolved for doc_id, source in self.indices[name]['docs'].items()}
+
+    # --- request handlers, each returning (status, body) -------------------------------------
+
+    def info(self, params, body):
+        return 200, {'name': 'stub', 'cluster_name': 'benchmark', 'version': {'number': '7.17.10'},
+                     'tagline': 'You Know, for Search'}
+
+    def create_index(self, params, body, index):
+        with self._lock:
+            if index in self.indices:
+                return 400, _error('resource_already_exists_exception', f"index [{index}] already exists", 400)
+            payload = _json(body) or {}
+            self.indices[index] = {'docs': {}, 'mappings': payload.get('mappings', {}),
+                                   'settings': payload.get('settings', {})}
+        return 200, {'acknowledged': True, 'shards_acknowledged': True, 'index': index}
+
+    def delete_index(self, params, body, index):
+        with self._lock:
+            resolved = [name for name in self.resolve(index) if name in self.indices]
+            if not resolved and params.get('ignore_unavailable') != 'true':
+                return 404, _error('index_not_found_exception', f"no such index [{index}]", 404)
+            for name in resolved:
+                del self.indices[name]
+                self._drop_from_aliases(name)
+        return 200, {'acknowledged': True}
+
+    def index_exists(self, params, body, index):
+        return (200 if self.resolve(index) else 404), None
+
+    def get_index(self, params, body, index):
+        resolved = self.resolve(index)
+        if not resolved and '*' not in index:
+            return 404, _error('index_not_found_exception', f"no such index [{index}]", 404)
+        return 200, {name: {'aliases': {alias: {} for alias, members in self.aliases.items() if name in members},
+                            'mappings': self.indices[name]['mappings'],
+                            'settings': {'index': self.indices[name]['settings']}} for name in resolved}
+
+    def get_mapping(self, params, body, index):
+        if not self.resolve(index):
+            return 404, _error('index_not_found_exception', f"no such index [{index}]", 404)
+        return 200, {name: {'mappings': self.indices[name]['mappings']} for name in self.resolve(index)}
+
+    def put_mapping(self, params, body, index):
+        update = _json(body) or {}
+        with self._lock:
+            for name in self.resolve(index):
+                mappings = self.indices[name]['mappings']
+                if '_meta' in update:
+                    mappings['_meta'] = update['_meta']
+                mappings.setdefault('properties', {}).update(update.get('properties', {}))
+        return 200, {'acknowledged': True}
+
+    def get_alias(self, params, body, name):
+        if name not in self.aliases:
+            return 404, {'error': f"alias [{name}] missing", 'status': 404}
+        return 200, {index: {'aliases': {name: {}}} for index in sorted(self.aliases[name])}
+
+    def update_aliases(self, params, body):
+        with self._lock:
+            for action in (_json(body) or {}).get('actions', []):
+                (kind, spec), = action.items()
+                if kind == 'remove_index':
+                    for name in self.resolve(spec['index']):
+                        del self.indices[name]
+                        self._drop_from_aliases(name)
+                    continue
+                targets = [name for name in fnmatch.filter(self.indices, spec['index'])]
+                if kind == 'add':
+                    if spec['alias'] in self.indices:
+                        return 400, _error('invalid_alias_name_exception',
+                                           f"an index exists with the same name as the alias [{spec['alias']}]", 400)
+                    self.aliases.setdefault(spec['alias'], set()).update(targets)
+                elif kind == 'remove':
+                    self.aliases.get(spec['alias'], set()).difference_update(targets)
+                    if not self.aliases.get(spec['alias']):
+                        self.aliases.pop(spec['alias'], None)
+        return 200, {'acknowledged': True}
+
+    def _drop_from_aliases(self, index):
+        for alias in list(self.aliases):
+            self.aliases[alias].discard(index)
+            if not self.aliases[alias]:
+                del self.aliases[alias]
+
+    def get_settings(self, params, body, index):
+        resolved = self.resolve(index)
+        if not resolved:
+            return 404, _error('index_not_found_exception', f"no such index [{index}]", 404)
+        return 200, {name: {'settings': {'index': dict(self.indices[name]['settings'])}} for name in resolved}
+
+    def put_settings(self, params, body, index):
+        resolved = self.resolve(index)
+        if not resolved:
+            return 404, _error('index_not_found_exception', f"no such index [{index}]", 404)
+        settings = (_json(body) or {}).get('index', {})
+        for name in resolved:
+            for key, value in settings.items():
+                if value is None:
+                    self.indices[name]['settings'].pop(key, None)
+                else:
+                    self.indices[name]['settings'][key] = value
+        return 200, {'acknowledged': True}
+
+    def refresh(self, params, body, index):
+        return 200, {'_shards': {'total': 1, 'successful': 1, 'failed': 0}}
+
+    def count(self, params, body, index):
+        return 200, {'count': len(self.documents(index))}
+
+    def mget(self, params, body, index):
+        request = _json(body) or {}
+        ids = request.get('ids') or [doc.get('_id') for doc in request.get('docs', [])]
+        resolved = self.resolve(index)
+        if len(resolved) != 1:
+            return 400, _error('illegal_argument_exception', f"{index} does not resolve to a single index", 400)
+        name = resolved[0]
+        excludes = self.indices[name].get('mappings', {}).get('_source', {}).get('excludes', [])
+        source_filter = params.get('_source', request.get('_source', True))
+        docs = []
+        for doc_id in ids:
+            source = self.indices[name]['docs'].get(doc_id)
+            if source is None:
+                docs.append({'_index': name, '_id': doc_id, 'found': False})
+                continue
+            hit = {'_index': name, '_id': doc_id, 'found': True, '_source': source, '_excludes': excludes}
+            _shape_hit(hit, source_filter, None, None)
+            docs.append(hit)
+        return 200, {'docs': docs}
+
+    def open_pit(self, params, body, index):
+        pit_id = uuid.uuid4().hex
+        with self._lock:
+            self.pits[pit_id] = {name: dict(self.indices[name]['docs']) for name in self.resolve(index)}
+        return 200, {'id': pit_id}
+
+    def close_pit(self, params, body):
+        found = self.pits.pop((_json(body) or {}).get('id'), None) is not None
+        return (200 if found else 404), {'succeeded': found, 'num_freed': int(found)}
+
+    def search(self, params, body, index=None):
+        request = _json(body) or {}
+        query = request.get('query', {'match_all': {}})
+        if 'pit' in request:
+            if request['pit']['id'] not in self.pits:
+                return 404, _error('search_context_missing_exception', 'No search context found', 404)
+            snapshot = self.pits[request['pit']['id']]
+        else:
+            snapshot = {name: dict(self.indices[name]['docs']) for name in self.resolve(index or '*')}
+        hits = []
+        try:
+            for name, docs in snapshot.items():
+                excludes = self.indices.get(name, {}).get('mappings', {}).get('_source', {}).get('excludes', [])
+                for doc_id, source in docs.items():
+                    score = evaluate(query, source, doc_id)
+                    if score is not None:
+                        hits.append({'_index': name, '_id': doc_id, '_score': score, '_source': source,
+                                     '_excludes': excludes})
+        except ValueError as e:
+            return 400, _error('parsing_exception', str(e), 400)
+
+        # Aggregations count all matches; the post_filter narrows only the hits, as in Elasticsearch
+        aggregations = None
+        if request.get('aggs') or request.get('aggregations'):
+            try:
+                aggregations = aggregate(request.get('aggs') or request.get('aggregations'), hits)
+            except ValueError as e:
+                return 400, _error('parsing_exception', str(e), 400)
+        if request.get('post_filter'):
+            try:
+                hits = [hit for hit in hits
+                        if evaluate(request['post_filter'], hit['_source'], hit['_id']) is not None]
+            except ValueError as e:
+                return 400, _error('parsing_exception', str(e), 400)
+        total = len(hits)
+
+        sort = request.get('sort')
+        if sort:
+            specs = [_sort_spec(spec) for spec in (sort if isinstance(sort, list) else [sort])]
+            for hit in hits:
+                hit['sort'] = [_sort_value(hit, field) for field, _ in specs]
+            hits.sort(key=lambda hit: _sort_key(hit['sort'], specs))
+            if 'search_after' in request:
+                after = _sort_key(request['search_after'], specs)
+                hits = [hit for hit in hits if _sort_key(hit['sort'], specs) > after]
+        else:
+            hits.sort(key=lambda hit: -hit['_score'])
+
+        size = int(params.get('size', request.get('size', 10)))
+        source_filter = params.get('_source', request.get('_source', True))
+        suggest = {name: [self._complete(snapshot, spec, source_filter)]
+                   for name, spec in request.get('suggest', {}).items()}
+        terms = _query_terms(query)
+        for hit in hits:
+            _shape_hit(hit, source_filter, request.get('highlight'), terms)
+        if 'scroll' in params:
+            scroll_id = uuid.uuid4().hex
+            self.scrolls[scroll_id] = (hits, size)
+            return 200, self._scroll_page(scroll_id)
+        start = int(params.get('from', request.get('from', 0)))
+        response = _hits_response(hits[start:start + size], total)
+        if 'pit' in request:
+            response['pit_id'] = request['pit']['id']
+        if suggest:
+            response['suggest'] = suggest
+        if aggregations is not None:
+            response['aggregations'] = aggregations
+        return 200, response
+
+    def _complete(self, snapshot, spec, source_filter):
+        """
+        Answers a completion suggestion by prefix-matching the inputs of the completion field.
+
+        Prefix and inputs are compared with whitespace collapsed and case folded, like the simple analyzer
+        of the completion field; options of equal weight are ordered by text.
+        """
+        prefix = _completion_text(spec.get('prefix', ''))
+        completion = spec['completion']
+        options = []
+        for name, docs in snapshot.items():
+            for doc_id, source in docs.items():
+                value = source.get(completion['field'])
+                if not isinstance(value, dict):
+                    continue
+                for text in value.get('input', []):
+                    if _completion_text(text).startswith(prefix):
+                        options.append({'text': text, '_index': name, '_id': doc_id,
+                                        '_score': float(value.get('weight', 1)), '_source': source})
+        options.sort(key=lambda option: (-option['_score'], _completion_text(option['text'])))
+        if completion.get('skip_duplicates'):
+            # The best option of every text, in the order of the best ones
+            seen = set()
+            deduplicated = []
+            for option in options:
+                text = _completion_text(option['text'])
+                if text not in seen:
+                    seen.add(text)
+                    deduplicated.append(option)
+            options = deduplicated
+        options = options[:completion.get('size', 5)]
+        for option in options:
+            excludes = self.indices.get(option['_index'], {}).get('mappings', {}).get('_source', {}).get('excludes', [])
+            hit = {'_source': option['_source'], '_excludes': excludes}
+            _shape_hit(hit, source_filter, None, [])
+            option['_source'] = hit.get('_source', {})
+        return {'text': spec.get('prefix', ''), 'offset': 0, 'length': len(prefix), 'options': options}
+
+    def scroll(self, params, body):
+        scroll_id = (_json(body) or {}).get('scroll_id') or params.get('scroll_id')
+        if scroll_id not in self.scrolls:
+            return 404, _error('search_context_missing_exception', 'No search context found', 404)
+        return 200, self._scroll_page(scroll_id)
+
+    def clear_scroll(self, params, body):
+        scroll_ids = (_json(body) or {}).get('scroll_id', [])
+        for scroll_id in [scroll_ids] if isinstance(scroll_ids, str) else scroll_ids:
+            self.scrolls.pop(scroll_id, None)
+        return 200, {'succeeded': True, 'num_freed': len(scroll_ids)}
+
+    def _scroll_page(self, scroll_id):
+        hits, size = self.scrolls[scroll_id]
+        page, rest = hits[:size], hits[size:]
+        self.scrolls[scroll_id] = (rest, size)
+        response = _hits_response(page, len(page) + len(rest))
+        response['_scroll_id'] = scroll_id
+        return response
+
+    def index_doc(self, params, body, index, doc_id=None):
+        result = self._store(index, doc_id, _json(body))
+        return (201 if result['result'] == 'created' else 200), result
+
+    def bulk(self, params, body, index=None):
+        started = time.perf_counter()
+        lines = body.decode('utf-8').splitlines()
+        items = []
+        errors = False
+        position = 0
+        while position < len(lines):
+            if not lines[position].strip():
+                position += 1
+                continue
+            action, meta = next(iter(json.loads(lines[position]).items()))
+            target = meta.get('_index', index)
+            if action == 'delete':
+                with self._lock:
+                    found = any(self.indices[name]['docs'].pop(meta.get('_id'), None) is not None
+                                for name in self.resolve(target))
+                items.append({'delete': {'_index': target, '_id': meta.get('_id'),
+                                         'result': 'deleted' if found else 'not_found',
+                                         'status': 200 if found else 404}})
+                position += 1
+                continue
+            source = json.loads(lines[position + 1])
+            position += 2
+            if action == 'update':
+                source = source.get('doc', source)
+            if not isinstance(source, dict):
+                errors = True
+                items.append({action: {'_index': target, 'status': 400,
+                                       'error': {'type': 'mapper_parsing_exception', 'reason': 'not an object'}}})
+                continue
+            result = self._store(target, meta.get('_id'), source)
+            result['status'] = 201 if result['result'] == 'created' else 200
+            items.append({action: result})
+        took = int((time.perf_counter() - started) * 1000)
+        return 200, {'took': took, 'errors': errors, 'items': items}
+
+    def _store(self, index, doc_id, source):
+        with self._lock:
+            if index in self.aliases:
+                index = sorted(self.aliases[index])[-1]
+            if index not in self.indices:
+                self.indices[index] = {'docs': {}, 'mappings': {}, 'settings': {}}
+            docs = self.indices[index]['docs']
+            doc_id = doc_id or str(next(self._ids))
+            created = doc_id not in docs
+            docs[doc_id] = source
+        return {'_index': index, '_id': doc_id, 'result': 'created' if created else 'updated'}
+
+    # --- HTTP plumbing -----------------------------------------------------------------------
+
+    def dispatch(self, method, path, params, body):
+        for route_method, pattern, handler in self._routes:
+            if route_method != method:
+                continue
+            match = pattern.match(path)
+            if match:
+                return handler(params, body, **match.groupdict())
+        return 400, _error('illegal_argument_exception', f"unsupported request {method} {path}", 400)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                path, _, query = self.path.partition('?')
+                params = dict(part.split('=', 1) if '=' in part else (part, '') for part in query.split('&') if part)
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload = stub.dispatch(self.command, path.rstrip('/') or '/', params, body)
+                data = b'' if payload is None else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('X-Elastic-Product', 'Elasticsearch')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _json(body):
+    return json.loads(body) if body else None
+
+
+# --- query evaluation --------------------------------------------------------------------------
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _values(source, field):
+    """Returns the raw values of a (possibly sub-)field, e.g. 'tags.keyword' or 'name._2gram'."""
+    value = source.get(field.split('.')[0])
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _tokens(values):
+    return [token for value in values for token in _TOKEN.findall(str(value).lower())]
+
+
+def _completion_text(text):
+    """Analyzes a completion input or prefix: whitespace collapsed and case folded."""
+    return ' '.join(str(text).split()).casefold()
+
+
+def _field_boost(field):
+    name, _, boost = field.partition('^')
+    return name, float(boost or 1)
+
+
+def _text_score(query_tokens, field_tokens):
+    present = set(field_tokens)
+    matched = [token for token in query_tokens if token in present]
+    return len(matched) / (1 + len(field_tokens) ** 0.5) * 10 if matched else 0.0
+
+
+def evaluate(query, source, doc_id):
+    """
+    Scores a document against a subset of the query DSL; returns None when it does not match.
+    """
+    (kind, spec), = query.items()
+    if kind == 'match_all':
+        return 1.0
+    if kind == 'ids':
+        return 1.0 if doc_id in spec.get('values', []) else None
+    if kind == 'exists':
+        return 1.0 if _values(source, spec['field']) else None
+    if kind in ('term', 'terms'):
+        (field, wanted), = ((key, value) for key, value in spec.items() if key != 'boost')
+        wanted = wanted.get('value') if isinstance(wanted, dict) else wanted
+        wanted = set(map(str, wanted if isinstance(wanted, list) else [wanted]))
+        return 1.0 if wanted & set(map(str, _values(source, field))) else None
+    if kind == 'range':
+        (field, bounds), = spec.items()
+        values = _values(source, field)
+        return 1.0 if any(_in_range(value, bounds) for value in values) else None
+    if kind in ('match', 'match_phrase', 'match_phrase_prefix'):
+        (field, text), = spec.items()
+        text = text.get('query', '') if isinstance(text, dict) else text
+        field_tokens = _tokens(_values(source, field))
+        query_tokens = _tokens([text])
+        if kind == 'match':
+            score = _text_score(query_tokens, field_tokens)
+            return score or None
+        if not query_tokens:
+            return None
+        window = len(query_tokens)
+        for start in range(len(field_tokens) - window + 1):
+            candidate = field_tokens[start:start + window]
+            if candidate[:-1] == query_tokens[:-1] and (
+                    candidate[-1] == query_tokens[-1] or
+                    (kind == 'match_phrase_prefix' and candidate[-1].startswith(query_tokens[-1]))):
+                return 10.0 * window / (1 + len(field_tokens) ** 0.5)
+        return None
+    if kind == 'multi_match':
+        query_tokens = _tokens([spec.get('query', '')])
+        if not query_tokens:
+            return None
+        scores = []
+        for field, boost in map(_field_boost, spec.get('fields', ['*'])):
+            field_tokens = _tokens(_values(source, field))
+            if spec.get('type') == 'bool_prefix':
+                present = set(field_tokens)
+                if all(token in present for token in query_tokens[:-1]) and any(
+                        token.startswith(query_tokens[-1]) for token in field_tokens):
+                    scores.append(boost * len(query_tokens))
+                continue
+            scores.append(boost * _text_score(query_tokens, field_tokens))
+        best = max(scores, default=0.0)
+        return best or None
+    if kind == 'bool':
+        score = 0.0
+        for clause in _as_list(spec.get('must')):
+            clause_score = evaluate(clause, source, doc_id)
+            if clause_score is None:
+                return None
+            score += clause_score
+        for clause in _as_list(spec.get('filter')):
+            if evaluate(clause, source, doc_id) is None:
+                return None
+        for clause in _as_list(spec.get('must_not')):
+            if evaluate(clause, source, doc_id) is not None:
+                return None
+        should = [evaluate(clause, source, doc_id) for clause in _as_list(spec.get('should'))]
+        matched = [clause_score for clause_score in should if clause_score is not None]
+        required = spec.get('minimum_should_match', 0 if (spec.get('must') or spec.get('filter')) else 1)
+        if should and len(matched) < int(required):
+            return None
+        return score + sum(matched) or 1.0
+    if kind in ('constant_score', 'function_score'):
+        inner = spec.get('filter') or spec.get('query') or {'match_all': {}}
+        return None if evaluate(inner, source, doc_id) is None else float(spec.get('boost', 1.0))
+    raise ValueError(f"unsupported query [{kind}]")
+
+
+def aggregate(aggs, hits):
+    """
+    Computes a subset of the aggregations (terms, filter, min, max, yearly date_histogram) over the matching hits.
+    """
+    results = {}
+    for name, spec in aggs.items():
+        sub_aggs = spec.get('aggs') or spec.get('aggregations')
+        kind = next(key for key in spec if key not in ('aggs', 'aggregations', 'meta'))
+        body = spec[kind]
+        if kind == 'filter':
+            matching = [hit for hit in hits if evaluate(body, hit['_source'], hit['_id']) is not None]
+            result = {'doc_count': len(matching)}
+            if sub_aggs:
+                result.update(aggregate(sub_aggs, matching))
+        elif kind == 'terms':
+            counts = {}
+            for hit in hits:
+                for value in set(map(str, _values(hit['_source'], body['field']))):
+                    counts[value] = counts.get(value, 0) + 1
+            ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            size = int(body.get('size', 10))
+            result = {'doc_count_error_upper_bound': 0,
+                      'sum_other_doc_count': sum(count for _, count in ordered[size:]),
+                      'buckets': [{'key': key, 'doc_count': count} for key, count in ordered[:size]]}
+        elif kind == 'date_histogram':
+            if body.get('calendar_interval', body.get('interval')) not in ('year', '1y'):
+                raise ValueError("only yearly date_histogram is supported")
+            counts = {}
+            for hit in hits:
+                for value in set(str(value)[:4] for value in _values(hit['_source'], body['field'])):
+                    counts[value] = counts.get(value, 0) + 1
+            result = {'buckets': [
+                {'key_as_string': year, 'key': int(datetime.datetime(int(year), 1, 1, tzinfo=datetime.timezone.utc)
+                                                   .timestamp() * 1000), 'doc_count': count}
+                for year, count in sorted(counts.items()) if count >= int(body.get('min_doc_count', 0))
+            ]}
+        elif kind in ('min', 'max'):
+            values = [value for hit in hits for value in _values(hit['_source'], body['field'])
+                      if isinstance(value, (int, float))]
+            result = {'value': (min if kind == 'min' else max)(values) if values else None}
+        else:
+            raise ValueError(f"unsupported aggregation [{kind}]")
+        results[name] = result
+    return results
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _in_range(value, bounds):
+    value = str(value) if not isinstance(value, (int, float)) else value
+    for op, limit in bounds.items():
+        if op == 'format':
+            continue
+        limit = str(limit) if not isinstance(value, (int, float)) else float(limit)
+        if (op == 'gte' and not value >= limit) or (op == 'gt' and not value > limit) or \
+                (op == 'lte' and not value <= limit) or (op == 'lt' and not value < limit):
+            return False
+    return True
+
+
+def _query_terms(query):
+    """Collects the free-text terms of a query for highlighting."""
+    terms = []
+    for kind, spec in query.items():
+        if kind == 'multi_match':
+            terms += _tokens([spec.get('query', '')])
+        elif kind in ('match', 'match_phrase', 'match_phrase_prefix'):
+            for text in spec.values():
+                terms += _tokens([text.get('query', '') if isinstance(text, dict) else text])
+        elif kind == 'bool':
+            for clause in _as_list(spec.get('must')) + _as_list(spec.get('should')):
+                terms += _query_terms(clause)
+    return terms
+
+
+def _sort_spec(spec):
+    if isinstance(spec, str):
+        return spec, 'desc' if spec == '_score' else 'asc'
+    (field, options), = spec.items()
+    order = options.get('order', 'asc') if isinstance(options, dict) else options
+    return field, order
+
+
+def _sort_value(hit, field):
+    if field == '_score':
+        return hit['_score']
+    if field in ('_doc', '_shard_doc', '_id'):
+        return hit['_id']
+    values = _values(hit['_source'], field)
+    return values[0] if values else None
+
+
+class _Reversed:
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _sort_key(values, specs):
+    key = []
+    for value, (_, order) in zip(values, specs):
+        # Missing values sort last in both directions
+        missing = value is None
+        value = '' if missing else value
+        key.append((missing, _Reversed(value) if order == 'desc' else value))
+    return tuple(key)
+
+
+def _shape_hit(hit, source_filter, highlight, terms):
+    excludes = hit.pop('_excludes')
+    source = {key: value for key, value in hit.pop('_source').items() if key not in excludes}
+    if highlight and terms:
+        fragments = {}
+        pre, post = highlight.get('pre_tags', ['<em>'])[0], highlight.get('post_tags', ['</em>'])[0]
+        pattern = re.compile(r'\b(' + '|'.join(map(re.escape, sorted(set(terms)))) + r')\b', re.IGNORECASE)
+        for field in highlight.get('fields', {}):
+            text = ' '.join(map(str, _values(source, field)))
+            if pattern.search(text):
+                fragments[field] = [pattern.sub(lambda match: f"{pre}{match.group(0)}{post}", text)]
+        if fragments:
+            hit['highlight'] = fragments
+    if source_filter is False or source_filter == 'false':
+        return
+    if isinstance(source_filter, str) and source_filter != 'true':
+        source_filter = source_filter.split(',')
+    if isinstance(source_filter, list):
+        source_filter = {'includes': source_filter}
+    if isinstance(source_filter, dict):
+        includes = source_filter.get('includes') or list(source)
+        excludes = source_filter.get('excludes', [])
+        source = {key: value for key, value in source.items() if key in includes and key not in excludes}
+    hit['_source'] = source
+
+
+def _hits_response(hits, total):
+    return {'took': 0, 'timed_out': False, '_shards': {'total': 1, 'successful': 1, 'skipped': 0, 'failed': 0},
+            'hits': {'total': {'value': total, 'relation': 'eq'}, 'max_score': 1.0 if hits else None, 'hits': hits}}
+
+
+def _error(error_type, reason, status):
+    return {'error': {'type': error_type, 'reason': reason}, 'status': status}
@@ -0,0 +1,144 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LLMStub:
+    """
+    Local stand-in for an OpenAI-compatible chat completions endpoint such as KISSKI Chat AI.
+
+    The model is simulated by a fixed delay before the first token (prompt processing) and a delay per
+    generated token. Streaming requests receive one SSE chunk per token; if the client goes away the
+    generation stops, which is counted in `cancelled`. A share of requests (`error_rate`) fails with
+    `error_status` to exercise retries and the circuit breaker.
+    """
+
+    def __init__(self, first_token_delay=0.5, token_delay=0.02, tokens=200, error_rate=0.0, error_status=503,
+                 host='127.0.0.1', port=0):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.connections = 0
+        self.requests = 0
+        self.failed = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.generated_tokens = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def generate(self, max_tokens):
+        """
+        Yields the simulated completion token by token, sleeping like a model would.
+        """
+        time.sleep(self.first_token_delay)
+        for position in range(min(self.tokens, max_tokens or self.tokens)):
+            if position:
+                time.sleep(self.token_delay)
+            yield f"token{position} "
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stub._count('connections')
+
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+                    return
+                stub._count('requests')
+                if stub.error_rate and random.random() < stub.error_rate:
+                    stub._count('failed')
+                    self._send_json(stub.error_status, {'error': {'message': 'injected failure'}})
+                    return
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                model = body.get('model', 'stub')
+                tokens = stub.generate(body.get('max_tokens'))
+
+                if not body.get('stream'):
+                    content = ''.join(tokens)
+                    stub._count('generated_tokens', len(content.split()))
+                    stub._count('completed')
+                    self._send_json(200, {
+                        'id': completion_id,
+                        'object': 'chat.completion',
+                        'model': model,
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                     'finish_reason': 'stop'}],
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                # Chunked so the connection can be reused by pooling clients
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                                 'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+                        self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                        stub._count('generated_tokens')
+                    self._send_chunk(b"data: [DONE]\n\n")
+                    self._send_chunk(b"")
+                    stub._count('completed')
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    stub._count('cancelled')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
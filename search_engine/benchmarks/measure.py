@@ -0,0 +1,135 @@
+import datetime
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Bump when the layout of the reports changes, so compare.py never matches up unrelated numbers
+REPORT_SCHEMA_VERSION = 1
+
+
+def percentiles(values):
+    """
+    Summarizes latencies in milliseconds as p50/p95/p99, maximum and mean.
+
+    Uses the nearest-rank method, so the numbers are actual observations and stable across runs.
+    """
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None, 'mean': None}
+    values = sorted(values)
+
+    def rank(fraction):
+        return round(values[min(max(int(len(values) * fraction + 0.5) - 1, 0), len(values) - 1)], 2)
+
+    return {'p50': rank(0.5), 'p95': rank(0.95), 'p99': rank(0.99), 'max': round(values[-1], 2),
+            'mean': round(statistics.mean(values), 2)}
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the calling process in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_requests(send, payloads, concurrency, warmup=0):
+    """
+    Sends a fixed list of requests from closed-loop clients and measures them.
+
+    A fixed request count (instead of a fixed duration) keeps the work identical between runs, so
+    reports of different commits are comparable.
+
+    Args:
+        send (callable): Called with a requests.Session and one payload; returns the response.
+        payloads (list): One entry per request, sent in order by whichever client is free.
+        concurrency (int): Number of concurrent clients.
+        warmup (int): Requests sent (and not measured) before the measured ones, e.g. to fill caches
+            and connection pools.
+
+    Returns:
+        dict: Request count, status counts, wall time, throughput, latency percentiles and bytes received.
+    """
+    sessions = threading.local()
+
+    def session():
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        return sessions.session
+
+    for payload in payloads[:warmup]:
+        send(session(), payload)
+
+    measured = payloads[warmup:]
+    results = []
+    lock = threading.Lock()
+    position = iter(range(len(measured)))
+
+    def client():
+        while True:
+            with lock:
+                number = next(position, None)
+            if number is None:
+                return
+            started = time.perf_counter()
+            try:
+                response = send(session(), measured[number])
+                status, size = response.status_code, len(response.content)
+            except requests.RequestException:
+                status, size = 'error', 0
+            latency = (time.perf_counter() - started) * 1000
+            with lock:
+                results.append((status, latency, size))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    ok = [latency for status, latency, _ in results if status == 200]
+    received = sum(size for _, _, size in results)
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'status': dict(sorted(Counter(str(status) for status, _, _ in results).items())),
+        'errors': len(results) - len(ok),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'latency_ms': percentiles(ok),
+        'bytes_per_response': round(received / len(results)) if results else 0,
+        'mb_per_second': round(received / elapsed / 1e6, 2) if elapsed else None,
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def environment():
+    """
+    Describes where a report was measured: commit, interpreter and machine.
+    """
+    return {
+        'commit': _git('rev-parse', 'HEAD') or None,
+        # Uncommitted changes mean the commit alone does not identify the measured code
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
@@ -0,0 +1,268 @@
+"""
+Reproducible benchmark suite of the services against local stand-ins for Elasticsearch and the LLM.
+
+A synthetic catalogue of --docs resources (see synthetic.py) is written as a resource snapshot, the
+in-memory Elasticsearch stand-in and the OpenAI-compatible LLM stub run in a process of their own, and
+every scenario runs the real service code in a fresh process:
+
+  indexing   - index_yaml_files(force_rebuild=True) of the indexer (indexer.py): documents per second
+  search     - /api/search with a Zipf-distributed query mix, some with facets, filters or sorting
+  suggest    - /api/suggest with name prefixes as typed while searching
+  materials  - /api/materials, the full catalogue streamed from the index
+  chat       - /api/chat of the chatbot, every question distinct so the answer cache never hits
+
+Indexing always runs first, the other scenarios query its index. Requests are generated from --seed
+and their number is fixed, so two runs do the same work. For every scenario the report holds p50/p95/
+p99 latencies, throughput and the peak RSS of the service process (the load generator and the stand-ins
+are not counted). Reports are JSON; compare two of them with benchmarks.compare.
+
+Usage:
+    python -m benchmarks.suite --docs 5000 --output report.json
+    python -m benchmarks.suite --docs 100000 --scenarios indexing,search,suggest
+    python -m benchmarks.suite --search-backend local --output local.json
+
+Run from the search_engine directory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.measure import REPORT_SCHEMA_VERSION, environment, peak_rss_mb, run_requests
+from benchmarks.synthetic import TAGS, TYPES, WORDS, generate_resources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ['indexing', 'search', 'suggest', 'materials', 'chat']
+
+
+def serve_stand_ins(connection, es_latency, first_token_delay, token_delay, tokens):
+    """
+    Runs the Elasticsearch stand-in and the LLM stub until told to stop (in a process of its own).
+    """
+    from benchmarks.es_stub import ElasticsearchStub
+    from benchmarks.llm_stub import LLMStub
+
+    with ElasticsearchStub(latency=es_latency) as es_stub, LLMStub(first_token_delay, token_delay, tokens) as llm:
+        connection.send({'es_url': es_stub.url, 'llm_url': llm.url})
+        connection.recv()
+        # CPU spent in the stand-ins, to tell their share of the latencies apart from the services'
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        connection.send({'es_requests': es_stub.requests, 'llm_requests': llm.requests,
+                         'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 2)})
+
+
+def run_indexing(connection, env):
+    """
+    Indexes the snapshot into a new index generation and reports the throughput.
+    """
+    os.environ.update(env)
+    sys.path.insert(0, os.path.join(ROOT, 'search', 'backend'))
+    import indexer
+
+    docs = indexer.resource_source.manifest['resources']
+    started = time.perf_counter()
+    summary = indexer.index_yaml_files(force_rebuild=True)
+    elapsed = time.perf_counter() - started
+    if summary is None:
+        raise RuntimeError("indexing failed, see the log above")
+    connection.send({'docs': docs, 'seconds': round(elapsed, 3), 'docs_per_second': round(docs / elapsed, 1),
+                     'peak_rss_mb': peak_rss_mb()})
+
+
+def serve_app(connection, env, service):
+    """
+    Serves the Flask app of a service until told to stop, then reports its peak RSS and statistics.
+    """
+    os.environ.update(env)
+    from werkzeug.serving import make_server
+
+    if service == 'chatbot':
+        sys.path.insert(0, os.path.join(ROOT, 'chatbot'))
+        import chatbot as module
+        stats = lambda: {'llm': module.llm_util.stats()}  # noqa: E731
+    else:
+        sys.path.insert(0, os.path.join(ROOT, 'search', 'backend'))
+        import index_data as module
+        stats = lambda: {'cache': module.query_cache.stats()}  # noqa: E731
+
+    server = make_server('127.0.0.1', 0, module.app, threaded=True)
+    server.request_queue_size = 256
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection.send(f"http://127.0.0.1:{server.server_port}")
+    connection.recv()
+    server.shutdown()
+    connection.send({'peak_rss_mb': peak_rss_mb(), **stats()})
+
+
+def search_requests(count, rng):
+    """
+    Builds the /api/search parameters of a run.
+
+    Queries come from a fixed pool of word combinations and are drawn with Zipf weights, as real search
+    traffic repeats popular queries; the query cache is part of the measured system.
+    """
+    pool = [' '.join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(500)]
+    weights = [1 / rank for rank in range(1, len(pool) + 1)]
+    params = []
+    for query in rng.choices(pool, weights=weights, k=count):
+        item = {'q': query, 'page': rng.choice([1, 1, 1, 2, 3])}
+        roll = rng.random()
+        if roll < 0.3:
+            item['facets'] = 'true'
+        elif roll < 0.45:
+            item['type'] = rng.choice(TYPES[:5])
+        elif roll < 0.55:
+            item['tags'] = rng.choice(TAGS[:10])
+        if rng.random() < 0.1:
+            item['sort'] = rng.choice(['date', 'downloads'])
+        params.append(item)
+    return params
+
+
+def suggest_requests(count, rng, docs, seed):
+    """
+    Builds /api/suggest prefixes: the first 2 to 12 characters of names of the catalogue.
+    """
+    names = [item['name'] for item in generate_resources(min(docs, 2000), seed)]
+    return [{'q': name[:rng.randint(2, 12)]} for name in rng.choices(names, k=count)]
+
+
+class Stage:
+    """
+    A service process of one scenario: started on enter, stopped and measured on exit.
+    """
+
+    def __init__(self, context, target, *args):
+        self.connection, self.child = context.Pipe()
+        self.process = context.Process(target=target, args=(self.child, *args), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        # Only the child holds its end now, so a crashed child shows up as EOFError instead of a hang
+        self.child.close()
+        try:
+            return self.connection.recv()
+        except EOFError:
+            self.process.join(5)
+            raise RuntimeError(f"{self.process.name} exited with code {self.process.exitcode}") from None
+
+    def stop(self):
+        self.connection.send('stop')
+        result = self.connection.recv()
+        self.process.join(30)
+        return result
+
+    def __exit__(self, *exc):
+        if self.process.is_alive():
+            self.process.kill()
+
+
+def write_corpus(directory, docs, seed):
+    """
+    Writes the synthetic catalogue as the current resource snapshot.
+    """
+    from common.snapshot import normalize_resource, write_snapshot
+
+    started = time.perf_counter()
+    manifest = write_snapshot((normalize_resource(item) for item in generate_resources(docs, seed)), directory,
+                              source=f"synthetic:{docs}:{seed}")
+    return {'docs': manifest['resources'], 'seed': seed, 'content_hash': manifest['content_hash'],
+            'snapshot_bytes': manifest['bytes'], 'generate_seconds': round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per search/suggest run')
+    parser.add_argument('--materials-requests', type=int, default=10)
+    parser.add_argument('--chat-requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--search-backend', choices=['elasticsearch', 'local'], default='elasticsearch',
+                        help='engine the services search with (SEARCH_BACKEND)')
+    parser.add_argument('--es-latency', type=float, default=0.0, help='seconds added to every stand-in ES request')
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--output', help='write the JSON report here instead of printing it')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    # The other scenarios query the index built by the indexing scenario
+    scenarios = ['indexing'] + [name for name in SCENARIOS[1:] if name in scenarios]
+
+    report = {'schema_version': REPORT_SCHEMA_VERSION, 'environment': environment(),
+              'config': {key: value for key, value in vars(args).items() if key != 'output'}, 'corpus': None,
+              'scenarios': {}}
+    # Fresh processes, so no service inherits the generator's memory or imports
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='nfdi-bench-') as workdir:
+        snapshot_dir = os.path.join(workdir, 'snapshot')
+        report['corpus'] = write_corpus(snapshot_dir, args.docs, args.seed)
+        print(f"Wrote {args.docs} synthetic resources in {report['corpus']['generate_seconds']}s", file=sys.stderr)
+
+        stand_ins = Stage(context, serve_stand_ins, args.es_latency, args.first_token_delay, args.token_delay,
+                          args.tokens)
+        with stand_ins as urls:
+            host, port = urls['es_url'].rsplit('//', 1)[1].split(':')
+            env = {'ELASTICSEARCH_HOST': host, 'ELASTICSEARCH_PORT': port, 'SNAPSHOT_DIR': snapshot_dir,
+                   'EMBEDDINGS_DIR': os.path.join(workdir, 'embeddings'), 'KISSKI_API_BASE': urls['llm_url'],
+                   'KISSKI_API_KEY': 'benchmark', 'QUERY_CACHE_BACKEND': 'memory',
+                   'SEARCH_BACKEND': args.search_backend, 'LOCAL_INDEX_DIR': os.path.join(workdir, 'local-index')}
+            rng = random.Random(args.seed)
+            for name in scenarios:
+                print(f"Running {name}", file=sys.stderr)
+                if name == 'indexing':
+                    stage = Stage(context, run_indexing, env)
+                    with stage as result:
+                        stage.process.join()
+                    report['scenarios'][name] = result
+                    continue
+
+                service = 'chatbot' if name == 'chat' else 'search'
+                stage = Stage(context, serve_app, env, service)
+                with stage as url:
+                    if name == 'search':
+                        result = run_requests(lambda session, params: session.get(f"{url}/api/search", params=params),
+                                              search_requests(args.warmup + args.requests, rng),
+                                              args.concurrency, args.warmup)
+                    elif name == 'suggest':
+                        result = run_requests(lambda session, params: session.get(f"{url}/api/suggest", params=params),
+                                              suggest_requests(args.warmup + args.requests, rng, args.docs, args.seed),
+                                              args.concurrency, args.warmup)
+                    elif name == 'materials':
+                        result = run_requests(lambda session, params: session.get(f"{url}/api/materials", params=params),
+                                              [{}] * (1 + args.materials_requests), min(args.concurrency, 2), 1)
+                    else:
+                        questions = [{'query': f"{' '.join(rng.sample(WORDS, 3))} question {number}"}
+                                     for number in range(args.chat_requests)]
+                        result = run_requests(lambda session, body: session.post(f"{url}/api/chat", json=body,
+                                                                                 timeout=300),
+                                              questions, args.concurrency)
+                    result.update(stage.stop())
+                report['scenarios'][name] = result
+            report['stand_ins'] = stand_ins.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+        print(f"Wrote report to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Synthetic catalogue shaped like nfdi4bioimage.yml, for benchmarks at any scale.
+
+Tags, types and licenses follow Zipf distributions like the real catalogue, where a few values
+(Bioimage Analysis, Slides, CC-BY-4.0) cover most entries. The same count and seed always give the
+same catalogue.
+
+Usage:
+    python -m benchmarks.synthetic --count 1000000 --output catalogue.yml
+    python -m benchmarks.synthetic --count 100000 --snapshot data/snapshot
+
+Run from the search_engine directory.
+"""
+import argparse
+import random
+import time
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper as Dumper
+
+# Vocabularies modelled on the entries of nfdi4bioimage.yml
+TAGS = [
+    'Bioimage Analysis', 'Python', 'Microscopy', 'Research Data Management', 'FAIR-Principles',
+    'Image Segmentation', 'Napari', 'Fiji', 'ImageJ', 'Deep Learning', 'OMERO', 'Neubias',
+    'Workflow Engine', 'Image Data Management', 'Sharing', 'Metadata', 'Artificial Intelligence',
+    'Machine Learning', 'GPU', 'Big Data', 'Licensing', 'Open Science', 'Cell Tracking',
+    'Light-sheet Microscopy', 'Electron Microscopy', 'Zarr', 'OME-NGFF', 'Jupyter', 'R', 'Galaxy',
+]
+TYPES = ['Slides', 'Tutorial', 'Video', 'Publication', 'Notebook', 'Github Repository', 'Collection',
+         'Book', 'Blog Post', 'Workshop', 'Documentation', 'Code', 'Application']
+LICENSES = ['CC-BY-4.0', 'MIT', 'BSD-3-Clause', 'CC0-1.0', 'Apache-2.0', 'GPL-3.0', 'CC-BY-SA-4.0', 'unknown']
+FIRST_NAMES = ['Anna', 'Robert', 'Elisa', 'Jan', 'Marie', 'Tom', 'Sofia', 'Lukas', 'Nina', 'Paul', 'Mara', 'Felix']
+LAST_NAMES = ['Haase', 'Schmidt', 'Meyer', 'Weber', 'Fischer', 'Wagner', 'Becker', 'Hoffmann', 'Koch', 'Richter']
+WORDS = [
+    'image', 'analysis', 'microscopy', 'segmentation', 'data', 'python', 'training', 'introduction',
+    'workflow', 'cell', 'nuclei', 'tracking', 'quantitative', 'fluorescence', 'processing', 'deep',
+    'learning', 'management', 'metadata', 'open', 'science', 'course', 'tutorial', 'napari', 'fiji',
+    'reproducible', 'storage', 'sharing', 'visualization', 'pipeline', 'labeling', 'classification',
+]
+
+
+def _zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+TAG_WEIGHTS = _zipf_weights(len(TAGS))
+TYPE_WEIGHTS = _zipf_weights(len(TYPES), 1.3)
+LICENSE_WEIGHTS = _zipf_weights(len(LICENSES), 1.5)
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def generate_resource(rng, number):
+    """
+    Generates one synthetic resource shaped like an entry of nfdi4bioimage.yml.
+
+    Args:
+        rng (random.Random): Random generator to draw from.
+        number (int): Sequence number, used to keep names and URLs unique.
+
+    Returns:
+        dict: The resource entry.
+    """
+    # Like the real catalogue, a share of the entries carries a single string instead of a list
+    types = rng.choices(TYPES, weights=TYPE_WEIGHTS, k=rng.randint(1, 2))
+    licenses = rng.choices(LICENSES, weights=LICENSE_WEIGHTS, k=1)
+    resource = {
+        'name': f"{_sentence(rng, 3, 8)} {number}",
+        'description': _sentence(rng, 10, 40),
+        'authors': [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.randint(1, 4))],
+        'tags': sorted(set(rng.choices(TAGS, weights=TAG_WEIGHTS, k=rng.randint(1, 6)))),
+        'type': types[0] if len(types) == 1 and rng.random() < 0.5 else types,
+        'license': licenses[0] if rng.random() < 0.7 else licenses,
+        'url': f"https://zenodo.org/records/{1000000 + number}",
+    }
+    if rng.random() < 0.6:
+        resource['publication_date'] = f"{rng.randint(2012, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    if rng.random() < 0.4:
+        resource['num_downloads'] = int(rng.paretovariate(1.2) * 10)
+    return resource
+
+
+def generate_resources(count, seed=42):
+    """
+    Lazily generates a reproducible synthetic catalogue.
+
+    Args:
+        count (int): Number of resources to generate.
+        seed (int): Seed for the random generator.
+
+    Yields:
+        dict: Resource entries.
+    """
+    rng = random.Random(seed)
+    for number in range(count):
+        yield generate_resource(rng, number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--output', help='YAML file in the format of nfdi4bioimage.yml')
+    target.add_argument('--snapshot', help='directory to write a resource snapshot to (see common/snapshot.py)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    resources = generate_resources(args.count, args.seed)
+    if args.snapshot:
+        from common.snapshot import normalize_resource, write_snapshot
+        manifest = write_snapshot((normalize_resource(item) for item in resources), args.snapshot,
+                                  source=f"synthetic:{args.count}:{args.seed}")
+        print(f"Wrote snapshot {manifest['version']} with {manifest['resources']} resources "
+              f"in {time.perf_counter() - started:.1f}s")
+        return
+    # Written entry by entry, so catalogues of a million resources never sit in memory
+    with open(args.output, 'w', encoding='utf-8') as file:
+        file.write('resources:\n')
+        for resource in resources:
+            entry = yaml.dump([resource], Dumper=Dumper, sort_keys=False, allow_unicode=True, width=120)
+            file.write(''.join(f"  {line}\n" for line in entry.splitlines()))
+    print(f"Wrote {args.count} resources to {args.output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from common.metrics import observe_cache
+
+logger = logging.getLogger(__name__)
+
+# Cache settings, overridable through the environment
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', 4096))
+RETRIEVAL_CACHE_TTL = float(os.getenv('RETRIEVAL_CACHE_TTL', 600))
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 1024))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 3600))
+# How often the index generation is looked up in Elasticsearch
+GENERATION_CHECK_INTERVAL = float(os.getenv('GENERATION_CHECK_INTERVAL', 5))
+
+
+def normalize_query(query):
+    """
+    Normalizes a question so that case and whitespace variations share one cache entry.
+    """
+    return ' '.join(query.split()).casefold()
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU store with per-entry expiry.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedStream:
+    """
+    One upstream LLM generation that any number of identical requests can follow.
+
+    A background thread pulls the pieces from the upstream stream into a buffer; every subscriber
+    replays the buffer from the start and then waits for new pieces. When the last subscriber leaves
+    before the generation is finished, the upstream stream is closed so no quota is spent on it.
+    """
+
+    def __init__(self, key, tokens, on_finish, lock):
+        """
+        Args:
+            key (str): Answer cache key of the generation.
+            tokens (iterator): Upstream stream of text pieces; closed when the generation ends or is abandoned.
+            on_finish (callable): Called with the stream once it is complete, failed or cancelled.
+            lock (threading.RLock): Lock shared with the registry of in-flight generations.
+        """
+        self.key = key
+        self.pieces = []
+        self.subscribers = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._tokens = tokens
+        self._on_finish = on_finish
+        self._changed = threading.Condition(lock)
+
+    def start(self):
+        threading.Thread(target=self._pump, name='llm-stream', daemon=True).start()
+        return self
+
+    @property
+    def text(self):
+        return ''.join(self.pieces)
+
+    def _pump(self):
+        try:
+            for piece in self._tokens:
+                with self._changed:
+                    if not self.subscribers:
+                        self.cancelled = True
+                        break
+                    self.pieces.append(piece)
+                    self._changed.notify_all()
+        except Exception as e:
+            logger.error(f"Error streaming response from KISSKI LLM: {e}")
+            self.error = e
+        finally:
+            self._tokens.close()
+            with self._changed:
+                self.done = True
+                self._changed.notify_all()
+                self._on_finish(self)
+
+    def subscribe(self):
+        """
+        Attaches a subscriber; must be called with the registry lock held.
+        """
+        self.subscribers += 1
+        return Subscription(self)
+
+
+class Subscription:
+    """
+    Iterator over the pieces of a shared generation; closing it detaches from the generation.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        stream = self.stream
+        with stream._changed:
+            while self.position >= len(stream.pieces) and not stream.done:
+                stream._changed.wait()
+            if self.position < len(stream.pieces):
+                self.position += 1
+                return stream.pieces[self.position - 1]
+        self.close()
+        if stream.error is not None:
+            raise stream.error
+        if stream.cancelled:
+            raise RuntimeError("The generation was cancelled")
+        raise StopIteration
+
+    def close(self):
+        with self.stream._changed:
+            if not self.closed:
+                self.closed = True
+                self.stream.subscribers -= 1
+
+    def __del__(self):
+        self.close()
+
+
+class ChatCache:
+    """
+    Two-level cache for the chatbot with coalescing of identical in-flight generations.
+
+    The retrieval level maps a normalized question to the IDs of the retrieved documents; the answer
+    level maps the hash of the prompt and the model name to the generated answer. Both are emptied
+    when the index generation changes. Identical prompts generated concurrently share one upstream call.
+    """
+
+    def __init__(self, generation_func, retrieval_size=RETRIEVAL_CACHE_SIZE, retrieval_ttl=RETRIEVAL_CACHE_TTL,
+                 answer_size=ANSWER_CACHE_SIZE, answer_ttl=ANSWER_CACHE_TTL,
+                 check_interval=GENERATION_CHECK_INTERVAL):
+        """
+        Args:
+            generation_func (callable): Returns the current index generation as a string.
+            retrieval_size (int): Maximum number of cached retrievals.
+            retrieval_ttl (float): Seconds a retrieval is kept.
+            answer_size (int): Maximum number of cached answers.
+            answer_ttl (float): Seconds an answer is kept.
+            check_interval (float): Seconds between generation lookups.
+        """
+        self.generation_func = generation_func
+        self.retrievals = TTLCache(retrieval_size, retrieval_ttl)
+        self.answers = TTLCache(answer_size, answer_ttl)
+        self.check_interval = check_interval
+        self.counters = {'retrieval_hits': 0, 'retrieval_misses': 0, 'answer_hits': 0, 'answer_misses': 0,
+                         'coalesced': 0}
+        self._generation = None
+        self._checked_at = 0.0
+        self._in_flight = {}
+        # Reentrant because a subscription may be garbage collected while the lock is held
+        self._lock = threading.RLock()
+
+    def generation(self):
+        """
+        Returns the index generation, refreshing it at most every check_interval seconds and
+        invalidating both levels when it changed.
+        """
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._generation
+        try:
+            generation = self.generation_func()
+        except Exception as e:
+            logger.error(f"Error looking up the index generation: {e}")
+            generation = self._generation
+        self._checked_at = time.monotonic()
+        if generation != self._generation:
+            logger.info(f"Index generation changed to {generation}, clearing chat caches")
+            self.retrievals.clear()
+            self.answers.clear()
+            self._generation = generation
+        return generation
+
+    def document_ids(self, query, top_k):
+        """
+        Returns the cached document IDs retrieved for the question, or None on a miss.
+        """
+        if self.generation() is None:
+            return None
+        ids = self.retrievals.get(f"{normalize_query(query)}|{top_k}")
+        self.counters['retrieval_hits' if ids is not None else 'retrieval_misses'] += 1
+        observe_cache('chat_retrieval', ids is not None)
+        return ids
+
+    def set_document_ids(self, query, top_k, ids):
+        if self.generation() is not None:
+            self.retrievals.set(f"{normalize_query(query)}|{top_k}", list(ids))
+
+    @staticmethod
+    def answer_key(prompt, model_name):
+        return f"{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}|{model_name}"
+
+    def answer(self, prompt, model_name):
+        """
+        Returns the cached answer for the prompt and model, or None on a miss.
+        """
+        self.generation()
+        answer = self.answers.get(self.answer_key(prompt, model_name))
+        self.counters['answer_hits' if answer is not None else 'answer_misses'] += 1
+        observe_cache('chat_answer', answer is not None)
+        return answer
+
+    def stream_answer(self, prompt, model_name, generate):
+        """
+        Follows the generation of the prompt, joining an identical one already in flight.
+
+        Args:
+            prompt (str): The LLM prompt.
+            model_name (str): The model generating the answer, part of the key.
+            generate (callable): Starts the upstream generation and returns a closable iterator of text pieces.
+                Exceptions it raises (e.g. overload) propagate to the caller.
+
+        Returns:
+            Subscription: Iterator over the text pieces; close it to leave the generation early.
+        """
+        key = self.answer_key(prompt, model_name)
+        with self._lock:
+            stream = self._in_flight.get(key)
+            if stream is not None:
+                self.counters['coalesced'] += 1
+                return stream.subscribe()
+        # Starting the generation may wait for a free slot, so it must not hold the lock
+        tokens = generate()
+        with self._lock:
+            stream = self._in_flight.get(key)
+            if stream is not None:
+                # An identical generation started in the meantime; follow it and give back our slot
+                tokens.close()
+                self.counters['coalesced'] += 1
+                return stream.subscribe()
+            stream = SharedStream(key, tokens, self._finish, self._lock)
+            self._in_flight[key] = stream
+            subscription = stream.subscribe()
+        stream.start()
+        return subscription
+
+    def _finish(self, stream):
+        # Called by the stream with the lock held
+        self._in_flight.pop(stream.key, None)
+        if stream.error is None and not stream.cancelled and stream.text.strip():
+            self.answers.set(stream.key, stream.text.strip())
+
+    def stats(self):
+        return {
+            'generation': self._generation,
+            'retrieval_entries': len(self.retrievals),
+            'answer_entries': len(self.answers),
+            'in_flight': len(self._in_flight),
+            **self.counters,
+        }
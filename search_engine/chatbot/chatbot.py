@@ -1,7 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from elasticsearch import Elasticsearch, ConnectionError
 from llm_utilities import LLMUtilities
+from llm_client import LLMUnavailable
+from chat_cache import ChatCache, normalize_query
+from context_packing import get_tokenizer, pack_context
+from common.embeddings import EmbeddingIndex, reciprocal_rank_fusion
+from common.es_client import ElasticsearchUnavailable, get_es
+from common.health import register_health_routes
+from common.metrics import register_metrics, span
+from common.search_backend import create_search_backend
+from common.serving import on_worker_start
+import json
 import logging
 import platform
 import time
@@ -24,48 +33,28 @@ SYSTEM_INFO = {
 }
 logger.info(f"System Info: {SYSTEM_INFO}")
 
-# Function to connect to Elasticsearch with retry logic
-def connect_elasticsearch():
+# Shared Elasticsearch client; it connects on first use, so the chatbot starts serving before Elasticsearch is up
+es = get_es()
+
+# Index maintained by the search backend's indexer: Elasticsearch, or the embedded index with SEARCH_BACKEND=local
+backend = create_search_backend(es)
+
+# Dense retrieval over the embeddings precomputed by the search backend's indexer (see common/embeddings.py)
+embedding_index = EmbeddingIndex()
+
+def retrieval_generation():
     """
-    Connects to Elasticsearch with retry logic.
+    Identifies the index and embeddings generation retrievals are computed from.
     Returns:
-        Elasticsearch instance if connection is successful, otherwise raises an exception.
+        str: '<index generation>|<embeddings generation>', or None if the index does not exist yet.
     """
-    es = None
-    max_attempts = 120  # up to 20 minutes
-    es_host = os.getenv("ELASTICSEARCH_HOST", "elasticsearch")
-    es_port = os.getenv("ELASTICSEARCH_PORT", "9200")
-
-    # Convert es_port to integer
-    try:
-        es_port = int(es_port)
-    except ValueError:
-        logger.error(f"ELASTICSEARCH_PORT is not a valid integer: {es_port}")
-        raise
+    generation = backend.generation()
+    if generation is None:
+        return None
+    return f"{generation}|{embedding_index.current_generation()}"
 
-    for attempt in range(max_attempts):
-        try:
-            es = Elasticsearch(
-                [{"host": es_host, "port": es_port, "scheme": "http"}],
-                request_timeout=30
-            )
-            if es.ping():
-                logger.info("Connected to Elasticsearch")
-                return es
-            else:
-                logger.error("Elasticsearch ping failed")
-        except ConnectionError:
-            logger.warning(
-                f"Elasticsearch not ready, attempt {attempt + 1}/{max_attempts}, retrying in 15 seconds..."
-            )
-            time.sleep(15)
-        except Exception as e:
-            logger.error(f"Unexpected error while connecting to Elasticsearch: {e}")
-            time.sleep(15)
-    raise Exception("Could not connect to Elasticsearch after several attempts")
-
-# Connect to Elasticsearch
-es = connect_elasticsearch()
+# Retrieval and answer cache, invalidated whenever the index or its embeddings change
+chat_cache = ChatCache(retrieval_generation)
 
 # Determine if GPU usage is set (informational only in this remote KISSKI scenario)
 use_gpu_env = os.getenv("USE_GPU", "False").lower() == "true"
@@ -76,50 +65,96 @@ model_name = os.getenv("MODEL_NAME", "meta-llama-3.1-70b-instruct")
 # Initialize the LLM utility for KISSKI
 llm_util = LLMUtilities(model_name=model_name, use_gpu=use_gpu_env)
 
-def retrieve_documents(query, top_k=20):
+# Tokenizer used to keep the document context within CONTEXT_TOKEN_BUDGET (see context_packing)
+tokenizer = get_tokenizer()
+
+def to_document(source):
+    """
+    Reduces an indexed resource to the fields used as LLM context and returned as sources.
+    """
+    return {
+        "name": source.get("name", "Unnamed"),
+        "description": source.get("description", "No description available"),
+        "url": source.get("url", ""),
+    }
+
+def fetch_documents(ids):
+    """
+    Fetches documents by ID, keeping the order of the IDs and skipping ones that no longer exist.
+    """
+    return [to_document(source) for source in backend.documents(ids, ["name", "description", "url"])]
+
+# Retrieval mode: 'hybrid' fuses keyword (BM25) and dense rankings, 'bm25' or 'dense' use one of them
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Number of documents retrieved per question and candidates taken from each ranking before fusion
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", 20))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 50))
+
+# Fields searched by keyword retrieval; descriptions and authors weigh more than in the search UI
+KEYWORD_FIELDS = ["name^3", "description^3", "tags", "authors^3", "type", "license"]
+
+def keyword_ranking(query, size):
+    """
+    Ranks documents for a query with the search backend's full-text (BM25) scoring.
+    Returns:
+        list: Document IDs, best first.
+    """
+    return backend.rank(query, size, KEYWORD_FIELDS)
+
+def rank_documents(query, top_k=CHAT_TOP_K, mode=RETRIEVAL_MODE):
     """
-    Retrieves relevant documents from Elasticsearch based on a user query.
+    Ranks documents for a query by keyword, dense or hybrid retrieval.
+
+    Hybrid retrieval fuses the top candidates of both rankings by reciprocal rank fusion, so documents
+    that use other word forms than the question are found while exact keyword matches stay on top. Without
+    embeddings (e.g. before the first index run) it falls back to keyword retrieval.
+    Args:
+        query (str): The search query.
+        top_k (int): Number of documents to return.
+        mode (str): 'hybrid', 'bm25' or 'dense'.
+    Returns:
+        list: Document IDs, best first.
+    """
+    if mode == "bm25" or not embedding_index.available:
+        return keyword_ranking(query, top_k)
+    if mode == "dense":
+        return embedding_index.search(query, top_k)
+    candidates = max(HYBRID_CANDIDATES, top_k)
+    rankings = [keyword_ranking(query, candidates), embedding_index.search(query, candidates)]
+    return reciprocal_rank_fusion(rankings, limit=top_k)
+
+def retrieve_documents(query, top_k=CHAT_TOP_K):
+    """
+    Retrieves relevant documents from the search backend based on a user query.
+
+    The IDs of the retrieved documents are cached per normalized query, so repeated questions only
+    fetch the documents by ID instead of ranking them again. IDs the index no longer holds, e.g. dense
+    hits from embeddings that lag behind a reindex, are skipped by the fetch.
     Args:
         query (str): The search query.
         top_k (int): Number of top documents to retrieve.
     Returns:
         list: A list of retrieved documents.
+    Raises:
+        ElasticsearchUnavailable: Elasticsearch cannot be reached.
     """
     try:
-        response = es.search(
-            index="bioimage-training",
-            body={
-                "query": {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["name^3", "description^3", "tags", "authors^3", "type", "license"],
-                        "type": "best_fields",
-                    }
-                }
-            },
-            size=top_k,
-        )
-        documents = [
-            {
-                "name": hit["_source"].get("name", "Unnamed"),
-                "description": hit["_source"].get("description", "No description available"),
-                "url": hit["_source"].get("url", ""),
-            }
-            for hit in response["hits"]["hits"]
-        ]
-        return documents
+        ids = chat_cache.document_ids(query, top_k)
+        if ids is None:
+            ids = rank_documents(query, top_k)
+            chat_cache.set_document_ids(query, top_k, ids)
+        return fetch_documents(ids) if ids else []
+    except ElasticsearchUnavailable:
+        raise
     except Exception as e:
-        logger.error(f"Error retrieving documents from Elasticsearch: {e}")
+        logger.error(f"Error retrieving documents from the search backend: {e}")
         return []
 
-def generate_response(query, documents):
+def build_prompt(query, context):
     """
-    Generates a context-aware response from the KISSKI LLM using the provided query and document context.
+    Builds the LLM prompt from the user query and the packed document context.
     """
-    context = "\n".join(
-        [f"- {doc['name']}: {doc['description']} (URL: {doc['url']})" for doc in documents]
-    )
-    prompt = f"""
+    return f"""
 Based on the following documents, answer the user's question concisely and include relevant links.
 
 ## Documents
@@ -128,29 +163,194 @@ Based on the following documents, answer the user's question concisely and inclu
 ## Question
 {query}
 """
-    return llm_util.generate_response(prompt)
+
+def pack_documents(query, documents):
+    """
+    Packs the retrieved documents into the context token budget and adds the prompt size to the report.
+    Returns:
+        dict: Context text, packed documents and packing report (see context_packing.pack_context).
+    """
+    packed = pack_context(query, documents, tokenizer=tokenizer)
+    packed["report"]["prompt_tokens"] = tokenizer.count(build_prompt(query, packed["context"]))
+    return packed
+
+def answer_stream(query, context):
+    """
+    Returns (cached answer, None) for a known question, otherwise (None, iterator over the generated pieces).
+
+    Answers are keyed on the prompt built from the normalized question, so case and whitespace variations
+    share one entry. Concurrent requests with the same key follow a single upstream generation.
+    """
+    key_prompt = build_prompt(normalize_query(query), context)
+    cached = chat_cache.answer(key_prompt, model_name)
+    if cached is not None:
+        return cached, None
+    prompt = build_prompt(query, context)
+    return None, chat_cache.stream_answer(key_prompt, model_name, lambda: llm_util.stream_response(prompt))
+
+def generate_response(query, context):
+    """
+    Generates a context-aware response from the KISSKI LLM using the provided query and packed document context.
+    Raises:
+        LLMUnavailable: The LLM service is overloaded or failing; nothing was sent to it.
+    """
+    cached, pieces = answer_stream(query, context)
+    if cached is not None:
+        return cached
+    try:
+        return "".join(pieces).strip()
+    except LLMUnavailable:
+        raise
+    except Exception as e:
+        logger.error(f"Error during response generation via KISSKI LLM: {e}")
+        return f"Sorry, I couldn't generate a response. Error: {e}"
+
+def sse_event(event, data):
+    """
+    Formats one server-sent event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chat(packed, retrieval_ms, cached, tokens):
+    """
+    Streams a chat answer as server-sent events.
+
+    The sources are sent first so the client can show them while the model is still generating, followed
+    by one 'token' event per streamed piece of text and a final 'done' event carrying the full answer and
+    timings. Cached answers are sent as a single token. If the client disconnects, the generator is closed
+    and leaves the (possibly shared) generation, which stops upstream once no request follows it anymore.
+
+    Args:
+        packed (dict): Packed context; its documents are sent as sources and its report with the final event.
+        retrieval_ms (float): Time spent retrieving the documents.
+        cached (str): The cached answer, if any.
+        tokens (iterator): The generated pieces when there is no cached answer (see answer_stream).
+    Yields:
+        str: Formatted server-sent events.
+    """
+    started = time.perf_counter()
+    # The subscription is closed however the generator ends, also when the client disconnects before
+    # the first token, so the shared generation and its admission slot are released right away
+    try:
+        yield sse_event("sources", packed["documents"])
+        if not packed["documents"]:
+            yield sse_event("done", {"response": "No relevant documents found.",
+                                     "timing": {"retrieval_ms": retrieval_ms}})
+            return
+
+        if cached is not None:
+            elapsed_ms = round(retrieval_ms + (time.perf_counter() - started) * 1000, 1)
+            yield sse_event("token", {"content": cached})
+            yield sse_event("done", {
+                "response": cached,
+                "cached": True,
+                "context": packed["report"],
+                "timing": {"retrieval_ms": retrieval_ms, "first_token_ms": elapsed_ms, "total_ms": elapsed_ms},
+            })
+            return
+
+        pieces = []
+        first_token_ms = None
+        try:
+            for piece in tokens:
+                if first_token_ms is None:
+                    first_token_ms = round(retrieval_ms + (time.perf_counter() - started) * 1000, 1)
+                pieces.append(piece)
+                yield sse_event("token", {"content": piece})
+        except Exception as e:
+            logger.error(f"Error streaming response from KISSKI LLM: {e}")
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        yield sse_event("done", {
+            "response": "".join(pieces).strip(),
+            "cached": False,
+            "context": packed["report"],
+            "timing": {
+                "retrieval_ms": retrieval_ms,
+                "first_token_ms": first_token_ms,
+                "total_ms": round(retrieval_ms + (time.perf_counter() - started) * 1000, 1),
+            },
+        })
+    finally:
+        if tokens is not None:
+            tokens.close()
 
 # Chatbot API endpoint
 @app.route("/api/chat", methods=["POST"])
 def chat():
     """
     Chat endpoint to process user queries and generate responses via the KISSKI LLM service.
+
+    Clients sending {"stream": true} or 'Accept: text/event-stream' receive the answer as server-sent
+    events (see stream_chat); all others get a single JSON response once generation is complete.
     """
     user_query = request.json.get("query", "")
     if not user_query:
         return jsonify({"error": "Query cannot be empty"}), 400
 
-    # Retrieve relevant documents from Elasticsearch
-    documents = retrieve_documents(user_query)
-    if not documents:
-        return jsonify({"response": "No relevant documents found.", "sources": []})
+    try:
+        # Shed load before doing any retrieval work for a request the LLM could not take anyway
+        llm_util.check_available()
+
+        # Retrieve relevant documents from the search backend
+        started = time.perf_counter()
+        with span("retrieval") as attributes:
+            documents = retrieve_documents(user_query)
+            attributes["documents"] = len(documents)
+        retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        # Keep only the best snippets of distinct documents within the context token budget
+        with span("prompt") as attributes:
+            packed = pack_documents(user_query, documents)
+            attributes["prompt_tokens"] = packed["report"]["prompt_tokens"]
+
+        if request.json.get("stream") or request.accept_mimetypes.best == "text/event-stream":
+            # Reserve the generation before answering, so overload is reported with a proper status
+            cached, tokens = answer_stream(user_query, packed["context"]) if packed["documents"] else (None, None)
+            return Response(
+                stream_chat(packed, retrieval_ms, cached, tokens),
+                mimetype="text/event-stream",
+                # Keep proxies from buffering the stream
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        if not packed["documents"]:
+            return jsonify({"response": "No relevant documents found.", "sources": []})
+
+        # Generate the chatbot response using the KISSKI LLM
+        with span("generation"):
+            reply = generate_response(user_query, packed["context"])
+    except (LLMUnavailable, ElasticsearchUnavailable) as e:
+        logger.warning(f"Rejected chat request: {e}")
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+
+    return jsonify({"response": reply, "sources": packed["documents"], "context": packed["report"]})
+
+# Liveness and readiness endpoints; ready once the search backend answers and holds an index generation,
+# the LLM state is reported alongside
+register_health_routes(app, backend, lambda: {"llm": {key: value for key, value in llm_util.stats().items()
+                                                       if key in ("breaker", "active", "waiting")}},
+                       name=backend.name,
+                       gate=lambda: None if chat_cache.generation() else "no index generation yet")
+
+# Request latencies, retrieval, LLM and cache metrics in Prometheus format at /metrics
+register_metrics(app, "chatbot")
+
+@app.route("/api/chat/cache/stats", methods=["GET"])
+def chat_cache_stats():
+    return jsonify(chat_cache.stats())
 
-    # Generate the chatbot response using the KISSKI LLM
-    reply = generate_response(user_query, documents)
+@app.route("/api/chat/llm/stats", methods=["GET"])
+def llm_stats():
+    return jsonify(llm_util.stats())
 
-    return jsonify({"response": reply, "sources": documents})
+# Looks up the index generation and loads the embeddings in every worker before it serves
+@on_worker_start
+def warm_up():
+    chat_cache.generation()
 
-# Main entry point
+# Development server; in production the app is served by gunicorn (common/serving.py)
 if __name__ == "__main__":
     logger.info(f"Starting chatbot. GPU usage requested = {use_gpu_env}, model = {model_name}")
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,226 @@
+import logging
+import os
+import re
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Packing settings, overridable through the environment
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1500))
+SNIPPET_MAX_TOKENS = int(os.getenv('SNIPPET_MAX_TOKENS', 120))
+CHAT_TOKENIZER = os.getenv('CHAT_TOKENIZER', 'approximate')
+
+_PIECE = re.compile(r'\w+|[^\w\s]')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_TERM = re.compile(r'\w+')
+
+# Words too common to locate the relevant part of a description
+STOPWORDS = frozenset(
+    'a an and are as at be by can do for from how i in is it me of on or show that the this to what which '
+    'with you'.split()
+)
+
+
+class ApproximateTokenizer:
+    """
+    Local token estimate without a model vocabulary: every punctuation mark is one token and words cost
+    about one token per four characters, which is close to BPE tokenizers on English text.
+    """
+
+    name = 'approximate'
+
+    @staticmethod
+    def _cost(piece):
+        return max(1, (len(piece) + 2) // 4) if piece[0].isalnum() or piece[0] == '_' else 1
+
+    def count(self, text):
+        return sum(self._cost(piece) for piece in _PIECE.findall(text))
+
+    def truncate(self, text, max_tokens):
+        used = 0
+        for match in _PIECE.finditer(text):
+            used += self._cost(match.group(0))
+            if used > max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+
+class TiktokenTokenizer:
+    """
+    Exact counts for OpenAI-style BPE vocabularies through the optional tiktoken package.
+    """
+
+    def __init__(self, encoding='cl100k_base'):
+        import tiktoken
+
+        self.name = f"tiktoken:{encoding}"
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text):
+        return len(self._encoding.encode(text))
+
+    def truncate(self, text, max_tokens):
+        tokens = self._encoding.encode(text)
+        return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens]).rstrip()
+
+
+def get_tokenizer(name=CHAT_TOKENIZER):
+    """
+    Creates the configured tokenizer, falling back to the approximation if tiktoken is unavailable.
+
+    Args:
+        name (str): 'approximate', 'tiktoken' or 'tiktoken:<encoding>'.
+    """
+    if name.startswith('tiktoken'):
+        try:
+            return TiktokenTokenizer(*name.split(':', 1)[1:])
+        except ImportError:
+            logger.warning("CHAT_TOKENIZER=tiktoken but the tiktoken package is not installed, using the approximation")
+    return ApproximateTokenizer()
+
+
+def query_terms(query):
+    """
+    Returns the lower-cased, de-duplicated terms of a question without stopwords.
+    """
+    terms = [term for term in _TERM.findall(query.casefold()) if term not in STOPWORDS]
+    return list(dict.fromkeys(terms))
+
+
+def url_key(url):
+    """
+    Normalizes a document URL (or the first of a list of URLs) for de-duplication.
+    """
+    if isinstance(url, list):
+        url = next((u for u in url if isinstance(u, str) and u.strip()), '')
+    if not isinstance(url, str) or not url.strip():
+        return None
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{parts.query}" if parts.query else '')
+
+
+def dedupe_by_url(documents):
+    """
+    Keeps the first (best ranked) document per normalized URL.
+
+    Returns:
+        tuple: (unique documents, dropped duplicates)
+    """
+    seen = set()
+    unique, duplicates = [], []
+    for doc in documents:
+        key = url_key(doc.get('url'))
+        if key is not None and key in seen:
+            duplicates.append(doc)
+            continue
+        seen.add(key)
+        unique.append(doc)
+    return unique, duplicates
+
+
+def extract_snippet(text, terms, max_tokens, tokenizer):
+    """
+    Cuts a description down to the passage that mentions the query terms most.
+
+    The description is split into sentences; the window starts at the sentence with the most term
+    matches (the first sentence if none match) and is extended with the following and then the
+    preceding sentences as long as it stays within max_tokens.
+
+    Args:
+        text (str): The full description.
+        terms (list): Query terms, lower-cased.
+        max_tokens (int): Token limit of the snippet.
+        tokenizer: Object with count(text) and truncate(text, max_tokens).
+
+    Returns:
+        str: The snippet, with '...' marking removed text.
+    """
+    text = ' '.join(str(text).split())
+    if tokenizer.count(text) <= max_tokens:
+        return text
+    sentences = _SENTENCE_END.split(text)
+    if terms:
+        matches = [sum(sentence.casefold().count(term) for term in terms) for sentence in sentences]
+        best = max(range(len(sentences)), key=lambda i: (matches[i], -i))
+    else:
+        best = 0
+
+    start = end = best
+    snippet = tokenizer.truncate(sentences[best], max_tokens)
+    for step in (1, -1):
+        while 0 <= (end + 1 if step > 0 else start - 1) < len(sentences):
+            candidate_start, candidate_end = (start, end + 1) if step > 0 else (start - 1, end)
+            candidate = ' '.join(sentences[candidate_start:candidate_end + 1])
+            if tokenizer.count(candidate) > max_tokens:
+                break
+            start, end, snippet = candidate_start, candidate_end, candidate
+    cut_before = start > 0
+    cut_after = end < len(sentences) - 1 or snippet != ' '.join(sentences[start:end + 1])
+    return ('... ' if cut_before else '') + snippet + (' ...' if cut_after else '')
+
+
+def format_document(doc, snippet):
+    url = doc.get('url', '')
+    if isinstance(url, list):
+        url = ', '.join(str(u) for u in url)
+    return f"- {doc.get('name', 'Unnamed')}: {snippet} (URL: {url})"
+
+
+def pack_context(query, documents, budget=CONTEXT_TOKEN_BUDGET, snippet_tokens=SNIPPET_MAX_TOKENS,
+                 tokenizer=None):
+    """
+    Builds the document context of the prompt within a token budget.
+
+    Documents are de-duplicated by URL, each description is reduced to a snippet around the query terms,
+    and the snippets are added greedily in retrieval score order; a document that does not fit is
+    dropped and packing continues with the next, smaller one.
+
+    Args:
+        query (str): The user question.
+        documents (list): Retrieved documents with name, description and url, best match first.
+        budget (int): Maximum number of context tokens.
+        snippet_tokens (int): Maximum number of tokens taken from one description.
+        tokenizer: Object with count(text) and truncate(text, max_tokens), defaults to the configured one.
+
+    Returns:
+        dict: The context text, the packed documents, and a report with the budget, the tokens used,
+            the tokens of the unpacked descriptions and the dropped documents with the reason.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    terms = query_terms(query)
+    unique, duplicates = dedupe_by_url(documents)
+    dropped = [{'name': doc.get('name'), 'url': doc.get('url'), 'reason': 'duplicate_url'} for doc in duplicates]
+
+    lines, packed = [], []
+    used = 0
+    full_tokens = 0
+    for doc in unique:
+        description = doc.get('description') or ''
+        full_tokens += tokenizer.count(format_document(doc, ' '.join(str(description).split())))
+        line = format_document(doc, extract_snippet(description, terms, snippet_tokens, tokenizer))
+        # One extra token for the line break joining the entries
+        cost = tokenizer.count(line) + 1
+        if used + cost > budget:
+            dropped.append({'name': doc.get('name'), 'url': doc.get('url'), 'reason': 'budget', 'tokens': cost})
+            continue
+        lines.append(line)
+        packed.append(doc)
+        used += cost
+
+    report = {
+        'tokenizer': tokenizer.name,
+        'budget': budget,
+        'used_tokens': used,
+        'unpacked_tokens': full_tokens,
+        'packed': len(packed),
+        'dropped': dropped,
+    }
+    logger.info(
+        f"Packed {len(packed)}/{len(documents)} documents into {used}/{budget} context tokens "
+        f"(unpacked {full_tokens}); dropped {len(duplicates)} duplicates and "
+        f"{len(dropped) - len(duplicates)} over budget"
+    )
+    return {'context': '\n'.join(lines), 'documents': packed, 'report': report}
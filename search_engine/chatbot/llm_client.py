@@ -0,0 +1,440 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from common.metrics import LLM_FIRST_TOKEN, LLM_REQUEST_LATENCY, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Client settings, overridable through the environment
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 32))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+# Longest silence tolerated between two streamed chunks
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+# Deadline for a whole generation including retries
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 180))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 8))
+
+# Admission control: generations running at once, and requests allowed to wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 32))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 10))
+
+# Circuit breaker: consecutive failures that open it, and seconds until a trial request is let through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 30))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """
+    The request was not sent to the LLM; carries the HTTP status and Retry-After for the client.
+    """
+
+    status = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+
+class Overloaded(LLMUnavailable):
+    status = 429
+
+
+class CircuitOpen(LLMUnavailable):
+    status = 503
+
+
+class UpstreamError(Exception):
+    """
+    The LLM endpoint failed or answered with an error status.
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def backoff_delay(attempt, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_MAX):
+    """
+    Exponential backoff with full jitter: a random delay up to base * 2^attempt, capped.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _remaining(deadline):
+    """
+    Seconds left until the deadline of a generation; raises TimeoutError once it has passed.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError
+    return remaining
+
+
+class CircuitBreaker:
+    """
+    Stops calling the LLM after repeated failures.
+
+    Closed: calls go through. After failure_threshold consecutive failures it opens and rejects calls
+    for reset_timeout seconds; then one trial call is let through (half-open), whose outcome closes
+    or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def before_call(self):
+        """
+        Raises CircuitOpen unless a call may be made now.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.trial_running:
+                raise CircuitOpen("The LLM service is failing, not sending requests for now",
+                                  retry_after=max(remaining, 1))
+            self.trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("LLM circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_running:
+                    logger.error(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release_trial(self):
+        # A trial call that ended without an outcome (e.g. abandoned by the client) frees the slot
+        with self._lock:
+            self.trial_running = False
+
+
+class AdmissionQueue:
+    """
+    Limits concurrent generations and queues the excess in arrival order.
+
+    A request that finds the queue full is rejected at once (Overloaded, 429); one that waits longer
+    than the queue timeout gives up (LLMUnavailable, 503). Slots are handed to waiters strictly FIFO,
+    so a late request can never overtake an earlier one. Must be used from the event loop thread.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 queue_timeout=LLM_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = collections.deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Too many chat requests, please retry shortly", retry_after=self.queue_timeout / 2)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as the wait timed out
+                return
+            waiter.cancel()
+            self.timed_out += 1
+            raise LLMUnavailable("Timed out waiting for the LLM service", retry_after=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        # Hand the slot to the oldest waiter still waiting, otherwise free it
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AsyncLLMClient:
+    """
+    Connection-pooled async client for an OpenAI-compatible chat completions endpoint.
+    """
+
+    def __init__(self, base_url, api_key, model_name, breaker=None, max_connections=LLM_MAX_CONNECTIONS,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 request_timeout=LLM_REQUEST_TIMEOUT, max_retries=LLM_MAX_RETRIES):
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.model_name = model_name
+        self.breaker = breaker or CircuitBreaker()
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.retries = 0
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout),
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _payload(self, prompt, max_tokens):
+        return {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": True,
+        }
+
+    async def stream(self, prompt, max_tokens=500):
+        """
+        Streams the completion of the prompt as text pieces.
+
+        Failures before the first piece are retried with jittered exponential backoff; once text has
+        been produced a failure is raised, as the client has already seen part of the answer. Closing
+        the generator closes the HTTP stream, which makes the service stop generating.
+        """
+        started = time.monotonic()
+        deadline = started + self.request_timeout
+        attempt = 0
+        outcome = 'error'
+        # Streamed pieces stand in for the completion tokens of endpoints that do not report usage
+        pieces = 0
+        usage = None
+        try:
+            while True:
+                self.breaker.before_call()
+                produced = False
+                try:
+                    # Every wait for the upstream is bounded by the deadline, also the one for the response
+                    # headers and the first chunk; the timeouts never span a yield, which may resume in
+                    # another task
+                    request = self._client.build_request("POST", self.url, json=self._payload(prompt, max_tokens),
+                                                         headers={"Accept": "text/event-stream"})
+                    async with asyncio.timeout(_remaining(deadline)):
+                        response = await self._client.send(request, stream=True)
+                    try:
+                        if response.status_code != 200:
+                            async with asyncio.timeout(_remaining(deadline)):
+                                body = (await response.aread())[:200].decode('utf-8', 'replace')
+                            raise UpstreamError(f"LLM endpoint answered {response.status_code}: {body}",
+                                                retryable=response.status_code in RETRYABLE_STATUS)
+                        lines = response.aiter_lines()
+                        while True:
+                            try:
+                                async with asyncio.timeout(_remaining(deadline)):
+                                    line = await anext(lines)
+                            except StopAsyncIteration:
+                                break
+                            # Read on past [DONE] to the end of the body so the connection goes back to the pool
+                            if not line.startswith("data:") or line[len("data:"):].strip() == "[DONE]":
+                                continue
+                            chunk = json.loads(line[len("data:"):].strip())
+                            # Endpoints that report usage send it with the last chunk
+                            usage = chunk.get("usage") or usage
+                            choices = chunk.get("choices") or [{}]
+                            content = choices[0].get("delta", {}).get("content")
+                            if content:
+                                if not produced:
+                                    LLM_FIRST_TOKEN.observe(time.monotonic() - started)
+                                produced = True
+                                pieces += 1
+                                yield content
+                    finally:
+                        await response.aclose()
+                    self.breaker.record_success()
+                    outcome = 'ok'
+                    return
+                except (httpx.TransportError, UpstreamError, TimeoutError) as e:
+                    if isinstance(e, TimeoutError):
+                        error = UpstreamError("LLM generation exceeded the request timeout", retryable=False)
+                    else:
+                        error = e if isinstance(e, UpstreamError) else UpstreamError(f"{type(e).__name__}: {e}")
+                    if error.retryable:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.release_trial()
+                    delay = backoff_delay(attempt)
+                    if produced or not error.retryable or attempt >= self.max_retries or \
+                            time.monotonic() + delay > deadline:
+                        raise error
+                    attempt += 1
+                    self.retries += 1
+                    logger.warning(f"LLM request failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                except (asyncio.CancelledError, GeneratorExit):
+                    self.breaker.release_trial()
+                    outcome = 'cancelled'
+                    raise
+        finally:
+            LLM_REQUEST_LATENCY.labels(outcome).observe(time.monotonic() - started)
+            LLM_TOKENS.labels('completion').inc((usage or {}).get("completion_tokens") or pieces)
+            if usage and usage.get("prompt_tokens"):
+                LLM_TOKENS.labels('prompt').inc(usage["prompt_tokens"])
+
+
+class LLMService:
+    """
+    Runs the async LLM client on one event loop shared by all request threads of the chatbot.
+
+    Request threads reserve a slot through the admission queue and then pull streamed pieces from
+    the loop, so upstream connections are pooled across requests and overload is rejected up front
+    instead of piling up blocked workers.
+    """
+
+    def __init__(self, base_url, api_key, model_name, admission=None, breaker=None):
+        self.breaker = breaker or CircuitBreaker()
+        self.admission = admission or AdmissionQueue()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True).start()
+        self.client = self._call(self._create_client(base_url, api_key, model_name))
+
+    async def _create_client(self, base_url, api_key, model_name):
+        return AsyncLLMClient(base_url, api_key, model_name, breaker=self.breaker)
+
+    def _call(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    def check_available(self):
+        """
+        Cheap pre-check before any work is done for a request: raises if it would be rejected right now
+        because the breaker is open or the admission queue is full.
+        """
+        if self.breaker.state == 'open':
+            self.breaker.before_call()
+        admission = self.admission
+        if admission.active >= admission.max_concurrency and admission.waiting >= admission.max_queue:
+            admission.rejected += 1
+            raise Overloaded("Too many chat requests, please retry shortly", retry_after=admission.queue_timeout / 2)
+
+    async def _admit(self):
+        # Fail fast while the breaker is open instead of queueing for a call that would be rejected
+        if self.breaker.state == 'open':
+            self.breaker.before_call()
+        await self.admission.acquire()
+
+    def stream(self, prompt, max_tokens=500):
+        """
+        Reserves a generation slot and returns an iterator over the streamed pieces.
+
+        Raises:
+            LLMUnavailable: No slot could be reserved (overload, queue timeout or open circuit).
+        """
+        self._call(self._admit())
+        return _SlotStream(self, self.client.stream(prompt, max_tokens))
+
+    def complete(self, prompt, max_tokens=500):
+        """
+        Generates the whole completion of the prompt.
+        """
+        stream = self.stream(prompt, max_tokens)
+        try:
+            return "".join(stream)
+        finally:
+            stream.close()
+
+    def stats(self):
+        return {
+            'active': self.admission.active,
+            'waiting': self.admission.waiting,
+            'max_concurrency': self.admission.max_concurrency,
+            'max_queue': self.admission.max_queue,
+            'rejected': self.admission.rejected,
+            'queue_timeouts': self.admission.timed_out,
+            'retries': self.client.retries,
+            'breaker': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+        }
+
+
+class _SlotStream:
+    """
+    Synchronous iterator over an async stream that holds an admission slot until it is closed.
+    """
+
+    def __init__(self, service, pieces):
+        self.service = service
+        self.pieces = pieces
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.service._call(self.pieces.__anext__())
+        except StopAsyncIteration:
+            self.close()
+            raise StopIteration
+        except Exception:
+            self.close()
+            raise
+
+    async def _aclose(self):
+        try:
+            await self.pieces.aclose()
+        finally:
+            self.service.admission.release()
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.service._call(self._aclose(), timeout=10)
+
+    def __del__(self):
+        # Never wait here: the collector may run on the event loop thread itself
+        if not self.closed:
+            self.closed = True
+            asyncio.run_coroutine_threadsafe(self._aclose(), self.service._loop)
@@ -1,6 +1,7 @@
 import os
 import logging
-import openai
+
+from llm_client import LLMService, LLMUnavailable
 
 logger = logging.getLogger(__name__)
 
@@ -19,40 +20,62 @@ class LLMUtilities:
         self.use_gpu = use_gpu
 
         # Use the KISSKI-provided API key from environment
-        openai.api_key = os.environ.get("KISSKI_API_KEY")
-        if not openai.api_key:
+        api_key = os.environ.get("KISSKI_API_KEY")
+        if not api_key:
             logger.error("Missing KISSKI_API_KEY environment variable.")
             raise EnvironmentError("Please set KISSKI_API_KEY for KISSKI LLM access.")
 
-        # Point OpenAI client to the KISSKI Chat AI endpoint
-        openai.api_base = "https://chat-ai.academiccloud.de/v1"
+        # KISSKI Chat AI endpoint, reached through a pooled async client with timeouts, retries,
+        # a circuit breaker and admission control (see llm_client)
+        api_base = os.environ.get("KISSKI_API_BASE", "https://chat-ai.academiccloud.de/v1")
+        self.service = LLMService(api_base, api_key, self.model_name)
 
         logger.info(
             f"KISSKI LLM configured with model '{self.model_name}'. GPU usage = {self.use_gpu}."
         )
 
-    def generate_response(self, prompt, max_new_tokens=500, num_return_sequences=1):
+    def generate_response(self, prompt, max_new_tokens=500):
         """
-        Generate a response from the KISSKI LLM service using the new openai>=1.0.0 Chat interface.
+        Generate a complete response from the KISSKI LLM service.
         Args:
             prompt (str): The input prompt for the model.
             max_new_tokens (int): Maximum tokens to generate in the reply.
-            num_return_sequences (int): How many responses to return.
         Returns:
             str: The generated response text from the LLM.
+        Raises:
+            LLMUnavailable: The request was rejected by admission control or the circuit breaker.
         """
         try:
-            messages = [{"role": "user", "content": prompt}]
-            # the latest version of OpenAI API not working with the latest method
-            # response = openai.chat.completions.create( 
-            response = openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=max_new_tokens,
-                n=num_return_sequences,
-                temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
+            return self.service.complete(prompt, max_new_tokens).strip()
+        except LLMUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error during response generation via KISSKI LLM: {e}")
             return f"Sorry, I couldn't generate a response. Error: {e}"
+
+    def stream_response(self, prompt, max_new_tokens=500):
+        """
+        Stream a response from the KISSKI LLM service piece by piece.
+
+        A generation slot is reserved before this returns, so overload surfaces here rather than in the
+        middle of a response. Closing the returned iterator (e.g. because the client disconnected) closes
+        the upstream connection, which makes the service stop generating, and frees the slot.
+
+        Args:
+            prompt (str): The input prompt for the model.
+            max_new_tokens (int): Maximum tokens to generate in the reply.
+        Returns:
+            iterator: Pieces of the generated text as they arrive.
+        Raises:
+            LLMUnavailable: The request was rejected by admission control or the circuit breaker.
+        """
+        return self.service.stream(prompt, max_new_tokens)
+
+    def check_available(self):
+        """
+        Raises LLMUnavailable if a new generation would be rejected right now (see LLMService.check_available).
+        """
+        self.service.check_available()
+
+    def stats(self):
+        return self.service.stats()
@@ -0,0 +1 @@
+# Modules shared by the search backend, chatbot, submitter and word cloud services.
@@ -0,0 +1,353 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by the indexer (writer) and the chatbot (reader)
+EMBEDDINGS_DIR = os.getenv('EMBEDDINGS_DIR', 'embeddings')
+# 'hashing' (offline, deterministic) or 'sentence-transformers:<model name>'
+EMBEDDING_ENCODER = os.getenv('EMBEDDING_ENCODER', 'hashing')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 256))
+
+# Constant of reciprocal rank fusion; larger values flatten the difference between top ranks
+RRF_K = 60
+
+CURRENT_FILE = 'current.json'
+
+_WORD = re.compile(r'\w+')
+
+
+def document_text(resource, name_weight=3):
+    """
+    Builds the text embedded for a resource: its name, description, tags and type.
+
+    The name is repeated name_weight times, mirroring the name^3 boost of the keyword search, so that
+    a long description does not drown out what the resource is called.
+    """
+    parts = [str(resource['name'])] * name_weight if resource.get('name') else []
+    for field in ('description', 'tags', 'type'):
+        value = resource.get(field)
+        if isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        if value:
+            parts.append(str(value))
+    return '. '.join(parts)
+
+
+class HashingEncoder:
+    """
+    Deterministic offline encoder: signed feature hashing of words and character trigrams.
+
+    Needs no model download and gives the same vectors on every machine, so it works as a fallback
+    wherever a neural encoder is unavailable. Trigrams make related word forms (segment, segmentation)
+    land close to each other, which plain keyword matching misses.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self._features = {}
+
+    def _feature(self, feature):
+        cached = self._features.get(feature)
+        if cached is None:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            cached = (digest % self.dim, 1.0 if (digest >> 63) & 1 else -1.0)
+            if len(self._features) < 500000:
+                self._features[feature] = cached
+        return cached
+
+    def _features_of(self, text):
+        for word in _WORD.findall(text.casefold()):
+            yield 'w:' + word, 1.0
+            padded = f"<{word}>"
+            for start in range(len(padded) - 2):
+                yield 'c:' + padded[start:start + 3], 0.5
+
+    def encode(self, texts):
+        """
+        Args:
+            texts (list): Texts to embed.
+
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), dim) with L2-normalized rows.
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature, weight in self._features_of(text):
+                counts[feature] = counts.get(feature, 0.0) + weight
+            for feature, weight in counts.items():
+                column, sign = self._feature(feature)
+                # Sublinear term frequency so repeated words do not dominate
+                vectors[row, column] += sign * (1.0 + np.log(weight)) if weight >= 1 else sign * weight
+        return normalize_rows(vectors)
+
+
+class SentenceTransformerEncoder:
+    """
+    Neural encoder through the optional sentence-transformers package.
+    """
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def get_encoder(name=EMBEDDING_ENCODER):
+    """
+    Creates the configured encoder, falling back to the hashing encoder if the model cannot be loaded.
+
+    Args:
+        name (str): 'hashing', 'hashing-<dim>' or 'sentence-transformers:<model name>'.
+    """
+    if name.startswith('sentence-transformers:'):
+        try:
+            return SentenceTransformerEncoder(name.split(':', 1)[1])
+        except Exception as e:
+            logger.warning(f"Cannot load encoder {name} ({e}), using the offline hashing encoder")
+    elif name.startswith('hashing-'):
+        return HashingEncoder(int(name.split('-', 1)[1]))
+    return HashingEncoder()
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """
+    Returns the indices of the k highest scores in descending order, without sorting all scores.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, limit=None):
+    """
+    Fuses several rankings of document IDs by summing 1 / (k + rank) over the rankings.
+
+    Args:
+        rankings (list): Lists of document IDs, best first.
+        k (int): Rank constant.
+        limit (int): Number of fused IDs to return, all if None.
+
+    Returns:
+        list: Document IDs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=lambda doc_id: -scores[doc_id])
+    return fused if limit is None else fused[:limit]
+
+
+def _file_stem(generation):
+    return 'embeddings-' + re.sub(r'[^\w.-]', '_', generation)
+
+
+def _write_json(path, payload):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(payload, handle)
+    os.replace(temporary, path)
+
+
+def read_current(directory=EMBEDDINGS_DIR):
+    """
+    Returns the manifest of the current embeddings, or None if none were written yet.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_embeddings(directory, generation, ids, vectors, encoder_name, keep=2):
+    """
+    Stores the embeddings of an index generation and makes them the current ones.
+
+    The matrix is saved as a .npy file so readers can memory-map it; the manifest is replaced
+    atomically, so a reader sees either the old or the new generation, never a mix.
+
+    Args:
+        directory (str): Embeddings directory.
+        generation (str): Index generation the vectors belong to.
+        ids (list): Document IDs, one per matrix row.
+        vectors (np.ndarray): float32 matrix with L2-normalized rows.
+        encoder_name (str): Name of the encoder that produced the vectors.
+        keep (int): Number of generations kept on disk, including the new one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = _file_stem(generation)
+    matrix_file, ids_file = f"{stem}.npy", f"{stem}.ids.json"
+    temporary = os.path.join(directory, f"{stem}.tmp.npy")
+    np.save(temporary, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(temporary, os.path.join(directory, matrix_file))
+    _write_json(os.path.join(directory, ids_file), list(ids))
+    _write_json(os.path.join(directory, CURRENT_FILE), {
+        'generation': generation,
+        'encoder': encoder_name,
+        'dim': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        'count': len(ids),
+        'matrix': matrix_file,
+        'ids': ids_file,
+        'written_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    })
+
+    stems = sorted({name.split('.')[0] for name in os.listdir(directory) if name.startswith('embeddings-')},
+                   key=lambda name: os.path.getmtime(os.path.join(directory, name + '.npy'))
+                   if os.path.exists(os.path.join(directory, name + '.npy')) else 0)
+    for old in [name for name in stems if name != stem][:max(len(stems) - keep, 0)]:
+        for suffix in ('.npy', '.ids.json'):
+            try:
+                os.remove(os.path.join(directory, old + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def load_embeddings(directory=EMBEDDINGS_DIR, manifest=None):
+    """
+    Memory-maps the current embeddings.
+
+    Returns:
+        tuple: (manifest, list of IDs, matrix), or None if no embeddings exist.
+    """
+    manifest = manifest or read_current(directory)
+    if manifest is None:
+        return None
+    with open(os.path.join(directory, manifest['ids']), encoding='utf-8') as handle:
+        ids = json.load(handle)
+    matrix = np.load(os.path.join(directory, manifest['matrix']), mmap_mode='r')
+    return manifest, ids, matrix
+
+
+def update_embeddings(generation, documents, encoder=None, directory=EMBEDDINGS_DIR):
+    """
+    Computes and stores the embeddings of an index generation.
+
+    Document IDs are derived from the resource content, so vectors of documents already embedded for
+    the previous generation by the same encoder are reused and only new or edited ones are encoded.
+
+    Args:
+        generation (str): Index generation the documents belong to.
+        documents (dict): Document ID -> resource.
+        encoder: Encoder to use, defaults to the configured one.
+        directory (str): Embeddings directory.
+
+    Returns:
+        dict: Numbers of encoded and reused vectors and the elapsed time.
+    """
+    started = time.perf_counter()
+    encoder = encoder or get_encoder()
+    ids = list(documents)
+
+    previous = {}
+    current = load_embeddings(directory)
+    if current is not None and current[0]['encoder'] == encoder.name:
+        previous = {doc_id: row for row, doc_id in enumerate(current[1])}
+
+    vectors = np.zeros((len(ids), encoder.dim), dtype=np.float32)
+    missing = []
+    for row, doc_id in enumerate(ids):
+        if doc_id in previous:
+            vectors[row] = current[2][previous[doc_id]]
+        else:
+            missing.append(row)
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        rows = missing[start:start + EMBEDDING_BATCH_SIZE]
+        vectors[rows] = encoder.encode([document_text(documents[ids[row]]) for row in rows])
+
+    write_embeddings(directory, generation, ids, vectors, encoder.name)
+    summary = {'encoded': len(missing), 'reused': len(ids) - len(missing),
+               'seconds': round(time.perf_counter() - started, 3)}
+    logger.info(f"Embeddings for {generation}: {summary['encoded']} encoded, {summary['reused']} reused "
+                f"in {summary['seconds']}s with {encoder.name}")
+    return summary
+
+
+class EmbeddingIndex:
+    """
+    Dense retrieval over the memory-mapped embeddings of the current index generation.
+
+    The manifest is re-read at most every check_interval seconds and the matrix re-mapped when the
+    generation changed.
+    """
+
+    def __init__(self, directory=EMBEDDINGS_DIR, encoder=None, check_interval=5):
+        self.directory = directory
+        self.encoder = encoder
+        self.check_interval = check_interval
+        self.generation = None
+        self.ids = []
+        self.matrix = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            self._checked_at = time.monotonic()
+            manifest = read_current(self.directory)
+            if manifest is None or manifest['generation'] == self.generation:
+                return
+            try:
+                manifest, ids, matrix = load_embeddings(self.directory, manifest)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Error loading embeddings: {e}")
+                return
+            if self.encoder is None or self.encoder.name != manifest['encoder']:
+                self.encoder = get_encoder(manifest['encoder'])
+                if self.encoder.name != manifest['encoder']:
+                    logger.error(f"Embeddings were made by {manifest['encoder']}, which is not available here")
+                    self.generation, self.matrix = manifest['generation'], None
+                    return
+            self.generation, self.ids, self.matrix = manifest['generation'], ids, matrix
+            logger.info(f"Loaded {len(ids)} embeddings of {self.generation}")
+
+    def current_generation(self):
+        """
+        Returns the generation of the loaded embeddings, or None if none are loaded.
+        """
+        self._refresh()
+        return self.generation if self.matrix is not None else None
+
+    @property
+    def available(self):
+        self._refresh()
+        return self.matrix is not None and len(self.ids) > 0
+
+    def search(self, query, k):
+        """
+        Returns the IDs of the k documents most similar to the query, best first.
+        """
+        if not self.available:
+            return []
+        matrix, ids = self.matrix, self.ids
+        query_vector = self.encoder.encode([query])[0]
+        scores = matrix @ query_vector
+        return [ids[row] for row in top_k(scores, k)]
@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+
+from elasticsearch import ConnectionError, ConnectionTimeout, Elasticsearch
+
+from common.metrics import observe_elasticsearch
+
+logger = logging.getLogger(__name__)
+
+# Connection settings shared by all services, overridable through the environment
+ELASTICSEARCH_HOST = os.getenv('ELASTICSEARCH_HOST', 'elasticsearch')
+ELASTICSEARCH_PORT = int(os.getenv('ELASTICSEARCH_PORT', 9200))
+ES_REQUEST_TIMEOUT = float(os.getenv('ES_REQUEST_TIMEOUT', 30))
+# Pooled HTTP connections kept open to the node; bounded by the number of concurrent requests served
+ES_MAX_CONNECTIONS = int(os.getenv('ES_MAX_CONNECTIONS', 16))
+ES_MAX_RETRIES = int(os.getenv('ES_MAX_RETRIES', 2))
+# Backoff after failed attempts to reach Elasticsearch: base * 2^(failures - 1), capped
+ES_BACKOFF_BASE = float(os.getenv('ES_BACKOFF_BASE', 0.5))
+ES_BACKOFF_MAX = float(os.getenv('ES_BACKOFF_MAX', 30))
+# Timeout of the health probe, kept short so readiness checks never hang
+ES_PROBE_TIMEOUT = float(os.getenv('ES_PROBE_TIMEOUT', 2))
+
+
+class ElasticsearchUnavailable(Exception):
+    """
+    Raised instead of waiting on Elasticsearch while it cannot be reached.
+    """
+    status = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(round(retry_after)))
+
+
+class LazyElasticsearch:
+    """
+    Elasticsearch client that is created on first use and tracks whether the cluster is reachable.
+
+    It is used like the Elasticsearch client itself (es.search(...), es.indices.get_mapping(...)). Nothing
+    touches the network at import time, so services start immediately whether or not Elasticsearch is up.
+    When a request cannot reach the cluster, further requests fail fast with ElasticsearchUnavailable for
+    an exponentially growing backoff period instead of each waiting for a timeout; the first request after
+    the backoff probes the cluster again, so a restarted Elasticsearch is picked up automatically.
+    """
+
+    def __init__(self, host=None, port=None, request_timeout=ES_REQUEST_TIMEOUT,
+                 max_connections=ES_MAX_CONNECTIONS, max_retries=ES_MAX_RETRIES):
+        self.url = f"http://{host or ELASTICSEARCH_HOST}:{port or ELASTICSEARCH_PORT}"
+        self.request_timeout = request_timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.failures = 0
+        self.last_error = None
+        self.last_success = None
+        self.retry_at = 0.0
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        The underlying Elasticsearch client, created on first access.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = Elasticsearch(
+                        self.url,
+                        request_timeout=self.request_timeout,
+                        connections_per_node=self.max_connections,
+                        max_retries=self.max_retries,
+                        retry_on_timeout=True,
+                    )
+                    logger.info(f"Created Elasticsearch client for {self.url}")
+        return self._client
+
+    @property
+    def available(self):
+        return self.failures == 0
+
+    def retry_in(self):
+        return max(0.0, self.retry_at - time.monotonic())
+
+    def _succeeded(self):
+        if self.failures:
+            logger.info(f"Elasticsearch at {self.url} is reachable again after {self.failures} failed attempts")
+        self.failures = 0
+        self.last_error = None
+        self.last_success = time.time()
+
+    def _failed(self, error):
+        with self._lock:
+            self.failures += 1
+            delay = min(ES_BACKOFF_BASE * 2 ** (self.failures - 1), ES_BACKOFF_MAX)
+            self.retry_at = time.monotonic() + delay
+            self.last_error = str(error)
+        logger.warning(f"Elasticsearch at {self.url} unreachable ({self.failures} failures), "
+                       f"backing off for {delay:.1f}s: {error}")
+
+    def call(self, func, *args, **kwargs):
+        """
+        Runs one client call, failing fast while backing off and recording whether the cluster answered.
+
+        Raises:
+            ElasticsearchUnavailable: Elasticsearch could not be reached now or on a recent attempt.
+        """
+        if self.failures and time.monotonic() < self.retry_at:
+            raise ElasticsearchUnavailable(f"Elasticsearch is unavailable: {self.last_error}", self.retry_in())
+        operation = getattr(func, '__name__', 'call')
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except (ConnectionError, ConnectionTimeout) as e:
+            observe_elasticsearch(operation, time.perf_counter() - started, 'unavailable')
+            self._failed(e)
+            raise ElasticsearchUnavailable(f"Elasticsearch is unavailable: {e}", self.retry_in()) from e
+        except Exception:
+            observe_elasticsearch(operation, time.perf_counter() - started, 'error')
+            raise
+        observe_elasticsearch(operation, time.perf_counter() - started, 'ok', result)
+        self._succeeded()
+        return result
+
+    def __getattr__(self, name):
+        if name in ('_client', '_lock'):
+            raise AttributeError(name)
+        return _wrap(self, name, getattr(self.client, name))
+
+    def check(self):
+        """
+        Probes the cluster unless backing off and returns the health report.
+        """
+        try:
+            def probe():
+                return self.client.options(request_timeout=ES_PROBE_TIMEOUT, max_retries=0).info()
+            self.call(probe)
+        except ElasticsearchUnavailable:
+            pass
+        except Exception as e:
+            logger.error(f"Unexpected error probing Elasticsearch: {e}")
+        return self.health()
+
+    def health(self):
+        """
+        Reports the last known state of the connection without touching the network.
+        """
+        if self.failures:
+            status = 'unavailable'
+        else:
+            status = 'ok' if self.last_success else 'unknown'
+        return {
+            'status': status,
+            'url': self.url,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'retry_in_s': round(self.retry_in(), 1) if self.failures else 0,
+            'last_success': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.last_success))
+            if self.last_success else None,
+        }
+
+    def wait_until_available(self, timeout=None):
+        """
+        Blocks until Elasticsearch answers, probing on the backoff schedule.
+
+        Args:
+            timeout (float): Give up after this many seconds; wait forever if None.
+
+        Returns:
+            bool: Whether Elasticsearch became available.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.check()['status'] == 'ok':
+                return True
+            wait = max(self.retry_in(), 0.1)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _Tracked:
+    """
+    Proxy for a namespaced or derived client (es.indices, es.options(...)) that routes calls through the owner.
+    """
+
+    def __init__(self, owner, target):
+        self._owner = owner
+        self._target = target
+
+    def __getattr__(self, name):
+        return _wrap(self._owner, name, getattr(self._target, name))
+
+
+def _wrap(owner, name, attribute):
+    # Internals used by the helpers and derived clients do not talk to the cluster themselves
+    if name.startswith('_'):
+        return attribute
+    if name == 'options':
+        return lambda *args, **kwargs: _Tracked(owner, attribute(*args, **kwargs))
+    if callable(attribute):
+        def tracked(*args, **kwargs):
+            return owner.call(attribute, *args, **kwargs)
+        return tracked
+    if type(attribute).__module__.startswith('elasticsearch.'):
+        return _Tracked(owner, attribute)
+    return attribute
+
+
+# One client per process, shared by all modules of a service
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_es():
+    """
+    Returns the process-wide lazy Elasticsearch client.
+    """
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = LazyElasticsearch()
+    return _shared
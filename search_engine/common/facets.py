@@ -0,0 +1,107 @@
+from collections import Counter
+
+# Facetable resource fields and the keyword subfields their values are aggregated and filtered on
+FACET_FIELDS = {
+    'tags': 'tags.keyword',
+    'type': 'type.keyword',
+    'license': 'license.keyword',
+    'authors': 'authors.keyword',
+}
+FACET_DEFAULT_SIZE = 100
+FACET_MAX_SIZE = 1000
+
+
+def as_values(value):
+    """
+    Normalizes a resource field that may hold a single string or a list into a list of non-empty strings.
+    """
+    if isinstance(value, str):
+        value = [value]
+    elif not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+
+
+def count_values(resources, fields=FACET_FIELDS):
+    """
+    Counts the documents carrying each value of the facet fields, in plain Python.
+
+    Args:
+        resources (list): Resource entries from the YAML file.
+        fields (iterable): Names of the fields to count.
+
+    Returns:
+        dict: Field -> list of {'key', 'doc_count'}, most frequent first.
+    """
+    counters = {field: Counter() for field in fields}
+    for resource in resources:
+        if not isinstance(resource, dict):
+            continue
+        for field, counter in counters.items():
+            counter.update(set(as_values(resource.get(field))))
+    return {field: [{'key': key, 'doc_count': count}
+                    for key, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
+            for field, counter in counters.items()}
+
+
+def selection_filters(selected, exclude=None):
+    """
+    Turns the selected facet values into filter-context clauses, one terms clause per field.
+
+    Values of one field are alternatives (OR), different fields must all match (AND).
+
+    Args:
+        selected (dict): Field -> list of selected values.
+        exclude (str): Field to leave out, used to count the alternatives of that field.
+
+    Returns:
+        list: Elasticsearch term-level clauses.
+    """
+    return [{"terms": {FACET_FIELDS[field]: values}}
+            for field, values in selected.items() if values and field != exclude and field in FACET_FIELDS]
+
+
+def facet_aggregations(selected, size=FACET_DEFAULT_SIZE):
+    """
+    Builds the aggregations counting the values of every facet for the current selection.
+
+    Each facet is counted with the selection of all other facets applied but not its own, so values
+    that would widen the selection keep their counts. The 'selected' aggregation counts the documents
+    matching the whole selection.
+
+    Args:
+        selected (dict): Field -> list of selected values.
+        size (int): Maximum number of values per facet.
+
+    Returns:
+        dict: The 'aggs' section of a search body.
+    """
+    aggs = {
+        "selected": {"filter": {"bool": {"filter": selection_filters(selected)}}},
+    }
+    for field, keyword_field in FACET_FIELDS.items():
+        aggs[field] = {
+            "filter": {"bool": {"filter": selection_filters(selected, exclude=field)}},
+            "aggs": {"values": {"terms": {"field": keyword_field, "size": size}}},
+        }
+    return aggs
+
+
+def parse_facets(aggregations, selected):
+    """
+    Reads the facet counts from the aggregations built by facet_aggregations.
+
+    Selected values are always listed, with a count of 0 if no document matches them anymore, so that
+    they can still be deselected.
+
+    Returns:
+        dict: 'total' documents matching the selection and 'facets' as field -> list of {'key', 'doc_count'}.
+    """
+    facets = {}
+    for field in FACET_FIELDS:
+        buckets = [{'key': bucket['key'], 'doc_count': bucket['doc_count']}
+                   for bucket in aggregations[field]['values']['buckets']]
+        listed = {bucket['key'] for bucket in buckets}
+        buckets += [{'key': value, 'doc_count': 0} for value in selected.get(field, []) if value not in listed]
+        facets[field] = buckets
+    return {'total': aggregations['selected']['doc_count'], 'facets': facets}
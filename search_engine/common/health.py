@@ -0,0 +1,40 @@
+import time
+
+from flask import jsonify
+
+
+def register_health_routes(app, es, details=None, name='elasticsearch', gate=None):
+    """
+    Adds liveness and readiness endpoints to a Flask app.
+
+    /api/health/live answers as long as the process serves requests and never touches Elasticsearch.
+    /api/health/ready probes Elasticsearch (cheaply, and not at all while backing off) and answers 503
+    with status 'degraded' while it is unreachable, so orchestrators stop routing traffic to the service
+    without restarting it. A gate can hold readiness back further, e.g. until an index generation exists.
+
+    Args:
+        app (Flask): The application.
+        es (LazyElasticsearch): The service's Elasticsearch client, or any search backend with a check().
+        details (callable): Optional function returning a dict of further state to report on readiness.
+        name (str): Key the check is reported under.
+        gate (callable): Optional function returning None when the service can serve, or else the reason
+            it cannot, reported under 'reason' with status 'not_ready'.
+    """
+    started = time.time()
+
+    @app.route('/api/health/live', methods=['GET'])
+    def health_live():
+        return jsonify({"status": "alive", "uptime_s": round(time.time() - started, 1)})
+
+    @app.route('/api/health/ready', methods=['GET'])
+    def health_ready():
+        check = es.check()
+        ready = check['status'] == 'ok'
+        payload = {"status": "ready" if ready else "degraded", name: check}
+        reason = gate() if ready and gate is not None else None
+        if reason is not None:
+            ready = False
+            payload.update({"status": "not_ready", "reason": reason})
+        if details is not None:
+            payload.update(details())
+        return jsonify(payload), 200 if ready else 503
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+
+from common.metrics import observe_cache, span
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are gzip-compressed only
+    brotli = None
+
+# Memory budget of the compressed responses kept for unchanged data, shared by all cached endpoints
+HTTP_CACHE_MAX_BYTES = int(os.getenv('HTTP_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# How long browsers and proxies may reuse a response before revalidating it with its ETag
+HTTP_MAX_AGE = int(os.getenv('HTTP_MAX_AGE', 60))
+# Bodies smaller than this are sent uncompressed; compressing them saves less than it costs
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# Compressed bodies are cached, so a slower, denser setting than on-the-fly compression pays off
+BROTLI_QUALITY = 9
+
+
+def strong_etag(*parts):
+    """
+    Builds a strong validator from what determines a response's content, e.g. the index generation
+    and the normalized query parameters.
+
+    Returns:
+        str: Hex digest, without the quotes of the ETag header.
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding():
+    """
+    Picks the content coding for the current request from its Accept-Encoding header.
+
+    Returns:
+        str: 'br', 'gzip' or 'identity'.
+    """
+    return request.accept_encodings.best_match(available_encodings(), default='identity')
+
+
+def representation_etag(etag, encoding):
+    """
+    ETag of one encoding of a response; each encoding is a different representation with its own bytes.
+    """
+    return etag if encoding == 'identity' else f"{etag}-{encoding}"
+
+
+def matching_etag(etag):
+    """
+    Returns the representation ETag of `etag` the client already holds according to If-None-Match, or None.
+    """
+    if not request.if_none_match:
+        return None
+    if request.if_none_match.star_tag:
+        return etag
+    for encoding in ['identity', 'gzip', 'br']:
+        tag = representation_etag(etag, encoding)
+        if request.if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+
+class Compressor:
+    """
+    Incremental compressor for one content coding, fed chunk by chunk.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31 writes the gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.finish() if self.encoding == 'br' else self._compressor.flush()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of encoded response bodies keyed by (ETag, encoding), bounded by their total size.
+
+    Entries are never stale: a new index generation or source version yields a new ETag, and the bodies
+    of old ones are evicted as new ones come in.
+    """
+
+    def __init__(self, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag, encoding):
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end((etag, encoding))
+        observe_cache('http_response', body is not None)
+        return body
+
+    def put(self, etag, encoding, body):
+        # A single body may take at most a quarter of the budget, so one huge response cannot flush the rest
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop((etag, encoding), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[(etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'max_bytes': self.max_bytes,
+            'encodings': available_encodings(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# Shared by all endpoints of a process; keys include the ETag, which already identifies the endpoint
+response_cache = ResponseCache()
+
+
+def encode_chunks(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def cached_response(etag, produce, mimetype='application/json', max_age=HTTP_MAX_AGE, stream=False,
+                    compress=True, cache=response_cache):
+    """
+    Serves a response that only changes with `etag`, answering conditional requests with 304 and
+    sending every other request the cached compressed body for the client's encoding when there is one.
+
+    Nothing is produced for a 304 or a cache hit, so those cost neither a backend query nor serialization.
+    On a miss, the body is produced, compressed if the client accepts it and cached for the next client.
+    Streamed bodies that cannot be compressed are passed through chunk by chunk rather than cached, with
+    a weak ETag, as their headers are sent before it is known whether the stream completes.
+
+    Producers must raise when they fail part way; a body is only cached once it was produced completely.
+
+    Args:
+        etag (str): Strong validator of the content (see strong_etag), or None to disable caching.
+        produce (callable): Returns the content: a JSON-serializable object, or with stream=True an
+            iterable of str or bytes chunks.
+        mimetype (str): Content type of the body.
+        max_age (int): Seconds browsers may reuse the response without revalidating.
+        stream (bool): Whether produce returns chunks rather than an object.
+        compress (bool): False for bodies that are compressed already, e.g. PNG images.
+
+    Returns:
+        Response: The 200 or 304 response.
+    """
+    encoding = negotiate_encoding() if compress else 'identity'
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': f"public, max-age={max_age}"}
+    if etag is None:
+        headers['Cache-Control'] = 'no-cache'
+    else:
+        held = matching_etag(etag)
+        if held is not None:
+            return Response(status=304, headers={**headers, 'ETag': f'"{held}"'})
+        body = cache.get(etag, encoding)
+        if body is not None:
+            return encoded_response(body, etag, encoding, mimetype, headers)
+        # Bodies too small to compress, and plain bodies serialized for an earlier client, are cached as identity
+        plain = cache.get(etag, 'identity') if encoding != 'identity' else None
+        if plain is not None and len(plain) < COMPRESS_MIN_BYTES:
+            return encoded_response(plain, etag, 'identity', mimetype, headers)
+        if plain is not None:
+            produce, stream = (lambda: [plain]), True
+
+    content = produce()
+    if not stream:
+        with span('serialize'):
+            content = [current_app.json.dumps(content)]
+    if encoding == 'identity' and stream:
+        if etag is not None:
+            headers['ETag'] = f'W/"{etag}"'
+        return Response(encode_chunks(content), mimetype=mimetype, headers=headers)
+
+    with span('compress', encoding=encoding) as attributes:
+        try:
+            body, encoding = encode_body(encode_chunks(content), encoding)
+        except Exception:
+            # Nothing is cached or sent with the ETag; the caller answers with an error instead
+            attributes['failed'] = True
+            raise
+        attributes['bytes'] = len(body)
+    if etag is not None:
+        cache.put(etag, encoding, body)
+    return encoded_response(body, etag, encoding, mimetype, headers)
+
+
+def encode_body(chunks, encoding):
+    """
+    Joins the chunks of a body, compressing them on the fly once the body is large enough to benefit.
+
+    Returns:
+        tuple: The encoded body and the encoding actually used.
+    """
+    compressor = None
+    pending = []
+    size = 0
+    parts = []
+    for chunk in chunks:
+        if compressor is None:
+            pending.append(chunk)
+            size += len(chunk)
+            if encoding != 'identity' and size >= COMPRESS_MIN_BYTES:
+                compressor = Compressor(encoding)
+                parts.append(compressor.compress(b''.join(pending)))
+                pending = []
+        else:
+            parts.append(compressor.compress(chunk))
+    if compressor is None:
+        return b''.join(pending), 'identity'
+    parts.append(compressor.finish())
+    return b''.join(parts), encoding
+
+
+def encoded_response(body, etag, encoding, mimetype, headers):
+    headers = dict(headers)
+    if etag is not None:
+        headers['ETag'] = f'"{representation_etag(etag, encoding)}"'
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype=mimetype, headers=headers)
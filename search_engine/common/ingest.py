@@ -0,0 +1,57 @@
+"""
+Ingests nfdi4bioimage.yml into the normalized snapshot read by all services.
+
+The source is parsed once per upstream change with the C YAML loader, every record is validated and
+normalized (see common.snapshot.normalize_resource), and the result is written as a versioned,
+gzip-compressed JSONL snapshot with a manifest. Services pick up a new snapshot on their next request.
+
+Usage:
+    python -m common.ingest [SOURCE] [--output DIR] [--watch SECONDS] [--force] [--metrics-port PORT]
+
+SOURCE is an http(s) URL, a YAML file or a directory of YAML files, by default RESOURCES_YAML_URL or
+the file on GitHub. Run from the search_engine directory.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from prometheus_client import start_http_server
+
+from common.snapshot import SNAPSHOT_DIR, ingest
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', nargs='?', help="URL, YAML file or directory of YAML files")
+    parser.add_argument('--output', default=SNAPSHOT_DIR, help="snapshot directory (default: %(default)s)")
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help="keep running and check the source for changes at this interval")
+    parser.add_argument('--force', action='store_true', help="write a new snapshot even if nothing changed")
+    parser.add_argument('--metrics-port', type=int,
+                        help="with --watch, serve the upstream fetch times in Prometheus format on this port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.watch and args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    force = args.force
+    while True:
+        try:
+            manifest = ingest(args.source, args.output, force=force)
+            force = False
+            if not args.watch:
+                print(json.dumps(manifest, indent=2))
+                return 0
+        except Exception as e:
+            logger.error(f"Error ingesting {args.source or 'the resources'}: {e}")
+            if not args.watch:
+                return 1
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
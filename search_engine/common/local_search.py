@@ -0,0 +1,734 @@
+import datetime
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from common.facets import FACET_DEFAULT_SIZE, FACET_FIELDS, parse_facets
+from common.metrics import span
+from common.search_backend import SEARCH_FIELDS, SORT_FIELDS, SearchBackend, validate_sort
+from common.snapshot import normalize_date
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by the indexer (writer) and the chatbot (reader)
+LOCAL_INDEX_DIR = os.getenv('LOCAL_INDEX_DIR', 'data/search-index')
+# Bump whenever the files change, so that the next sync rebuilds an index written by an older version
+LOCAL_INDEX_VERSION = 1
+CURRENT_FILE = 'current.json'
+META_FILE = 'meta.json'
+DOCUMENTS_FILE = 'documents.jsonl'
+
+# Elasticsearch's default similarity (BM25 with k1=1.2, b=0.75)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Fields analyzed for full-text search; only 'name' keeps token positions, for phrase matches
+TEXT_FIELDS = ('name', 'description', 'tags', 'authors', 'type', 'license')
+PHRASE_FIELD = 'name'
+# Positions skipped between the values of a list field, so a phrase never spans two values (as in ES)
+POSITION_GAP = 100
+# Longer tokens are split, like by Elasticsearch's standard tokenizer
+MAX_TOKEN_LENGTH = 255
+# Longer keyword values are not indexed for facets, like the ignore_above of the mapping
+KEYWORD_IGNORE_ABOVE = 256
+# Completion inputs are matched on this many leading characters
+MAX_COMPLETION_LENGTH = 100
+
+HIGHLIGHT_FRAGMENT_SIZE = 160
+HIGHLIGHT_FRAGMENTS = 2
+
+_TOKEN = re.compile(r'\w+')
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def tokenize(text):
+    """
+    Splits text into lower-cased word tokens, approximating Elasticsearch's standard analyzer.
+    """
+    tokens = []
+    for token in _TOKEN.findall(str(text).lower()):
+        tokens.extend(token[start:start + MAX_TOKEN_LENGTH] for start in range(0, len(token), MAX_TOKEN_LENGTH))
+    return tokens
+
+
+def _values(resource, field):
+    value = resource.get(field)
+    if value is None:
+        return []
+    return [item for item in (value if isinstance(value, list) else [value])
+            if item is not None and not isinstance(item, (dict, list))]
+
+
+def _day(date):
+    """
+    Days since 1970-01-01 of a yyyy-MM-dd date.
+    """
+    return (datetime.date.fromisoformat(date) - _EPOCH).days
+
+
+def _downloads(resource):
+    try:
+        return float(int(float(resource.get('num_downloads'))))
+    except (TypeError, ValueError, OverflowError):
+        return math.nan
+
+
+def _parse_field(field):
+    name, _, boost = field.partition('^')
+    return name, float(boost or 1)
+
+
+def _normalize_completion(text):
+    return ' '.join(str(text).split()).casefold()[:MAX_COMPLETION_LENGTH]
+
+
+def _csr(lists, dtype=np.int32):
+    """
+    Concatenates lists into one array with offsets: entries of list i are values[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(items) for items in lists], out=offsets[1:])
+    values = np.fromiter((value for items in lists for value in items), dtype=dtype, count=int(offsets[-1]))
+    return offsets, values
+
+
+def _write_json(path, payload):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(payload, handle)
+    os.replace(temporary, path)
+
+
+def read_current(directory=LOCAL_INDEX_DIR):
+    """
+    Returns the manifest of the current local index, or None if none was written yet.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_index(directory, documents, completion_func=None, keep=2):
+    """
+    Builds the local index of a set of documents and makes it the current one.
+
+    Everything is stored as .npy arrays that readers memory-map, next to the documents as JSON lines:
+    per text field a posting list (documents and term frequencies) per term of a shared sorted
+    vocabulary, the token positions of 'name', the field lengths for BM25, the facet values per
+    document, the normalized publication day, the download count and the sorted completion inputs.
+    Documents are numbered in ID order, so the uid tiebreaker of the sorts is the document number.
+    current.json is replaced atomically, so a reader sees either the old or the new index.
+
+    Args:
+        directory (str): Index directory.
+        documents (dict): Document ID -> resource.
+        completion_func (callable): Returns the completion field value ('input' list and 'weight') of a resource.
+        keep (int): Number of generations kept on disk, including the new one.
+
+    Returns:
+        dict: The manifest of the new index.
+    """
+    ids = sorted(documents)
+    resources = [documents[doc_id] for doc_id in ids]
+    count = len(ids)
+    digest = hashlib.sha256('\n'.join(ids).encode('utf-8')).hexdigest()
+    created = time.time()
+    generation = (f"local-{time.strftime('%Y%m%d%H%M%S', time.gmtime(created))}{int(created * 1000) % 1000:03d}"
+                  f"-{digest[:12]}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f".{generation}.tmp")
+    os.makedirs(path, exist_ok=True)
+
+    def save(name, array):
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+
+    # Inverted index per text field
+    postings = {}
+    meta_fields = {}
+    for field in TEXT_FIELDS:
+        field_postings = {}
+        lengths = np.zeros(count, dtype=np.int32)
+        for doc, resource in enumerate(resources):
+            occurrences = {}
+            position = 0
+            for value in _values(resource, field):
+                for token in tokenize(value):
+                    occurrences.setdefault(token, []).append(position)
+                    position += 1
+                position += POSITION_GAP
+            lengths[doc] = sum(len(positions) for positions in occurrences.values())
+            for token, positions in occurrences.items():
+                field_postings.setdefault(token, []).append((doc, positions))
+        postings[field] = field_postings
+        save(f"{field}.lengths", lengths)
+        with_values = int(np.count_nonzero(lengths))
+        meta_fields[field] = {'doc_count': with_values,
+                              'avg_length': float(lengths.sum() / with_values) if with_values else 0.0}
+
+    vocabulary = sorted(set().union(*(field_postings.keys() for field_postings in postings.values())))
+    save('terms', np.array(vocabulary, dtype=str) if vocabulary else np.array([], dtype='<U1'))
+    for field, field_postings in postings.items():
+        entries = [field_postings.get(term, ()) for term in vocabulary]
+        offsets, docs = _csr([[doc for doc, _ in entry] for entry in entries])
+        save(f"{field}.offsets", offsets)
+        save(f"{field}.docs", docs)
+        save(f"{field}.freqs", np.fromiter((len(positions) for entry in entries for _, positions in entry),
+                                           dtype=np.int32, count=len(docs)))
+        if field == PHRASE_FIELD:
+            position_offsets, positions = _csr([positions for entry in entries for _, positions in entry])
+            save(f"{field}.position_offsets", position_offsets)
+            save(f"{field}.positions", positions)
+
+    # Facet values per document, as ids into a sorted vocabulary per field
+    facets = {}
+    for field in FACET_FIELDS:
+        per_doc = [sorted({str(value) for value in _values(resource, field) if len(str(value)) <= KEYWORD_IGNORE_ABOVE})
+                   for resource in resources]
+        values = sorted({value for doc_values in per_doc for value in doc_values})
+        value_ids = {value: number for number, value in enumerate(values)}
+        offsets, doc_values = _csr([[value_ids[value] for value in doc_values] for doc_values in per_doc])
+        save(f"facet.{field}.values", doc_values)
+        save(f"facet.{field}.docs", np.repeat(np.arange(count, dtype=np.int32), np.diff(offsets)))
+        facets[field] = values
+
+    # Sort and range filter values; publication dates before 1900 count as missing, as in the ES index
+    published = np.full(count, np.nan)
+    for doc, resource in enumerate(resources):
+        date = normalize_date(resource.get('publication_date'))
+        if date and date[:4] >= '1900':
+            published[doc] = _day(date)
+    save('published', published)
+    save('downloads', np.array([_downloads(resource) for resource in resources], dtype=np.float64))
+
+    # Completion inputs, sorted for prefix lookups by binary search
+    completions = []
+    if completion_func is not None:
+        for doc, resource in enumerate(resources):
+            completion = completion_func(resource)
+            for text in dict.fromkeys(_normalize_completion(text) for text in completion['input']):
+                if text:
+                    completions.append((text, doc, completion['weight']))
+    completions.sort()
+    save('completion.keys', np.array([text for text, _, _ in completions], dtype=str)
+         if completions else np.array([], dtype='<U1'))
+    save('completion.docs', np.array([doc for _, doc, _ in completions], dtype=np.int32))
+    save('completion.weights', np.array([weight for _, _, weight in completions], dtype=np.int64))
+
+    save('ids', np.array(ids, dtype=str) if ids else np.array([], dtype='<U1'))
+    lines = [json.dumps(resource, ensure_ascii=False, default=str).encode('utf-8') for resource in resources]
+    document_offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum([len(line) + 1 for line in lines], out=document_offsets[1:])
+    with open(os.path.join(path, DOCUMENTS_FILE), 'wb') as handle:
+        for line in lines:
+            handle.write(line + b'\n')
+    save('documents.offsets', document_offsets)
+
+    manifest = {
+        'generation': generation,
+        'version': LOCAL_INDEX_VERSION,
+        'documents': count,
+        'terms': len(vocabulary),
+        'fields': meta_fields,
+        'written_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    _write_json(os.path.join(path, META_FILE), {**manifest, 'facets': facets})
+    os.replace(path, os.path.join(directory, generation))
+    _write_json(os.path.join(directory, CURRENT_FILE), manifest)
+
+    # Readers still mapping an old generation keep their view; the files are freed once unmapped
+    generations = sorted(name for name in os.listdir(directory) if name.startswith('local-'))
+    for old in [name for name in generations if name != generation][:max(len(generations) - keep, 0)]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return manifest
+
+
+def _load_array(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Empty arrays cannot be memory-mapped
+        return np.load(path)
+
+
+class LocalIndex:
+    """
+    A memory-mapped generation of the local index, read-only and shared by all threads.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as handle:
+            self.meta = json.load(handle)
+        self.generation = self.meta['generation']
+        self.arrays = {name[:-4]: _load_array(os.path.join(path, name))
+                       for name in os.listdir(path) if name.endswith('.npy')}
+        self.ids = self.arrays['ids']
+        self.count = len(self.ids)
+        self.terms = self.arrays['terms']
+        with open(os.path.join(path, DOCUMENTS_FILE), 'rb') as handle:
+            size = os.fstat(handle.fileno()).st_size
+            self._documents = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._facet_ids = {field: {value: number for number, value in enumerate(values)}
+                           for field, values in self.meta['facets'].items()}
+        self._norms = {}
+
+    def doc_id(self, doc):
+        return str(self.ids[doc])
+
+    def source(self, doc, fields=None):
+        offsets = self.arrays['documents.offsets']
+        document = json.loads(self._documents[offsets[doc]:offsets[doc + 1] - 1])
+        if fields:
+            return {field: document[field] for field in fields if field in document}
+        return document
+
+    def find(self, doc_id):
+        """
+        Returns the number of a document, or None if the index does not hold it.
+        """
+        position = int(np.searchsorted(self.ids, doc_id))
+        return position if position < self.count and self.ids[position] == doc_id else None
+
+    def _term(self, term):
+        position = int(np.searchsorted(self.terms, term))
+        return position if position < len(self.terms) and self.terms[position] == term else None
+
+    def _postings(self, field, term_id):
+        offsets = self.arrays[f"{field}.offsets"]
+        start, end = int(offsets[term_id]), int(offsets[term_id + 1])
+        return start, end
+
+    def _field_norms(self, field):
+        # k1 * (1 - b + b * length / average length), the length part of BM25, per document
+        norms = self._norms.get(field)
+        if norms is None:
+            average = self.meta['fields'][field]['avg_length'] or 1.0
+            lengths = np.asarray(self.arrays[f"{field}.lengths"], dtype=np.float32)
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average)
+            self._norms[field] = norms
+        return norms
+
+    def _idf(self, field, document_frequency):
+        doc_count = self.meta['fields'][field]['doc_count']
+        return math.log(1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def field_scores(self, field, tokens):
+        """
+        BM25 score of every document for the tokens in one field; a document matching any token scores above 0.
+        """
+        scores = np.zeros(self.count, dtype=np.float32)
+        if field not in self.meta['fields']:
+            return scores
+        norms = self._field_norms(field)
+        for token in tokens:
+            term_id = self._term(token)
+            if term_id is None:
+                continue
+            start, end = self._postings(field, term_id)
+            if start == end:
+                continue
+            docs = self.arrays[f"{field}.docs"][start:end]
+            freqs = np.asarray(self.arrays[f"{field}.freqs"][start:end], dtype=np.float32)
+            scores[docs] += np.float32(self._idf(field, end - start)) * freqs / (freqs + norms[docs])
+        return scores
+
+    def best_fields(self, tokens, fields=SEARCH_FIELDS):
+        """
+        Scores like a best_fields multi_match: the best boosted field score of each document.
+        """
+        scores = np.zeros(self.count, dtype=np.float32)
+        for field, boost in map(_parse_field, fields):
+            np.maximum(scores, np.float32(boost) * self.field_scores(field, tokens), out=scores)
+        return scores
+
+    def phrase_scores(self, tokens, field=PHRASE_FIELD):
+        """
+        Scores documents holding the tokens as a phrase in the field, with the phrase frequency as term
+        frequency and the summed idf of its terms, like a match_phrase query.
+        """
+        scores = np.zeros(self.count, dtype=np.float32)
+        term_ids = [self._term(token) for token in tokens]
+        if not tokens or any(term_id is None for term_id in term_ids):
+            return scores
+        ranges = [self._postings(field, term_id) for term_id in term_ids]
+        docs = self.arrays[f"{field}.docs"]
+        candidates = None
+        for start, end in ranges:
+            term_docs = np.asarray(docs[start:end])
+            candidates = term_docs if candidates is None else np.intersect1d(candidates, term_docs, assume_unique=True)
+        if candidates is None or not len(candidates):
+            return scores
+
+        position_offsets = self.arrays[f"{field}.position_offsets"]
+        positions = self.arrays[f"{field}.positions"]
+        # Entry of each candidate in the posting list of each term
+        entries = [start + np.searchsorted(docs[start:end], candidates) for start, end in ranges]
+        frequencies = np.zeros(len(candidates), dtype=np.float32)
+        for row in range(len(candidates)):
+            starts = None
+            for offset, term_entries in enumerate(entries):
+                entry = term_entries[row]
+                term_positions = set(int(position) - offset for position in
+                                     positions[position_offsets[entry]:position_offsets[entry + 1]])
+                starts = term_positions if starts is None else starts & term_positions
+                if not starts:
+                    break
+            frequencies[row] = len(starts)
+        matched = frequencies > 0
+        candidates, frequencies = candidates[matched], frequencies[matched]
+        idf = sum(self._idf(field, end - start) for start, end in ranges)
+        scores[candidates] = np.float32(idf) * frequencies / (frequencies + self._field_norms(field)[candidates])
+        return scores
+
+    def match(self, query, exact_match=False, fields=SEARCH_FIELDS):
+        """
+        Scores all documents for a query; an empty query matches every document with score 1.
+
+        Returns:
+            tuple: (float32 scores, boolean mask of the matching documents).
+        """
+        if not query.strip():
+            return np.ones(self.count, dtype=np.float32), np.ones(self.count, dtype=bool)
+        tokens = tokenize(query)
+        scores = self.phrase_scores(tokens) if exact_match else self.best_fields(tokens, fields)
+        return scores, scores > 0
+
+    def date_mask(self, date_range):
+        published = self.arrays['published']
+        mask = ~np.isnan(published)
+        if date_range.get('gte'):
+            mask &= published >= _day(date_range['gte'])
+        if date_range.get('lte'):
+            mask &= published <= _day(date_range['lte'])
+        return mask
+
+    def selection_mask(self, selected, exclude=None):
+        """
+        Documents carrying one of the selected values of every selected facet (except the excluded one).
+        """
+        mask = np.ones(self.count, dtype=bool)
+        for field, values in selected.items():
+            if field == exclude or field not in FACET_FIELDS or not values:
+                continue
+            value_ids = [self._facet_ids[field][value] for value in values if value in self._facet_ids[field]]
+            wanted = np.zeros(len(self._facet_ids[field]), dtype=bool)
+            wanted[value_ids] = True
+            doc_values = self.arrays[f"facet.{field}.values"]
+            having = np.zeros(self.count, dtype=bool)
+            having[self.arrays[f"facet.{field}.docs"][wanted[doc_values]]] = True
+            mask &= having
+        return mask
+
+    def facet_buckets(self, field, mask, size):
+        """
+        Counts the values of a facet over the masked documents, most frequent first, then by value.
+        """
+        doc_values = self.arrays[f"facet.{field}.values"]
+        values = self.meta['facets'][field]
+        counts = np.bincount(doc_values[mask[self.arrays[f"facet.{field}.docs"]]], minlength=len(values))
+        # Value ids follow the sorted values, so a stable sort on the count breaks ties by value
+        order = np.argsort(-counts, kind='stable')[:size]
+        return [{'key': values[value], 'doc_count': int(counts[value])} for value in order if counts[value]]
+
+    def publication_years(self, mask):
+        published = self.arrays['published'][mask]
+        published = published[~np.isnan(published)]
+        years = published.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+        counts = np.bincount(years - years.min(), minlength=0) if len(years) else []
+        return [{'year': int(years.min()) + offset, 'count': int(count)} for offset, count in enumerate(counts) if count]
+
+    def order(self, candidates, scores, sort='relevance', order='desc', after=None, offset=0, size=10):
+        """
+        Sorts the candidate documents like the sort of the ES backend and returns one page of them.
+
+        Args:
+            candidates (np.ndarray): Numbers of the matching documents.
+            scores (np.ndarray): Scores of all documents.
+            after (list): Sort values of the last hit of the previous page, as returned by sort_values.
+
+        Returns:
+            np.ndarray: Numbers of the documents of the page, in order.
+        """
+        # Every column is turned into ascending order with missing values last
+        columns = []
+        if SORT_FIELDS[sort]:
+            values = np.asarray(self.arrays['published' if sort == 'date' else 'downloads'])[candidates]
+            values = values if order == 'asc' else -values
+            columns.append(np.where(np.isnan(values), np.inf, values))
+        columns.append(-scores[candidates].astype(np.float64))
+        columns.append(candidates.astype(np.float64))
+
+        if after:
+            if len(after) != len(columns):
+                raise ValueError("Invalid cursor")
+            try:
+                bounds = []
+                if SORT_FIELDS[sort]:
+                    value = after[0]
+                    bounds.append(np.inf if value is None else (float(value) if order == 'asc' else -float(value)))
+                bounds.append(-float(after[-2]))
+                # Documents after the uid of the cursor, also if that document is gone by now
+                bounds.append(float(np.searchsorted(self.ids, str(after[-1]), side='right')) - 0.5)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            later = np.zeros(len(candidates), dtype=bool)
+            equal = np.ones(len(candidates), dtype=bool)
+            for column, bound in zip(columns, bounds):
+                later |= equal & (column > bound)
+                equal &= column == bound
+            columns = [column[later] for column in columns]
+            candidates = candidates[later]
+            offset = 0
+
+        wanted = offset + size
+        if len(candidates) > wanted > 0:
+            # Only documents up to the wanted-th smallest primary key can be on the page
+            limit = np.partition(columns[0], wanted - 1)[wanted - 1]
+            keep = columns[0] <= limit
+            columns = [column[keep] for column in columns]
+            candidates = candidates[keep]
+        ranking = np.lexsort(columns[::-1])
+        return candidates[ranking[offset:wanted]]
+
+    def sort_values(self, doc, score, sort):
+        values = [float(score), self.doc_id(doc)]
+        if SORT_FIELDS[sort]:
+            value = self.arrays['published' if sort == 'date' else 'downloads'][doc]
+            values.insert(0, None if np.isnan(value) else int(value))
+        return values
+
+    def completions(self, prefix, size):
+        """
+        Finds the completion inputs starting with the prefix, highest weight first, each text only once.
+        Inputs of equal weight keep the order of the keys, i.e. by text.
+        """
+        prefix = _normalize_completion(prefix)
+        keys = self.arrays['completion.keys']
+        if not prefix or not len(keys):
+            return []
+        start = int(np.searchsorted(keys, prefix, side='left'))
+        end = int(np.searchsorted(keys, prefix + '\U0010ffff', side='left'))
+        docs = np.asarray(self.arrays['completion.docs'][start:end])
+        weights = np.asarray(self.arrays['completion.weights'][start:end])
+        options = []
+        seen = set()
+        for entry in np.argsort(-weights, kind='stable'):
+            text = str(keys[start + entry])
+            if text in seen:
+                continue
+            seen.add(text)
+            doc = int(docs[entry])
+            options.append({'_id': self.doc_id(doc), 'text': text, '_score': float(weights[entry]),
+                            '_source': self.source(doc, ['name', 'tags'])})
+            if len(options) == size:
+                break
+        return options
+
+
+def _marked(text, terms):
+    return _TOKEN.sub(lambda match: f"<mark>{match.group(0)}</mark>" if match.group(0).lower() in terms
+                      else match.group(0), text)
+
+
+def highlight_fields(source, tokens, exact_match=False):
+    """
+    Marks the query terms in the name (whole) and in up to two fragments of the description.
+    """
+    terms = set(tokens)
+    if not terms:
+        return {}
+    result = {}
+    name = ' '.join(str(value) for value in _values(source, 'name'))
+    if any(token in terms for token in tokenize(name)):
+        result['name'] = [_marked(name, terms)]
+    if exact_match:
+        return result
+
+    description = ' '.join(str(value) for value in _values(source, 'description'))
+    fragments = []
+    covered = 0
+    for match in _TOKEN.finditer(description):
+        if match.group(0).lower() not in terms or match.start() < covered:
+            continue
+        # Start a little before the match, at a word boundary, and end at the last word within the size
+        start = description.rfind(' ', 0, max(match.start() - 20, 0)) + 1 if match.start() > 20 else 0
+        end = start + HIGHLIGHT_FRAGMENT_SIZE
+        if end < len(description):
+            end = max(description.rfind(' ', match.end(), end), match.end())
+        fragments.append(_marked(description[start:end].strip(), terms))
+        covered = end
+        if len(fragments) == HIGHLIGHT_FRAGMENTS:
+            break
+    if fragments:
+        result['description'] = fragments
+    return result
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    In-process BM25 search engine, persisted as memory-mapped arrays, for deployments without Elasticsearch.
+
+    It mirrors the ES backend: best_fields scoring with field boosts, phrase matches on 'name', the
+    same filters, facets, sorts and cursors, and the completion inputs of the suggester. Scores are
+    not bit-identical (ES quantizes field lengths and its analyzer differs in details), but rankings
+    and counts agree closely; see benchmarks/bench_search_backends.py. The index is rebuilt as a whole
+    when the documents change and re-read by other processes (e.g. the chatbot) within check_interval.
+    """
+
+    name = 'local'
+
+    def __init__(self, directory=LOCAL_INDEX_DIR, id_func=None, completion_func=None, check_interval=5):
+        """
+        Args:
+            directory (str): Index directory.
+            id_func (callable): Derives the document ID of a resource; services that only read leave it out.
+            completion_func (callable): Builds the completion inputs of a resource.
+            check_interval (float): Seconds between checks for a new index written by another process.
+        """
+        self.directory = directory
+        self.id_func = id_func
+        self.completion_func = completion_func
+        self.check_interval = check_interval
+        self.index = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, force=False):
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            self._checked_at = time.monotonic()
+            manifest = read_current(self.directory)
+            if manifest is None or (self.index is not None and manifest['generation'] == self.index.generation):
+                return
+            try:
+                self.index = LocalIndex(os.path.join(self.directory, manifest['generation']))
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Error loading local index {manifest['generation']}: {e}")
+                return
+            logger.info(f"Loaded local index {self.index.generation} with {self.index.count} documents")
+
+    def _current(self):
+        self._refresh()
+        if self.index is None:
+            raise RuntimeError("The local search index has not been built yet")
+        return self.index
+
+    def generation(self):
+        self._refresh()
+        return self.index.generation if self.index is not None else None
+
+    def check(self):
+        self._refresh()
+        if self.index is None:
+            return {'status': 'unavailable', 'directory': self.directory, 'last_error': 'no index built yet'}
+        return {'status': 'ok', 'directory': self.directory, 'generation': self.index.generation,
+                'documents': self.index.count}
+
+    def sync(self, resources, force_rebuild=False):
+        if self.id_func is None:
+            raise RuntimeError("This service only reads the index")
+        started = time.perf_counter()
+        documents = {self.id_func(item): item for item in resources if isinstance(item, dict)}
+        self._refresh(force=True)
+        current = self.index
+        live = set(map(str, current.ids)) if current is not None else set()
+
+        if (current is not None and not force_rebuild and current.meta['version'] == LOCAL_INDEX_VERSION
+                and live == documents.keys()):
+            summary = {'indexed': 0, 'deleted': 0, 'failed': 0, 'skipped': 0, 'errors': {},
+                       'mode': 'incremental', 'index': current.generation, 'unchanged': len(documents)}
+        else:
+            manifest = write_index(self.directory, documents, self.completion_func)
+            self._refresh(force=True)
+            summary = {'indexed': len(documents), 'deleted': len(live - documents.keys()), 'failed': 0,
+                       'skipped': 0, 'errors': {}, 'mode': 'rebuild', 'index': manifest['generation'],
+                       'unchanged': 0}
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Local index sync ({summary['mode']}) of {summary['index']}: {summary['indexed']} written, "
+            f"{summary['deleted']} deleted, {summary['unchanged']} unchanged in {summary['seconds']}s"
+        )
+        return summary
+
+    def search(self, query, exact_match=False, selected=None, date_range=None, sort='relevance', order='desc',
+               size=10, offset=0, after=None, with_facets=False, fields=None, highlight=False):
+        validate_sort(sort, order)
+        selected = selected or {}
+        started = time.perf_counter()
+        with span('local_search'):
+            index = self._current()
+            scores, matched = index.match(query, exact_match)
+            if date_range:
+                matched &= index.date_mask(date_range)
+            selection = index.selection_mask(selected) if selected else None
+            hits_mask = matched & selection if selection is not None else matched
+            candidates = np.flatnonzero(hits_mask)
+            page = index.order(candidates, scores, sort, order, after, offset, size)
+
+            tokens = tokenize(query) if highlight else []
+            hits = []
+            for doc in page:
+                source = index.source(doc)
+                hits.append({'id': index.doc_id(doc), 'score': float(scores[doc]),
+                             'sort': index.sort_values(doc, scores[doc], sort),
+                             'source': {field: source[field] for field in fields if field in source}
+                             if fields else source,
+                             'highlight': highlight_fields(source, tokens, exact_match) if tokens else {}})
+            result = {'total': len(candidates), 'total_relation': 'eq', 'hits': hits}
+            if with_facets:
+                result['facets'] = self._facets(index, matched, selected, FACET_DEFAULT_SIZE)
+                result['publication_years'] = index.publication_years(hits_mask)
+        result['took'] = int((time.perf_counter() - started) * 1000)
+        return result
+
+    def _facets(self, index, matched, selected, size):
+        # Shaped like the aggregations of common.facets, so the selected values are added the same way
+        aggregations = {'selected': {'doc_count': int(np.count_nonzero(matched & index.selection_mask(selected)))}}
+        for field in FACET_FIELDS:
+            mask = matched & index.selection_mask(selected, exclude=field)
+            aggregations[field] = {'values': {'buckets': index.facet_buckets(field, mask, size)}}
+        return parse_facets(aggregations, selected)
+
+    def facets(self, query, exact_match=False, selected=None, date_range=None, size=FACET_DEFAULT_SIZE):
+        with span('local_search'):
+            index = self._current()
+            _, matched = index.match(query, exact_match)
+            if date_range:
+                matched &= index.date_mask(date_range)
+            return self._facets(index, matched, selected or {}, size)
+
+    def rank(self, query, size, fields=SEARCH_FIELDS):
+        if not query.strip():
+            return []
+        with span('local_search'):
+            index = self._current()
+            scores, matched = index.match(query, fields=fields)
+            page = index.order(np.flatnonzero(matched), scores, size=size)
+            return [index.doc_id(doc) for doc in page]
+
+    def documents(self, ids, fields=None):
+        index = self._current()
+        docs = [index.find(doc_id) for doc_id in ids]
+        return [index.source(doc, fields) for doc in docs if doc is not None]
+
+    def iter_documents(self, fields=None):
+        index = self._current()
+        for doc in range(index.count):
+            yield {'_id': index.doc_id(doc), '_source': index.source(doc, fields)}
+
+    def complete(self, prefix, size):
+        return self._current().completions(prefix, size)
+
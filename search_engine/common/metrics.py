@@ -0,0 +1,175 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+
+# Traces go to their own logger, so they can be routed or silenced separately
+trace_logger = logging.getLogger('trace')
+
+# Share of requests whose spans are logged as one JSON line each (0 disables tracing, 1 traces all)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0))
+
+# Buckets for calls to the LLM, which take seconds rather than milliseconds
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120)
+# Buckets for refreshes, from a conditional request answered 304 to a full reindex
+REFRESH_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time from receiving a request to the end of its response body',
+    ['service', 'method', 'route', 'status'])
+STAGE_LATENCY = Histogram(
+    'request_stage_duration_seconds', 'Time spent in one stage of handling a request',
+    ['service', 'stage'])
+ES_REQUEST_LATENCY = Histogram(
+    'elasticsearch_request_duration_seconds', 'Wall time of Elasticsearch calls as seen by the client',
+    ['operation', 'outcome'])
+ES_TOOK = Histogram(
+    'elasticsearch_took_seconds', "Time Elasticsearch reports as spent on a call ('took')",
+    ['operation'])
+LLM_FIRST_TOKEN = Histogram(
+    'llm_time_to_first_token_seconds', 'Time from sending a prompt to the first generated text',
+    buckets=LLM_BUCKETS)
+LLM_REQUEST_LATENCY = Histogram(
+    'llm_request_duration_seconds', 'Time from sending a prompt to the end of the generation, retries included',
+    ['outcome'], buckets=LLM_BUCKETS)
+LLM_TOKENS = Counter(
+    'llm_tokens', 'Tokens processed by the LLM, as reported by the endpoint or counted from the stream',
+    ['kind'])
+CACHE_LOOKUPS = Counter(
+    'cache_lookups', 'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result'])
+SOURCE_FETCH = Histogram(
+    'resource_fetch_duration_seconds', 'Time to download the resource YAML from upstream',
+    ['outcome'])
+REFRESH_LATENCY = Histogram(
+    'refresh_duration_seconds', 'Time of a refresh, from checking the source to the regenerated word cloud',
+    ['trigger', 'outcome'], buckets=REFRESH_BUCKETS)
+REFRESH_DOCUMENTS = Counter(
+    'refresh_documents', 'Documents added and removed by refreshes',
+    ['change'])
+
+# Name of the service this process runs, set by register_metrics
+_service = os.getenv('SERVICE_NAME', 'unknown')
+# Spans of the current request if it is traced, else None; a context variable rather than flask.g so
+# that spans of streamed responses, produced after the request context is gone, are still collected
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+def registry():
+    """
+    Returns the registry to export; with PROMETHEUS_MULTIPROC_DIR set, the metrics of all worker processes.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def record_span(name, started, duration, **attributes):
+    """
+    Adds a finished span to the trace of the current request, if it is traced.
+
+    Args:
+        name (str): What was timed, e.g. 'es.search' or 'retrieval'.
+        started (float): time.perf_counter() at the start of the span.
+        duration (float): Duration in seconds.
+    """
+    trace = _trace.get()
+    if trace is not None:
+        trace['spans'].append({'name': name, 'start_ms': round((started - trace['started']) * 1000, 2),
+                               'duration_ms': round(duration * 1000, 2), **attributes})
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times one stage of a request into request_stage_duration_seconds and the request's trace.
+
+    Yields the span's attributes, so the timed code can add to them (e.g. a result count).
+    """
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_LATENCY.labels(_service, name).observe(duration)
+        record_span(name, started, duration, **attributes)
+
+
+def observe_elasticsearch(operation, duration, outcome, response=None):
+    """
+    Records one Elasticsearch call: its wall time, and for search-like calls the 'took' reported by the cluster.
+
+    The difference between the two is the time spent on the network and (de)serializing.
+    """
+    ES_REQUEST_LATENCY.labels(operation, outcome).observe(duration)
+    body = getattr(response, 'body', None)
+    took = body.get('took') if isinstance(body, dict) else None
+    if isinstance(took, (int, float)):
+        ES_TOOK.labels(operation).observe(took / 1000)
+    if _trace.get() is not None:
+        attributes = {'outcome': outcome}
+        if took is not None:
+            attributes['took_ms'] = took
+        record_span(f"es.{operation}", time.perf_counter() - duration, duration, **attributes)
+
+
+def observe_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def register_metrics(app, service):
+    """
+    Records the latency of every request of a Flask app and serves all metrics at /metrics.
+
+    Requests are labelled with their route pattern (e.g. /api/submissions/<job_id>) rather than the
+    path, so the number of series stays bounded. The latency is taken when the response is closed,
+    so streamed responses count until their last byte.
+
+    Args:
+        app (Flask): The application.
+        service (str): Name of the service, used as a label.
+    """
+    global _service
+    _service = service
+
+    @app.before_request
+    def start_request():
+        g.metrics_started = time.perf_counter()
+        traced = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+        _trace.set({'started': g.metrics_started, 'spans': []} if traced else None)
+
+    @app.after_request
+    def finish_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method, status = request.method, response.status_code
+        trace = _trace.get()
+
+        def observe():
+            duration = time.perf_counter() - started
+            REQUEST_LATENCY.labels(service, method, route, str(status)).observe(duration)
+            if trace is not None:
+                trace_logger.info(json.dumps({
+                    'trace_id': uuid.uuid4().hex[:16], 'service': service, 'method': method, 'route': route,
+                    'status': status, 'duration_ms': round(duration * 1000, 2), 'spans': trace['spans'],
+                }))
+            _trace.set(None)
+
+        response.call_on_close(observe)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import requests
+import yaml
+
+from common.metrics import SOURCE_FETCH
+
+logger = logging.getLogger(__name__)
+
+# GitHub raw URL for the latest version of nfdi4bioimage.yml
+GITHUB_YAML_URL = 'https://raw.githubusercontent.com/NFDI4BIOIMAGE/training/refs/heads/main/resources/nfdi4bioimage.yml'
+
+# Prefer the libyaml-backed loader, fall back to the pure-Python one if PyYAML was built without it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def load_yaml(text):
+    """
+    Parses YAML text with the fastest available safe loader.
+
+    Args:
+        text (str): Raw YAML content.
+
+    Returns:
+        The parsed YAML document.
+    """
+    return yaml.load(text, Loader=YamlLoader)
+
+
+def content_hash(raw):
+    """
+    Computes the SHA-256 hex digest used to detect upstream changes.
+
+    Args:
+        raw (bytes or str): Raw file content.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+class ResourceSource:
+    """
+    In-process cache in front of the nfdi4bioimage.yml resource list.
+
+    Fresh data is served straight from memory. Once the TTL has expired the cached data is still
+    returned immediately while a background thread revalidates it with ETag/Last-Modified.
+    The YAML is only parsed again when the content hash of the download changes.
+    """
+
+    def __init__(self, url=None, ttl=None, timeout=30, session=None):
+        """
+        Args:
+            url (str): Location of the YAML file, defaults to RESOURCES_YAML_URL or the GitHub raw URL.
+            ttl (float): Seconds a fetched copy is considered fresh, defaults to RESOURCES_CACHE_TTL or 300.
+            timeout (float): HTTP timeout in seconds for each fetch.
+            session (requests.Session): Optional session to reuse connections.
+        """
+        self.url = url or os.getenv('RESOURCES_YAML_URL', GITHUB_YAML_URL)
+        self.ttl = float(ttl if ttl is not None else os.getenv('RESOURCES_CACHE_TTL', 300))
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._data = None
+        self._hash = None
+        self._etag = None
+        self._last_modified = None
+        self._fetched_at = 0.0
+
+    @property
+    def content_hash(self):
+        """SHA-256 of the YAML content currently served, or None before the first successful fetch."""
+        return self._hash
+
+    def is_fresh(self):
+        return self._data is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def get(self):
+        """
+        Returns the parsed YAML document, fetching it synchronously only when nothing is cached yet.
+
+        Returns:
+            dict: Parsed YAML content, or None if it has never been fetched successfully.
+        """
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._fetch()
+            return self._data
+
+        if not self.is_fresh():
+            self._refresh_in_background()
+        return self._data
+
+    def resources(self):
+        """
+        Returns the list under the 'resources' key of the YAML file.
+
+        Returns:
+            list: Resource entries, or an empty list if the file is unavailable or malformed.
+        """
+        data = self.get()
+        if isinstance(data, dict) and isinstance(data.get('resources'), list):
+            return data['resources']
+        return []
+
+    def refresh(self):
+        """
+        Revalidates the cached copy synchronously.
+
+        Returns:
+            bool: True if the upstream content changed.
+        """
+        with self._lock:
+            return self._fetch()
+
+    def _refresh_in_background(self):
+        # Never wait for the lock here: readers are served the stale copy, and while the lock is held a
+        # fetch is under way already
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        finally:
+            self._lock.release()
+
+        # The flag is cleared in the same locked section as the fetch, so a concurrent get() either sees
+        # this refresh running or the result of it
+        def run():
+            with self._lock:
+                try:
+                    self._fetch()
+                finally:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='resource-source-refresh', daemon=True).start()
+
+    def _fetch(self):
+        """
+        Performs a conditional GET and updates the cache. Must be called with the lock held.
+
+        Returns:
+            bool: True if new content was parsed.
+        """
+        headers = {}
+        if self._data is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+
+        started = time.monotonic()
+        try:
+            response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self._fetched_at = time.monotonic()
+                SOURCE_FETCH.labels('not_modified').observe(time.monotonic() - started)
+                logger.info(f"YAML file not modified upstream ({time.monotonic() - started:.3f}s)")
+                return False
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            # Keep serving the stale copy; retry once the TTL has passed again
+            self._fetched_at = time.monotonic()
+            SOURCE_FETCH.labels('error').observe(time.monotonic() - started)
+            logger.error(f"Error downloading the YAML file: {e}")
+            return False
+
+        SOURCE_FETCH.labels('ok').observe(time.monotonic() - started)
+        self._etag = response.headers.get('ETag')
+        self._last_modified = response.headers.get('Last-Modified')
+        self._fetched_at = time.monotonic()
+
+        new_hash = content_hash(response.content)
+        if new_hash == self._hash:
+            logger.info("Downloaded YAML file is unchanged, reusing parsed data")
+            return False
+
+        try:
+            data = load_yaml(response.content)
+        except yaml.YAMLError as e:
+            logger.error(f"Error parsing the YAML file: {e}")
+            return False
+
+        self._data = data
+        self._hash = new_hash
+        logger.info(f"Loaded YAML file {new_hash[:12]} in {time.monotonic() - started:.3f}s")
+        return True
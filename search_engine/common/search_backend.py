@@ -0,0 +1,423 @@
+import logging
+import os
+
+from elasticsearch import NotFoundError
+
+from common.facets import FACET_DEFAULT_SIZE, facet_aggregations, parse_facets, selection_filters
+
+logger = logging.getLogger(__name__)
+
+# 'elasticsearch' (default) or 'local' for the embedded engine in common/local_search.py
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'elasticsearch')
+
+# Readers (search backend, chatbot) always query the alias; the concrete indices are named <alias>-<generation>
+INDEX_ALIAS = 'bioimage-training'
+
+# Keyword copy of the document ID, used as a sort tiebreaker for search_after paging.
+# It and the completion field are excluded from _source so stored documents stay identical to the YAML entries.
+UID_FIELD = 'uid'
+# Completion field filled at index time; excluded from _source like the uid field
+SUGGEST_FIELD = 'suggest'
+# Publication date normalized to yyyy-MM-dd for range filters and sorting; also kept out of _source
+PUBLISHED_FIELD = 'published'
+
+# Fields and boosts of the full-text search of /api/search
+SEARCH_FIELDS = ["name^3", "description", "tags", "authors", "type", "license"]
+
+# Sort options of /api/search; every sort ends with the uid tiebreaker so cursors stay stable
+SORT_FIELDS = {
+    'relevance': None,
+    'date': PUBLISHED_FIELD,
+    'downloads': 'num_downloads',
+}
+
+# Batch size and point-in-time keep-alive used when streaming the whole catalogue
+MATERIALS_PAGE_SIZE = 1000
+MATERIALS_KEEP_ALIVE = '1m'
+
+
+def validate_sort(sort, order='desc'):
+    """
+    Raises ValueError for an unknown sort option or order.
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort: {sort}, expected one of {', '.join(SORT_FIELDS)}")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Unknown order: {order}, expected asc or desc")
+
+
+class SearchBackend:
+    """
+    Interface of the engines serving searches, suggestions and document lookups.
+
+    Both engines answer in the same shapes, so the services do not depend on which one is configured:
+    ElasticsearchBackend queries the cluster, LocalSearchBackend (common/local_search.py) an in-process
+    BM25 index for deployments and CI runs without Elasticsearch.
+    """
+
+    name = None
+
+    def generation(self):
+        """
+        Identifies the content currently served, so caches keyed on it are invalidated by every change.
+
+        Returns:
+            str: The index generation, or None if nothing has been indexed yet.
+        """
+        raise NotImplementedError
+
+    def check(self):
+        """
+        Returns the health report of the engine, with 'status' 'ok' when it can serve searches.
+        """
+        raise NotImplementedError
+
+    def wait_until_available(self, timeout=None):
+        """
+        Blocks until the engine can be written to.
+
+        Args:
+            timeout (float): Give up after this many seconds; wait forever if None.
+
+        Returns:
+            bool: Whether the engine became available.
+        """
+        return True
+
+    def sync(self, resources, force_rebuild=False):
+        """
+        Brings the index in line with the resources without ever exposing an empty or partial index.
+
+        Args:
+            resources (list): Normalized resource entries.
+            force_rebuild (bool): Build a new index generation even if the current one could be patched.
+
+        Returns:
+            dict: Summary with the mode used, the index written and the document delta.
+        """
+        raise NotImplementedError
+
+    def search(self, query, exact_match=False, selected=None, date_range=None, sort='relevance', order='desc',
+               size=10, offset=0, after=None, with_facets=False, fields=None, highlight=False):
+        """
+        Finds the documents matching a query and the filters.
+
+        Args:
+            query (str): Full-text query over SEARCH_FIELDS; empty to match all documents.
+            exact_match (bool): Match the query as a phrase in 'name'.
+            selected (dict): Selected facet values per field; values of one field are alternatives.
+            date_range (dict): Publication date bounds 'gte' and 'lte' as yyyy-MM-dd.
+            sort (str): One of SORT_FIELDS.
+            order (str): 'asc' or 'desc' for the date and downloads sorts.
+            size (int): Number of hits to return.
+            offset (int): Number of hits to skip, ignored when after is given.
+            after (list): The 'sort' values of the last hit of the previous page.
+            with_facets (bool): Also count the facet values and the publications per year; the
+                selection then narrows the hits only after counting.
+            fields (list): Fields of the documents to return, all if None.
+            highlight (bool): Mark the query terms in 'name' and fragments of 'description'.
+
+        Returns:
+            dict: 'total', 'total_relation', 'took' and 'hits' as dicts with 'id', 'score', 'sort',
+            'source' and 'highlight'; with facets also 'facets' (see common.facets.parse_facets) and
+            'publication_years'.
+        """
+        raise NotImplementedError
+
+    def facets(self, query, exact_match=False, selected=None, date_range=None, size=FACET_DEFAULT_SIZE):
+        """
+        Counts the documents per facet value for a query and selection (see common.facets).
+
+        Returns:
+            dict: 'total' documents matching the selection and 'facets' as field -> list of {'key', 'doc_count'}.
+        """
+        raise NotImplementedError
+
+    def rank(self, query, size, fields=SEARCH_FIELDS):
+        """
+        Ranks documents for a query by full-text (BM25) relevance.
+
+        Args:
+            query (str): The query.
+            size (int): Number of documents to return.
+            fields (list): Fields to search, with optional '^boost' suffixes.
+
+        Returns:
+            list: Document IDs, best first.
+        """
+        raise NotImplementedError
+
+    def documents(self, ids, fields=None):
+        """
+        Fetches documents by ID, keeping the order of the IDs and skipping ones that no longer exist.
+
+        Returns:
+            list: The (filtered) sources of the documents.
+        """
+        raise NotImplementedError
+
+    def iter_documents(self, fields=None):
+        """
+        Yields every indexed document as a hit with '_id' and the (filtered) '_source'.
+        """
+        raise NotImplementedError
+
+    def complete(self, prefix, size):
+        """
+        Finds completion inputs (name word starts and tags) starting with the prefix, best weighted first.
+
+        Returns:
+            list: Options with the matched '_id', 'text' and the '_source' name and tags of the document.
+        """
+        raise NotImplementedError
+
+
+def build_search_query(query, exact_match=False, fields=SEARCH_FIELDS):
+    """
+    Builds the Elasticsearch query for a search, matching the phrase in 'name' for exact matches.
+    An empty query matches all materials, so results can be narrowed by filters alone.
+    """
+    if not query.strip():
+        return {"match_all": {}}
+    if exact_match:
+        return {"match_phrase": {"name": query}}
+    return {"multi_match": {"query": query, "fields": list(fields), "type": "best_fields"}}
+
+
+def build_sort(sort='relevance', order='desc'):
+    """
+    Builds the sort clause for a sort option, raising ValueError for unknown options.
+
+    Documents without a date or download count come last; ties are broken by relevance and uid.
+    """
+    validate_sort(sort, order)
+    clauses = [{"_score": "desc"}, {UID_FIELD: "asc"}]
+    if SORT_FIELDS[sort]:
+        clauses.insert(0, {SORT_FIELDS[sort]: {"order": order, "missing": "_last"}})
+    return clauses
+
+
+def filtered_query(query_body, filters):
+    """
+    Adds filter clauses to a query; filters run in filter context, so they are cached and do not score.
+    """
+    if not filters:
+        return query_body
+    return {"bool": {"must": [query_body], "filter": filters}}
+
+
+def index_generation(es, alias=INDEX_ALIAS):
+    """
+    Identifies the content currently served under the alias.
+
+    The generation changes whenever the alias moves to a new index or an incremental update modifies
+    the live index, so it can key caches and ETags derived from search results.
+
+    Returns:
+        str: '<concrete index>:<revision>', or None if the alias does not exist yet.
+    """
+    try:
+        mapping = es.indices.get_mapping(index=alias)
+    except NotFoundError:
+        return None
+    index_name = sorted(mapping)[-1]
+    revision = mapping[index_name].get('mappings', {}).get('_meta', {}).get('revision', '0')
+    return f"{index_name}:{revision}"
+
+
+class ElasticsearchBackend(SearchBackend):
+    """
+    Search backend on the Elasticsearch index behind the alias.
+    """
+
+    name = 'elasticsearch'
+
+    def __init__(self, es, index_name=INDEX_ALIAS, indexer=None):
+        """
+        Args:
+            es (LazyElasticsearch): The service's Elasticsearch client.
+            index_name (str): Index or alias to query.
+            indexer (callable): Called with the resources and force_rebuild to write the index (the
+                search backend's reindex); services that only read leave it out.
+        """
+        self.es = es
+        self.index_name = index_name
+        self.indexer = indexer
+
+    def generation(self):
+        return index_generation(self.es, self.index_name)
+
+    def check(self):
+        return self.es.check()
+
+    def wait_until_available(self, timeout=None):
+        return self.es.wait_until_available(timeout)
+
+    def sync(self, resources, force_rebuild=False):
+        if self.indexer is None:
+            raise RuntimeError("This service only reads the index")
+        return self.indexer(resources, force_rebuild)
+
+    def _query(self, query, exact_match, date_range, fields=SEARCH_FIELDS):
+        filters = [{"range": {PUBLISHED_FIELD: date_range}}] if date_range else []
+        return filtered_query(build_search_query(query, exact_match, fields), filters)
+
+    def search(self, query, exact_match=False, selected=None, date_range=None, sort='relevance', order='desc',
+               size=10, offset=0, after=None, with_facets=False, fields=None, highlight=False):
+        selected = selected or {}
+        query_body = self._query(query, exact_match, date_range)
+        body = {
+            "query": query_body,
+            "size": size,
+            "sort": build_sort(sort, order),
+            "_source": fields if fields else True,
+            "track_total_hits": True,
+        }
+        if highlight:
+            body["highlight"] = {
+                "pre_tags": ["<mark>"],
+                "post_tags": ["</mark>"],
+                "fields": {
+                    "name": {"number_of_fragments": 0},
+                    "description": {"fragment_size": 160, "number_of_fragments": 2}
+                }
+            }
+        if with_facets:
+            # The selection narrows the hits after aggregating, so each facet still counts its alternatives
+            body["aggs"] = {
+                **facet_aggregations(selected),
+                "publication_years": {
+                    "filter": {"bool": {"filter": selection_filters(selected)}},
+                    "aggs": {"years": {"date_histogram": {"field": PUBLISHED_FIELD, "calendar_interval": "year",
+                                                          "format": "yyyy", "min_doc_count": 1}}},
+                },
+            }
+            if selected:
+                body["post_filter"] = {"bool": {"filter": selection_filters(selected)}}
+        elif selected:
+            body["query"] = filtered_query(query_body, selection_filters(selected))
+        if after:
+            body["search_after"] = after
+        elif offset:
+            body["from"] = offset
+
+        es_response = self.es.search(index=self.index_name, body=body)
+        total = es_response['hits']['total']
+        result = {
+            'total': total['value'],
+            'total_relation': total['relation'],
+            'took': es_response.get('took'),
+            'hits': [{'id': hit['_id'], 'score': hit.get('_score'), 'sort': hit.get('sort'),
+                      'source': hit.get('_source', {}), 'highlight': hit.get('highlight', {})}
+                     for hit in es_response['hits']['hits']],
+        }
+        if with_facets:
+            aggregations = es_response['aggregations']
+            result['facets'] = parse_facets(aggregations, selected)
+            result['publication_years'] = [
+                {'year': int(bucket['key_as_string']), 'count': bucket['doc_count']}
+                for bucket in aggregations['publication_years']['years']['buckets']
+            ]
+        return result
+
+    def facets(self, query, exact_match=False, selected=None, date_range=None, size=FACET_DEFAULT_SIZE):
+        selected = selected or {}
+        body = {
+            "size": 0,
+            "query": self._query(query, exact_match, date_range),
+            "aggs": facet_aggregations(selected, size),
+        }
+        es_response = self.es.search(index=self.index_name, body=body)
+        return parse_facets(es_response['aggregations'], selected)
+
+    def rank(self, query, size, fields=SEARCH_FIELDS):
+        if not query.strip():
+            return []
+        response = self.es.search(
+            index=self.index_name,
+            body={"query": build_search_query(query, fields=fields), "_source": False},
+            size=size,
+        )
+        return [hit['_id'] for hit in response['hits']['hits']]
+
+    def documents(self, ids, fields=None):
+        if not ids:
+            return []
+        response = self.es.mget(index=self.index_name, body={"ids": ids}, _source=fields if fields else True)
+        return [doc['_source'] for doc in response['docs'] if doc.get('found')]
+
+    def iter_documents(self, fields=None, page_size=MATERIALS_PAGE_SIZE):
+        """
+        Yields every indexed document, one search_after page at a time.
+
+        A point-in-time keeps the pages consistent while the alias may be swapped by a reindex, and it
+        is always closed again, also when the consumer stops early (e.g. the client disconnected).
+        """
+        pit_id = self.es.open_point_in_time(index=self.index_name, keep_alive=MATERIALS_KEEP_ALIVE)['id']
+        try:
+            search_after = None
+            while True:
+                body = {
+                    "size": page_size,
+                    "query": {"match_all": {}},
+                    "pit": {"id": pit_id, "keep_alive": MATERIALS_KEEP_ALIVE},
+                    "sort": [{"_shard_doc": "asc"}],
+                    "track_total_hits": False,
+                    "_source": fields if fields else True,
+                }
+                if search_after is not None:
+                    body["search_after"] = search_after
+                response = self.es.search(body=body)
+                pit_id = response.get('pit_id', pit_id)
+                hits = response['hits']['hits']
+                yield from hits
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]['sort']
+        finally:
+            try:
+                self.es.close_point_in_time(body={"id": pit_id})
+            except Exception as e:
+                logger.error(f"Error closing point in time: {e}")
+
+    def complete(self, prefix, size):
+        """
+        Queries the completion field, tolerating a typo once the prefix is long enough.
+        """
+        completion = {"field": SUGGEST_FIELD, "size": size, "skip_duplicates": True}
+        if len(prefix) > 4:
+            completion["fuzzy"] = {"fuzziness": "AUTO"}
+        es_response = self.es.search(
+            index=self.index_name,
+            body={
+                "size": 0,
+                "_source": ["name", "tags"],
+                "suggest": {"resources": {"prefix": prefix, "completion": completion}}
+            }
+        )
+        return es_response['suggest']['resources'][0]['options']
+
+
+def create_search_backend(es=None, indexer=None, id_func=None, completion_func=None, name=SEARCH_BACKEND):
+    """
+    Creates the configured search backend.
+
+    Args:
+        es (LazyElasticsearch): Client for the Elasticsearch backend.
+        indexer (callable): Writes the Elasticsearch index, see ElasticsearchBackend.
+        id_func (callable): Derives document IDs for the local backend; both backends use the same IDs.
+        completion_func (callable): Builds the completion inputs of a resource for the local backend.
+        name (str): 'elasticsearch' or 'local'.
+
+    Returns:
+        SearchBackend: The backend.
+    """
+    if name == 'local':
+        from common.local_search import LocalSearchBackend
+        return LocalSearchBackend(id_func=id_func, completion_func=completion_func)
+    if name != 'elasticsearch':
+        raise ValueError(f"Unknown search backend: {name}, expected elasticsearch or local")
+    if es is None:
+        from common.es_client import get_es
+        es = get_es()
+    return ElasticsearchBackend(es, indexer=indexer)
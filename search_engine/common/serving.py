@@ -0,0 +1,81 @@
+"""
+Gunicorn configuration shared by the web services, and the hooks they run in every worker.
+
+Usage (from the service's directory, e.g. in the container's /app):
+    gunicorn -c python:common.serving index_data:app
+
+Every worker imports the app itself (no preload), so each has its own Elasticsearch client,
+connection pools and memory maps, shared by the worker's threads and never inherited across a fork.
+Functions registered with on_worker_start run once the worker has loaded the app and before it
+accepts requests, to warm caches or start the worker's background threads.
+
+Settings come from the environment:
+    WEB_BIND      address to listen on (default 0.0.0.0:5000)
+    WEB_WORKERS   worker processes (default 2)
+    WEB_THREADS   threads per worker (default 4)
+    WEB_TIMEOUT   seconds a worker may be unresponsive before it is restarted (default 60)
+"""
+import logging
+import os
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', 2))
+threads = int(os.getenv('WEB_THREADS', 4))
+# gthread workers heartbeat from their main loop, so long streamed responses are not mistaken for hangs
+worker_class = 'gthread'
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+preload_app = False
+accesslog = '-'
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers under I/O load
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Functions run in every worker before it serves, in registration order
+_worker_start_hooks = []
+
+
+def on_worker_start(func):
+    """
+    Registers a function to run in every worker after the app is loaded and before it accepts requests.
+
+    Usable as a decorator. Under the Flask development server nothing calls these hooks; run them with
+    run_worker_start_hooks() when needed.
+    """
+    _worker_start_hooks.append(func)
+    return func
+
+
+def run_worker_start_hooks():
+    """
+    Runs the registered hooks; a failing hook is logged and never stops the worker from serving.
+    """
+    for hook in _worker_start_hooks:
+        started = time.perf_counter()
+        try:
+            hook()
+            logger.info(f"{hook.__module__}.{hook.__name__} done in {time.perf_counter() - started:.3f}s")
+        except Exception as e:
+            logger.error(f"Error in worker start hook {hook.__module__}.{hook.__name__}: {e}")
+
+
+def on_starting(server):
+    # Metrics of all workers are aggregated through files in this directory; clear those of a previous run
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def post_worker_init(worker):
+    run_worker_start_hooks()
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,408 @@
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+import requests
+
+from common.metrics import SOURCE_FETCH
+from common.resource_source import GITHUB_YAML_URL, ResourceSource, content_hash, load_yaml
+
+logger = logging.getLogger(__name__)
+
+# Directory the ingestion command writes snapshots to and the services read them from
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'data/snapshot')
+# Bump whenever normalize_resource changes, so existing snapshots are rebuilt from the source
+SNAPSHOT_SCHEMA_VERSION = 1
+SNAPSHOT_KEEP = 3
+CURRENT_FILE = 'current.json'
+RESOURCES_FILE = 'resources.jsonl.gz'
+MANIFEST_FILE = 'manifest.json'
+
+# Fields holding one or more values; the YAML file has them as a string or a list, snapshots always as a list
+LIST_FIELDS = ('authors', 'tags', 'type', 'license')
+TEXT_FIELDS = ('name', 'description')
+DATE_FIELDS = ('publication_date', 'submission_date')
+
+
+class InvalidResource(ValueError):
+    """
+    Raised for YAML entries that cannot be turned into a resource.
+    """
+
+
+def _strings(value):
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [str(item).strip() for item in values
+            if isinstance(item, (str, int, float)) and not isinstance(item, bool) and str(item).strip()]
+
+
+_DATE_PATTERNS = [
+    (re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})'), (1, 2, 3)),
+    (re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})$'), (3, 2, 1)),
+    (re.compile(r'^(\d{4})-(\d{1,2})$'), (1, 2, None)),
+    (re.compile(r'^(\d{4})$'), (1, None, None)),
+]
+
+
+def normalize_date(value):
+    """
+    Normalizes a publication date as found in the YAML file to yyyy-MM-dd.
+
+    Accepts dates parsed by YAML, years as numbers, and strings like 2023-05-01, 2023-05-01T10:00:00,
+    01.05.2023, 2023-05 or 2023. Missing month or day default to January or the 1st.
+
+    Returns:
+        str: The normalized date, or None if the value is not a plausible date.
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    for pattern, (year, month, day) in _DATE_PATTERNS:
+        match = pattern.match(value)
+        if match:
+            try:
+                return datetime.date(int(match.group(year)), int(match.group(month)) if month else 1,
+                                     int(match.group(day)) if day else 1).isoformat()
+            except ValueError:
+                return None
+    return None
+
+
+def normalize_resource(entry):
+    """
+    Validates one YAML entry and brings it into the shape every service relies on.
+
+    - name and description are stripped strings, and a name is required
+    - authors, tags, type and license are lists of non-empty strings
+    - url is a string, or a list if the entry has several
+    - dates are strings as written (dates parsed by YAML become yyyy-MM-dd)
+    - num_downloads is a non-negative integer, dropped if malformed
+    Empty fields are dropped, other fields are kept as they are.
+
+    Raises:
+        InvalidResource: The entry is not a mapping or has no name.
+    """
+    if not isinstance(entry, dict):
+        raise InvalidResource(f"entry is a {type(entry).__name__}, not a mapping")
+    resource = {}
+    for key, value in entry.items():
+        key = str(key)
+        if key in TEXT_FIELDS:
+            value = ' '.join(str(value).split()) if value is not None else ''
+        elif key in LIST_FIELDS:
+            value = _strings(value)
+        elif key == 'url':
+            value = _strings(value)
+            value = value[0] if len(value) == 1 else value
+        elif key in DATE_FIELDS:
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()[:10]
+            value = str(value).strip() if value is not None else ''
+        elif key == 'num_downloads':
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = None
+            if value is not None and value < 0:
+                value = None
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        if value is None or value == '' or value == []:
+            continue
+        resource[key] = value
+    if not resource.get('name'):
+        raise InvalidResource("entry has no name")
+    return resource
+
+
+def normalize_resources(entries):
+    """
+    Normalizes all entries of the YAML file, skipping invalid ones.
+
+    Returns:
+        tuple: (list of resources, list of problems as {'position', 'error'}).
+    """
+    resources, problems = [], []
+    for position, entry in enumerate(entries):
+        try:
+            resources.append(normalize_resource(entry))
+        except InvalidResource as e:
+            problems.append({'position': position, 'error': str(e)})
+    return resources, problems
+
+
+def read_source(source, etag=None, timeout=30):
+    """
+    Reads the raw YAML content of a source without parsing it.
+
+    Args:
+        source (str): http(s) URL, YAML file, or directory whose *.yml/*.yaml files are read in name order.
+        etag (str): ETag of the last download of a URL; an unchanged file is then not downloaded again.
+        timeout (float): HTTP timeout in seconds.
+
+    Returns:
+        tuple: (list of raw file contents, or None if the URL is unchanged; the URL's new ETag).
+    """
+    if source.startswith(('http://', 'https://')):
+        started = time.monotonic()
+        try:
+            response = requests.get(source, headers={'If-None-Match': etag} if etag else {}, timeout=timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.exceptions.RequestException:
+            SOURCE_FETCH.labels('error').observe(time.monotonic() - started)
+            raise
+        if response.status_code == 304:
+            SOURCE_FETCH.labels('not_modified').observe(time.monotonic() - started)
+            return None, etag
+        SOURCE_FETCH.labels('ok').observe(time.monotonic() - started)
+        return [response.content], response.headers.get('ETag')
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.endswith(('.yml', '.yaml')))
+        if not names:
+            raise FileNotFoundError(f"No YAML files in {source}")
+        paths = [os.path.join(source, name) for name in names]
+    else:
+        paths = [source]
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            contents.append(file.read())
+    return contents, None
+
+
+def parse_contents(contents):
+    """
+    Parses raw YAML files with the C loader and concatenates their 'resources' lists.
+    """
+    entries = []
+    for raw in contents:
+        data = load_yaml(raw)
+        if not isinstance(data, dict) or not isinstance(data.get('resources'), list):
+            raise ValueError("YAML file has no 'resources' list")
+        entries += data['resources']
+    return entries
+
+
+def current_manifest(directory=SNAPSHOT_DIR):
+    """
+    Returns the manifest of the current snapshot, or None if there is none.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_snapshot(resources, directory=SNAPSHOT_DIR, source=None, source_hash=None, problems=(),
+                   etag=None, keep=SNAPSHOT_KEEP):
+    """
+    Writes normalized resources (a list or any iterable) as a new snapshot version and makes it current.
+
+    The resources go to <version>/resources.jsonl.gz, one JSON object per line with sorted keys, so
+    equal content gives equal bytes. The manifest records the SHA-256 of the uncompressed lines
+    (content_hash), which services use to tell versions apart. current.json is replaced atomically, so
+    readers always see a complete snapshot. Only the newest `keep` versions are kept.
+
+    Returns:
+        dict: The manifest of the new snapshot.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Streamed into a temporary file, so resources may be a generator of any size
+    temporary = os.path.join(directory, f".{RESOURCES_FILE}.tmp")
+    digest = hashlib.sha256()
+    count = 0
+    with open(temporary, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as file:
+            for resource in resources:
+                line = json.dumps(resource, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+                digest.update(line)
+                file.write(line)
+                count += 1
+    digest = digest.hexdigest()
+    created = time.time()
+    version = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(created))}-{digest[:12]}"
+    path = os.path.join(directory, version)
+    os.makedirs(path, exist_ok=True)
+    os.replace(temporary, os.path.join(path, RESOURCES_FILE))
+    manifest = {
+        'version': version,
+        'schema_version': SNAPSHOT_SCHEMA_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(created)),
+        'source': source,
+        'source_hash': source_hash,
+        'etag': etag,
+        'content_hash': digest,
+        'resources': count,
+        'skipped': list(problems),
+        'file': f"{version}/{RESOURCES_FILE}",
+        'bytes': os.path.getsize(os.path.join(path, RESOURCES_FILE)),
+    }
+    _write_json(os.path.join(path, MANIFEST_FILE), manifest)
+    _write_json(os.path.join(directory, CURRENT_FILE), manifest)
+
+    versions = sorted(name for name in os.listdir(directory)
+                      if os.path.isfile(os.path.join(directory, name, MANIFEST_FILE)))
+    for old in versions[:-keep]:
+        if old != version:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return manifest
+
+
+def _write_json(path, data):
+    # Written next to the target and renamed over it, so readers never see a partial file
+    temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(temporary, 'w') as file:
+        json.dump(data, file, indent=2)
+    os.replace(temporary, path)
+
+
+def read_snapshot(directory=SNAPSHOT_DIR, manifest=None):
+    """
+    Reads the resources of a snapshot, the current one by default.
+
+    Returns:
+        tuple: (manifest, list of resources), or (None, []) if there is no snapshot.
+    """
+    manifest = manifest or current_manifest(directory)
+    if manifest is None:
+        return None, []
+    with gzip.open(os.path.join(directory, manifest['file']), 'rb') as file:
+        resources = [json.loads(line) for line in file if line.strip()]
+    return manifest, resources
+
+
+def ingest(source=None, directory=SNAPSHOT_DIR, force=False):
+    """
+    Parses the source once and writes a new snapshot if its content changed.
+
+    Unchanged sources are detected before parsing: by ETag for URLs, and by the SHA-256 of the raw
+    files otherwise. An unchanged normalized result (e.g. only comments changed) does not create a
+    new version either.
+
+    Args:
+        source (str): URL, file or directory, see read_source; defaults to RESOURCES_YAML_URL.
+        directory (str): Snapshot directory.
+        force (bool): Write a new snapshot even if nothing changed.
+
+    Returns:
+        dict: The current manifest, with 'changed' telling whether a new snapshot was written.
+    """
+    source = source or os.getenv('RESOURCES_YAML_URL', GITHUB_YAML_URL)
+    os.makedirs(directory, exist_ok=True)
+    current = current_manifest(directory)
+    reusable = (current is not None and not force and current.get('source') == source
+                and current.get('schema_version') == SNAPSHOT_SCHEMA_VERSION)
+
+    started = time.monotonic()
+    contents, etag = read_source(source, etag=current.get('etag') if reusable else None)
+    if contents is None:
+        logger.info(f"{source} not modified, keeping snapshot {current['version']}")
+        return {**current, 'changed': False}
+    source_hash = content_hash(b''.join(contents))
+    if reusable and source_hash == current.get('source_hash'):
+        logger.info(f"{source} unchanged, keeping snapshot {current['version']}")
+        return {**current, 'changed': False}
+
+    resources, problems = normalize_resources(parse_contents(contents))
+    if not resources:
+        raise ValueError(f"{source} contains no valid resources")
+    for problem in problems:
+        logger.warning(f"Skipped resource {problem['position']}: {problem['error']}")
+    if reusable and not force:
+        _, previous = read_snapshot(directory, current)
+        if previous == resources:
+            logger.info(f"{source} changed without changing any resource, keeping snapshot {current['version']}")
+            current = {**current, 'source_hash': source_hash, 'etag': etag}
+            _write_json(os.path.join(directory, CURRENT_FILE), current)
+            return {**current, 'changed': False}
+    manifest = write_snapshot(resources, directory, source, source_hash, problems, etag)
+    logger.info(f"Wrote snapshot {manifest['version']}: {manifest['resources']} resources, "
+                f"{len(problems)} skipped, {manifest['bytes']} bytes in {time.monotonic() - started:.3f}s")
+    return {**manifest, 'changed': True}
+
+
+class SnapshotSource:
+    """
+    Serves the resources of the current snapshot, reloading them only when a new snapshot appears.
+
+    Checking for a new snapshot costs one stat() of current.json, so resources() can be called on every
+    request. Without a snapshot (e.g. when running a service on its own during development) the YAML
+    file is fetched and normalized in-process instead, like a one-service ingestion.
+    """
+
+    def __init__(self, directory=None, fallback=None):
+        self.directory = directory or SNAPSHOT_DIR
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._stat = None
+        self._manifest = None
+        self._resources = []
+        self._fallback_hash = None
+
+    @property
+    def manifest(self):
+        self._reload()
+        return self._manifest
+
+    @property
+    def content_hash(self):
+        """Content hash of the resources currently served, or None before they have been loaded."""
+        if self._manifest is not None:
+            return self._manifest['content_hash']
+        return self._fallback_hash
+
+    def _reload(self):
+        try:
+            stat = os.stat(os.path.join(self.directory, CURRENT_FILE))
+        except FileNotFoundError:
+            return False
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._stat:
+            return self._manifest is not None
+        with self._lock:
+            if key != self._stat:
+                manifest = current_manifest(self.directory)
+                if manifest is not None and (self._manifest is None
+                                             or manifest['content_hash'] != self._manifest['content_hash']):
+                    started = time.monotonic()
+                    manifest, resources = read_snapshot(self.directory, manifest)
+                    self._manifest, self._resources = manifest, resources
+                    logger.info(f"Loaded snapshot {manifest['version']} ({len(resources)} resources) "
+                                f"in {time.monotonic() - started:.3f}s")
+                self._stat = key
+        return self._manifest is not None
+
+    def resources(self):
+        """
+        Returns the normalized resources of the current snapshot.
+
+        Returns:
+            list: Resources, or an empty list if neither a snapshot nor the fallback source is available.
+        """
+        if self._reload():
+            return self._resources
+        if self.fallback is None:
+            self.fallback = ResourceSource()
+        entries = self.fallback.resources()
+        with self._lock:
+            if self.fallback.content_hash != self._fallback_hash:
+                self._resources, _ = normalize_resources(entries)
+                self._fallback_hash = self.fallback.content_hash
+        return self._resources
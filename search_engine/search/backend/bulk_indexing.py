@@ -0,0 +1,162 @@
+import logging
+import os
+import time
+from collections import Counter
+
+from elasticsearch.helpers import parallel_bulk, streaming_bulk
+
+logger = logging.getLogger(__name__)
+
+# Tuning knobs for the bulk ingest, overridable through the environment
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+BULK_MAX_CHUNK_BYTES = int(os.getenv('BULK_MAX_CHUNK_BYTES', 10 * 1024 * 1024))
+BULK_THREAD_COUNT = int(os.getenv('BULK_THREAD_COUNT', 0))  # 0 or 1 streams from a single thread
+
+# Number of failed items whose details are written to the log
+MAX_REPORTED_ERRORS = 5
+
+
+def generate_actions(resources, index_name, stats=None, id_func=None, transform=None):
+    """
+    Lazily turns parsed YAML resources into bulk index actions.
+
+    Args:
+        resources (iterable): Resource entries from the 'resources' section of the YAML file.
+        index_name (str): The Elasticsearch index to write to.
+        stats (Counter): Optional counter that receives the number of skipped entries.
+        id_func (callable): Optional function deriving the document ID from a resource.
+        transform (callable): Optional function (resource, document ID) -> source to index.
+
+    Yields:
+        dict: One bulk action per valid resource.
+    """
+    for item in resources:
+        if isinstance(item, dict):
+            action = {'_index': index_name, '_source': item}
+            if id_func is not None:
+                action['_id'] = id_func(item)
+            if transform is not None:
+                action['_source'] = transform(item, action.get('_id'))
+            yield action
+        elif stats is not None:
+            stats['skipped'] += 1
+
+
+def _disable_refresh(client, index_name):
+    """
+    Turns off periodic refreshes for the duration of a load and returns the previous interval.
+    """
+    settings = client.indices.get_settings(index=index_name)
+    previous = settings.get(index_name, {}).get('settings', {}).get('index', {}).get('refresh_interval')
+    client.indices.put_settings(index=index_name, body={'index': {'refresh_interval': '-1'}})
+    return previous
+
+
+def _restore_refresh(client, index_name, previous):
+    # A null value resets the setting to the cluster default
+    client.indices.put_settings(index=index_name, body={'index': {'refresh_interval': previous}})
+    client.indices.refresh(index=index_name)
+
+
+def bulk_index(client, resources, index_name, chunk_size=None, max_chunk_bytes=None, thread_count=None,
+               id_func=None, transform=None, disable_refresh=True):
+    """
+    Streams resources into Elasticsearch through the bulk API.
+
+    Args:
+        client (Elasticsearch): Connected Elasticsearch client.
+        resources (iterable): Resource entries to index.
+        index_name (str): The Elasticsearch index to write to. It must already exist.
+        chunk_size (int): Maximum number of documents per bulk request.
+        max_chunk_bytes (int): Maximum size in bytes of a bulk request body.
+        thread_count (int): Number of threads sending bulk requests in parallel; 0 or 1 streams serially.
+        id_func (callable): Optional function deriving the document ID from a resource.
+        transform (callable): Optional function (resource, document ID) -> source to index.
+        disable_refresh (bool): Whether to switch off refreshes during the load.
+
+    Returns:
+        dict: Counts of indexed, deleted, failed and skipped entries, the most common error types and the elapsed time.
+    """
+    stats = Counter()
+    actions = generate_actions(resources, index_name, stats, id_func, transform)
+    return bulk_write(client, actions, index_name, chunk_size, max_chunk_bytes, thread_count,
+                      disable_refresh, stats)
+
+
+def bulk_write(client, actions, index_name, chunk_size=None, max_chunk_bytes=None, thread_count=None,
+               disable_refresh=True, stats=None):
+    """
+    Sends prepared bulk actions (index or delete) to Elasticsearch and aggregates the per-item results.
+
+    Args:
+        client (Elasticsearch): Connected Elasticsearch client.
+        actions (iterable): Bulk actions as accepted by the elasticsearch.helpers functions.
+        index_name (str): The index the actions write to; refreshed once the load is done.
+        chunk_size (int): Maximum number of actions per bulk request.
+        max_chunk_bytes (int): Maximum size in bytes of a bulk request body.
+        thread_count (int): Number of threads sending bulk requests in parallel; 0 or 1 streams serially.
+        disable_refresh (bool): Whether to switch off refreshes during the load.
+        stats (Counter): Optional counter to add the results to.
+
+    Returns:
+        dict: Counts of indexed, deleted, failed and skipped entries, the most common error types and the elapsed time.
+    """
+    chunk_size = chunk_size or BULK_CHUNK_SIZE
+    max_chunk_bytes = max_chunk_bytes or BULK_MAX_CHUNK_BYTES
+    thread_count = BULK_THREAD_COUNT if thread_count is None else thread_count
+
+    stats = Counter() if stats is None else stats
+    error_types = Counter()
+    started = time.perf_counter()
+
+    if thread_count > 1:
+        results = parallel_bulk(
+            client, actions,
+            thread_count=thread_count,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+    else:
+        results = streaming_bulk(
+            client, actions,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+
+    previous_refresh = _disable_refresh(client, index_name) if disable_refresh else None
+    try:
+        for ok, info in results:
+            op_type, result = next(iter(info.items()), ('index', {}))
+            if ok:
+                stats['deleted' if op_type == 'delete' else 'indexed'] += 1
+                continue
+            stats['failed'] += 1
+            error = result.get('error', 'unknown error')
+            error_types[error.get('type', str(error)) if isinstance(error, dict) else str(error)] += 1
+            if stats['failed'] <= MAX_REPORTED_ERRORS:
+                logger.error(f"Error indexing item: {info}")
+    finally:
+        if disable_refresh:
+            _restore_refresh(client, index_name, previous_refresh)
+        else:
+            client.indices.refresh(index=index_name)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'indexed': stats['indexed'],
+        'deleted': stats['deleted'],
+        'failed': stats['failed'],
+        'skipped': stats['skipped'],
+        'errors': dict(error_types.most_common()),
+        'seconds': round(elapsed, 3),
+    }
+    if stats['skipped']:
+        logger.error(f"Skipped {stats['skipped']} entries that are not dictionaries")
+    if stats['failed']:
+        logger.error(f"Failed to index {stats['failed']} items: {summary['errors']}")
+    logger.info(f"Indexed {stats['indexed']} and deleted {stats['deleted']} items in {index_name} in {elapsed:.2f}s")
+    return summary
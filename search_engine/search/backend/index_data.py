@@ -1,10 +1,21 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+import base64
+import datetime
+import json
 import logging
-import requests
-import yaml
-from elasticsearch import Elasticsearch, ConnectionError
-import time
+from query_cache import QueryCache
+from refresh import REFRESH_WEBHOOK_SECRET, read_status, request_refresh, verify_signature
+from common.es_client import ElasticsearchUnavailable, get_es
+from common.facets import FACET_DEFAULT_SIZE, FACET_FIELDS, FACET_MAX_SIZE
+from common.health import register_health_routes
+from common.http_cache import cached_response, response_cache, strong_etag
+from common.metrics import register_metrics
+from common.search_backend import create_search_backend, validate_sort
+from common.serving import on_worker_start
+from common.snapshot import normalize_date
+from suggestions import SUGGEST_DEFAULT_SIZE, SUGGEST_MAX_SIZE, Suggester
+from word_cloud import WORDCLOUD_DEFAULT_WIDTH, WORDCLOUD_FORMATS, WORDCLOUD_WIDTHS, WordCloudService, tag_frequencies
 
 # Initializing Flask app and enabling CORS
 app = Flask(__name__)
@@ -14,164 +25,239 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Function to connect to Elasticsearch with multiple retry attempts
-def connect_elasticsearch():
+# Shared Elasticsearch client; it connects on first use, so the app starts serving before Elasticsearch is up
+es = get_es()
+
+# Engine answering searches: Elasticsearch, or the embedded index with SEARCH_BACKEND=local (common/search_backend.py).
+# Only read here; the index is written by the one-shot indexer (indexer.py)
+backend = create_search_backend(es)
+
+# Cache for search and suggestion responses, invalidated whenever the index generation changes
+query_cache = QueryCache(backend.generation)
+
+# Autocomplete served from an in-process prefix index, rebuilt whenever the index generation changes
+suggester = Suggester(backend, lambda: query_cache.generation())
+
+# Word clouds of the tags, rendered on request into the cache shared with the indexer, which renders the full one
+word_clouds = WordCloudService()
+
+# Liveness and readiness endpoints; ready once the search backend answers and an index generation exists
+register_health_routes(app, backend, lambda: {"index_generation": query_cache.generation()}, name=backend.name,
+                       gate=lambda: None if query_cache.generation() else "no index generation yet")
+
+# Request latencies, Elasticsearch and cache metrics in Prometheus format at /metrics
+register_metrics(app, 'search')
+
+def unavailable(e):
     """
-    Attempts to connect to Elasticsearch. Retries up to a specified number of attempts if connection fails.
+    Response for requests that cannot be served while the search backend is unreachable.
+    """
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
 
-    Returns:
-        Elasticsearch: Connected Elasticsearch instance, or raises an Exception after several failed attempts.
+def iter_materials(source_fields=None):
     """
-    es = None
-    max_attempts = 60  # Number of attempts to try connecting to Elasticsearch
-    for attempt in range(max_attempts):
-        try:
-            es = Elasticsearch(
-                [{'host': 'elasticsearch', 'port': 9200, 'scheme': 'http'}],
-                timeout=30  # Extended timeout for requests
-            )
-            if es.ping():
-                logger.info("Connected to Elasticsearch")
-                return es
-            else:
-                logger.error("Elasticsearch ping failed")
-        except ConnectionError:
-            logger.error(f"Elasticsearch not ready, attempt {attempt+1}/{max_attempts}, retrying in 10 seconds...")
-            time.sleep(10)  # Delay between retry attempts
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            time.sleep(10)
-    raise Exception("Could not connect to Elasticsearch after several attempts")
-
-# Connect to Elasticsearch and handle errors if unable to connect
-es = connect_elasticsearch()
-
-# URL for fetching the latest YAML file with bioimage training resources from GitHub
-github_url = 'https://raw.githubusercontent.com/NFDI4BIOIMAGE/training/refs/heads/main/resources/nfdi4bioimage.yml'
-
-# Function to download and parse YAML data from the specified GitHub URL
-def download_yaml_file():
-    """
-    Downloads the YAML file from GitHub and parses it.
+    Yields the (filtered) _source of every indexed material.
+    """
+    for hit in backend.iter_documents(source_fields):
+        yield hit['_source']
 
-    Returns:
-        dict: Parsed YAML content if successful, otherwise None.
+def stream_json_array(documents):
     """
-    try:
-        response = requests.get(github_url)
-        response.raise_for_status()
-        yaml_content = response.text
-        logger.info("Downloaded the latest YAML file from GitHub")
-        return yaml.safe_load(yaml_content)
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error downloading the YAML file: {e}")
-        return None
+    Serializes documents as a JSON array chunk by chunk.
+    """
+    yield '['
+    for position, document in enumerate(documents):
+        yield (',' if position else '') + json.dumps(document, default=str)
+    yield ']'
 
-# Function to delete the Elasticsearch index if it exists
-def delete_index(index_name):
+def stream_ndjson(documents):
+    """
+    Serializes documents as newline-delimited JSON.
     """
-    Deletes an existing Elasticsearch index.
+    for document in documents:
+        yield json.dumps(document, default=str) + '\n'
 
-    Args:
-        index_name (str): The name of the Elasticsearch index to delete.
+# Route for streaming all materials from a point-in-time snapshot of the index
+@app.route('/api/materials', methods=['GET'])
+def get_materials():
     """
+    Streams all indexed materials from the search backend without holding the catalogue in memory.
+
+    The response carries an ETag of the index generation; clients revalidating with If-None-Match get a
+    304 until the next reindex, and the compressed body is built once per generation and then cached.
+
+    Query parameters:
+        format: 'json' (default) for a JSON array or 'ndjson' for one document per line.
+        fields: Optional comma-separated list of fields to include in each document.
+
+    Returns:
+        Streamed (or cached compressed) response with materials, 304, or error message.
+    """
+    output_format = request.args.get('format', 'json').lower()
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({"error": f"Unsupported format: {output_format}"}), 400
+
+    def produce():
+        documents = iter_materials(fields)
+        # Open the point-in-time (or the local index) and fetch the first page now, so that errors still produce a 500
+        first = next(documents, None)
+
+        def generate():
+            try:
+                if first is not None:
+                    yield first
+                    yield from documents
+            except Exception as e:
+                # Re-raised, so the response is aborted rather than ended as a well-formed but truncated catalogue
+                logger.error(f"Error streaming materials from the search backend: {e}")
+                raise
+            finally:
+                documents.close()
+
+        if output_format == 'ndjson':
+            return stream_ndjson(generate())
+        return stream_json_array(generate())
+
     try:
-        es.indices.delete(index=index_name, ignore=[400, 404])
-        logger.info(f"Deleted existing index: {index_name}")
+        etag = strong_etag('materials', query_cache.generation(), output_format, fields)
+        mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+        return cached_response(etag, produce, mimetype=mimetype, stream=True)
+    except ElasticsearchUnavailable as e:
+        return unavailable(e)
     except Exception as e:
-        logger.error(f"Error deleting index {index_name}: {e}")
+        logger.error(f"Error fetching data from the search backend: {e}")
+        return jsonify({"error": str(e)}), 500
 
-# Function to index resources from the downloaded YAML file into Elasticsearch
-def index_yaml_files():
+# Fields a search result card needs; everything else stays out of the /api/search payload
+SEARCH_RESULT_FIELDS = ['name', 'url', 'authors', 'description', 'license', 'type', 'tags',
+                        'publication_date', 'submission_date', 'num_downloads']
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+# Elasticsearch's index.max_result_window; deeper pages must be requested with a cursor
+MAX_RESULT_WINDOW = 10000
+# Number of raw hits returned by /api/search without paging parameters
+LEGACY_RESULT_SIZE = 1000
+
+def date_bound(value, end=False):
     """
-    Downloads the latest YAML data and indexes its content into Elasticsearch for search functionality.
+    Normalizes a date range bound (yyyy, yyyy-MM or yyyy-MM-dd); a year or month covers all its days.
     """
-    try:
-        yaml_content = download_yaml_file()
-        if yaml_content is None:
-            raise Exception("Failed to download the YAML file from GitHub")
-
-        # Set up index mapping with search-as-you-type enabled for specific fields
-        mapping = {
-            "mappings": {
-                "properties": {
-                    "name": {"type": "search_as_you_type"},
-                    "description": {"type": "search_as_you_type"},
-                    "tags": {"type": "text"},
-                    "authors": {"type": "text"},
-                    "type": {"type": "text"},
-                    "license": {"type": "text"},
-                    "url": {"type": "text"}
-                }
-            }
-        }
-
-        # Create the Elasticsearch index with the specified mapping
-        es.indices.create(index='bioimage-training', body=mapping, ignore=400)
-
-        # Index each resource item from the 'resources' section of the YAML file
-        data = yaml_content.get('resources', [])
-        if isinstance(data, list):
-            for item in data:
-                try:
-                    if isinstance(item, dict):
-                        es.index(index='bioimage-training', body=item)
-                        logger.info(f"Indexed item: {item}")
-                    else:
-                        logger.error(f"Item is not a dictionary: {item}")
-                except Exception as e:
-                    logger.error(f"Error indexing item: {item} - {e}")
-        else:
-            logger.error(f"Data is not a list: {data}")
+    normalized = normalize_date(value)
+    if normalized is None:
+        raise ValueError(f"Invalid date: {value}")
+    if end and len(value.strip()) == 4:
+        return f"{normalized[:4]}-12-31"
+    if end and len(value.strip()) <= 7:
+        year, month = int(normalized[:4]), int(normalized[5:7])
+        next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+        return (next_month - datetime.timedelta(days=1)).isoformat()
+    return normalized
 
-        # Refresh the index to make indexed documents searchable
-        es.indices.refresh(index='bioimage-training')
+def parse_filters(args):
+    """
+    Reads the facet selection and the publication date range from the request arguments.
 
-    except Exception as e:
-        logger.error(f"Error indexing YAML files: {e}")
+    Args:
+        args: The request arguments; tags, type, license and authors may be repeated, date_from and
+            date_to take a year, year-month or date.
 
-# Route for fetching all materials using Elasticsearch's Scroll API
-@app.route('/api/materials', methods=['GET'])
-def get_materials():
+    Returns:
+        tuple: (selected facet values per field, publication date bounds 'gte' and 'lte', None if unbounded).
     """
-    Fetches all indexed materials from Elasticsearch and returns them in a paginated format.
+    selected = {field: args.getlist(field) for field in FACET_FIELDS if args.getlist(field)}
+    bounds = {}
+    if args.get('date_from'):
+        bounds['gte'] = date_bound(args['date_from'])
+    if args.get('date_to'):
+        bounds['lte'] = date_bound(args['date_to'], end=True)
+    return selected, bounds or None
 
-    Returns:
-        JSON response with materials or error message.
+def encode_cursor(sort_values):
+    """
+    Turns the sort values of the last hit on a page into an opaque cursor for the next page.
+    """
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Restores the search_after values from a cursor, raising ValueError if it is malformed.
     """
     try:
-        materials = []
-        scroll_time = '2m'
-        scroll_size = 1000
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
 
-        # Initiate a scroll to retrieve data in batches
-        response = es.search(
-            index='bioimage-training',
-            scroll=scroll_time,
-            size=scroll_size,
-            body={"query": {"match_all": {}}}
-        )
+def search_page(query, exact_match, date_range, size, page=1, cursor=None, sort='relevance', order='desc',
+                selected=None, with_facets=False):
+    """
+    Fetches one page of search results with only the fields needed to render result cards.
 
-        scroll_id = response['_scroll_id']
-        materials += [doc['_source'] for doc in response['hits']['hits']]
+    Shallow pages are addressed by page number; deeper pages continue from the cursor of the previous
+    page using search_after on the sort values, so the cost of a request never depends on its depth.
 
-        # Continue scrolling until all data is retrieved
-        while len(response['hits']['hits']) > 0:
-            response = es.scroll(scroll_id=scroll_id, scroll=scroll_time)
-            scroll_id = response['_scroll_id']
-            materials += [doc['_source'] for doc in response['hits']['hits']]
+    Args:
+        query (str): The sanitized search query.
+        exact_match (bool): Match the query as a phrase in 'name'.
+        date_range (dict): Publication date bounds, or None.
+        size (int): Number of results per page.
+        page (int): 1-based page number, ignored when a cursor is given.
+        cursor (str): Cursor returned with the previous page.
+        sort (str): Sort option, see common.search_backend.SORT_FIELDS.
+        order (str): 'asc' or 'desc'.
+        selected (dict): Selected facet values per field.
+        with_facets (bool): Also count the facet values (see common.facets) and the publications per year
+            in the same request.
 
-        return jsonify(materials)
+    Returns:
+        dict: Total hit count, the compact hits with highlights, the cursor for the next page and,
+        if requested, the facets and publication years.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    if not after and page * size > MAX_RESULT_WINDOW:
+        raise ValueError(f"Pages beyond {MAX_RESULT_WINDOW} results must be requested with a cursor")
 
-    except Exception as e:
-        logger.error(f"Error fetching data from Elasticsearch: {e}")
-        return jsonify({"error": str(e)}), 500
+    found = backend.search(query, exact_match, selected, date_range, sort, order, size=size,
+                           offset=(page - 1) * size, after=after, with_facets=with_facets,
+                           fields=SEARCH_RESULT_FIELDS, highlight=True)
+    hits = found['hits']
+    response = {
+        'total': found['total'],
+        'total_relation': found['total_relation'],
+        'size': size,
+        'took': found.get('took'),
+        'hits': [{'id': hit['id'], 'score': hit['score'], **hit['source'], 'highlight': hit['highlight']}
+                 for hit in hits],
+        'next_cursor': encode_cursor(hits[-1]['sort']) if len(hits) == size else None,
+    }
+    if with_facets:
+        response['facets'] = found['facets']['facets']
+        response['publication_years'] = found['publication_years']
+    return response
 
-# Route for search functionality in Elasticsearch with optional exact match
+# Route for search functionality in the search backend with optional exact match
 @app.route('/api/search', methods=['GET'])
 def search():
     """
-    Searches indexed materials in Elasticsearch based on user query. Supports exact matches on 'name' field.
+    Searches indexed materials in the search backend based on user query. Supports exact matches on 'name' field.
+
+    Query parameters:
+        q: The search query; empty to browse all materials by filters.
+        exact_match: 'true' to match the query as a phrase in 'name'.
+        tags, type, license, authors: Selected facet values, repeatable; values of one field are
+            alternatives, different fields must all match.
+        date_from, date_to: Publication date range as year, year-month or date.
+        sort: 'relevance' (default), 'date' or 'downloads'.
+        order: 'desc' (default) or 'asc' for the date and downloads sorts.
+        facets: 'true' to include the facet counts for the query and selection (paged mode only).
+        size: Results per page (default 10, at most 100).
+        page: 1-based page number for shallow pages.
+        cursor: The 'next_cursor' of the previous response, for deep pages.
+
+    Without any of size, page or cursor the raw hits of the first 1000 matches are returned as before.
 
     Returns:
         JSON response with search results or error message.
@@ -179,35 +265,147 @@ def search():
     query = request.args.get('q', '')
     exact_match = request.args.get('exact_match', 'false').lower() == 'true'
     sanitized_query = query.replace('+', ' ').replace(':', '')
+    sort_option = request.args.get('sort', 'relevance')
+    order = request.args.get('order', 'desc')
+    try:
+        selected, date_range = parse_filters(request.args)
+        validate_sort(sort_option, order)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    params = {
+        'exact_match': exact_match, 'sort': sort_option, 'order': order,
+        'date_from': request.args.get('date_from'), 'date_to': request.args.get('date_to'),
+        **{field: '|'.join(sorted(values)) for field, values in selected.items()},
+    }
 
+    paged = any(param in request.args for param in ('size', 'page', 'cursor'))
     try:
-        if exact_match:
-            es_response = es.search(
-                index='bioimage-training',
-                body={
-                    "query": {
-                        "match_phrase": {"name": sanitized_query}
-                    }
-                },
-                size=1000
-            )
+        if paged:
+            try:
+                size = min(max(int(request.args.get('size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                page = max(int(request.args.get('page', 1)), 1)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            cursor = request.args.get('cursor')
+            with_facets = request.args.get('facets', 'false').lower() == 'true'
+            params = {**params, 'size': size, 'page': page, 'cursor': cursor, 'facets': with_facets}
+
+            def compute():
+                return search_page(sanitized_query, exact_match, date_range, size, page, cursor, sort_option, order,
+                                   selected, with_facets)
         else:
-            es_response = es.search(
-                index='bioimage-training',
-                body={
-                    "query": {
-                        "multi_match": {
-                            "query": sanitized_query,
-                            "fields": ["name^3", "description", "tags", "authors", "type", "license"],
-                            "type": "best_fields"
-                        }
-                    }
-                },
-                size=1000
-            )
-        return jsonify(es_response['hits']['hits'])
+            def compute():
+                found = backend.search(sanitized_query, exact_match, selected, date_range, sort_option, order,
+                                       size=LEGACY_RESULT_SIZE)
+                return [{'_id': hit['id'], '_score': hit['score'], '_source': hit['source']} for hit in found['hits']]
+
+        # Results only change with the index generation, so unchanged queries are answered with a 304
+        # or the cached compressed body without touching the query cache or serializing again
+        etag = strong_etag('search', query_cache.generation(), sanitized_query, params)
+        try:
+            return cached_response(etag, lambda: query_cache.get_or_compute('search', sanitized_query, params, compute))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    except ElasticsearchUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        logger.error(f"Error searching in the search backend: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Route for facet values with document counts for the current query and selection
+@app.route('/api/facets', methods=['GET'])
+def facets():
+    """
+    Counts the documents per value of the facet fields (tags, type, license, authors) with terms
+    aggregations, so clients no longer need the whole catalogue to build their filters.
+
+    Query parameters:
+        q: Optional search query the counts are restricted to.
+        exact_match: 'true' to match the query as a phrase in 'name'.
+        tags, type, license, authors: Selected values, repeatable. Each facet is counted with the
+            selection of the other facets applied, so alternatives within a facet keep their counts.
+        date_from, date_to: Publication date range as year, year-month or date.
+        size: Maximum number of values per facet (default 100, at most 1000).
+
+    Returns:
+        JSON with the number of documents matching the selection ('total') and the values with
+        their 'doc_count' per facet ('facets'), or error message.
+    """
+    query = request.args.get('q', '')
+    exact_match = request.args.get('exact_match', 'false').lower() == 'true'
+    sanitized_query = query.replace('+', ' ').replace(':', '')
+    try:
+        selected, date_range = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        size = min(max(int(request.args.get('size', FACET_DEFAULT_SIZE)), 1), FACET_MAX_SIZE)
+    except ValueError:
+        return jsonify({"error": "size must be an integer"}), 400
+
+    def compute():
+        return backend.facets(sanitized_query, exact_match, selected, date_range, size)
+
+    try:
+        params = {'exact_match': exact_match, 'size': size,
+                  'date_from': request.args.get('date_from'), 'date_to': request.args.get('date_to'),
+                  **{field: '|'.join(sorted(values)) for field, values in selected.items()}}
+        return jsonify(query_cache.get_or_compute('facets', sanitized_query, params, compute))
+    except ElasticsearchUnavailable as e:
+        return unavailable(e)
     except Exception as e:
-        logger.error(f"Error searching in Elasticsearch: {e}")
+        logger.error(f"Error fetching facets from the search backend: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Route for word clouds of the tags of all or of filtered materials
+@app.route('/api/wordcloud', methods=['GET'])
+def wordcloud():
+    """
+    Serves a word cloud of the tags of the materials matching the filters, sized by the number of materials per tag.
+
+    Tag counts come from a terms aggregation of the search backend. Clouds are rendered once per distinct
+    frequency table into a shared cache (word_cloud.py); the full cloud is rendered by the indexer.
+
+    Query parameters:
+        type, license, authors: Selected values, repeatable.
+        date_from, date_to: Publication date range as year, year-month or date.
+        width: 400, 800 (default) or 1600 pixels; the height is half the width.
+        format: 'png' (default) or 'svg'.
+
+    Returns:
+        The image, or JSON error message.
+    """
+    output_format = request.args.get('format', 'png').lower()
+    try:
+        selected, date_range = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        width = int(request.args.get('width', WORDCLOUD_DEFAULT_WIDTH))
+    except ValueError:
+        return jsonify({"error": "width must be an integer"}), 400
+    if width not in WORDCLOUD_WIDTHS or output_format not in WORDCLOUD_FORMATS:
+        return jsonify({"error": f"width must be one of {', '.join(map(str, WORDCLOUD_WIDTHS))} "
+                                 f"and format one of {', '.join(WORDCLOUD_FORMATS)}"}), 400
+    selected.pop('tags', None)
+    params = {'date_from': request.args.get('date_from'), 'date_to': request.args.get('date_to'),
+              **{field: '|'.join(sorted(values)) for field, values in selected.items()}}
+
+    def produce():
+        frequencies = query_cache.get_or_compute('wordcloud', '', params,
+                                                 lambda: tag_frequencies(backend, selected, date_range))
+        return [word_clouds.read(frequencies, width, output_format)]
+
+    try:
+        etag = strong_etag('wordcloud', query_cache.generation(), width, output_format, params)
+        mimetype = 'image/svg+xml' if output_format == 'svg' else 'image/png'
+        return cached_response(etag, produce, mimetype, stream=True, compress=output_format == 'svg')
+    except LookupError:
+        return jsonify({"error": "No tagged materials match the filters"}), 404
+    except ElasticsearchUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        logger.error(f"Error rendering the word cloud: {e}")
         return jsonify({"error": str(e)}), 500
 
 # Route for providing search suggestions based on partial query
@@ -216,31 +414,89 @@ def suggest():
     """
     Provides search suggestions for auto-complete functionality based on partial user query.
 
+    Suggestions come from resource names (matched from any of their first words) and tags. Queries
+    shorter than SUGGEST_MIN_PREFIX characters return an empty list without any work; clients are
+    expected to debounce keystrokes and not to call below that length.
+
+    Query parameters:
+        q: The partial query.
+        size: Number of suggestions (default 8, at most 20).
+
     Returns:
-        JSON response with suggested matches or error message.
+        JSON list of suggestions with only 'id' and 'text', or error message. Tag suggestions have
+        ids starting with 'tag:'.
     """
     try:
         query = request.args.get('q', '')
-        es_response = es.search(
-            index='bioimage-training',
-            body={
-                "query": {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["name", "description"],
-                        "type": "bool_prefix"
-                    }
-                }
-            }
-        )
-        suggestions = es_response['hits']['hits']
-        return jsonify([suggestion['_source'] for suggestion in suggestions])
+        try:
+            size = min(max(int(request.args.get('size', SUGGEST_DEFAULT_SIZE)), 1), SUGGEST_MAX_SIZE)
+        except ValueError:
+            return jsonify({"error": "size must be an integer"}), 400
+
+        return jsonify(query_cache.get_or_compute('suggest', query, {'size': size},
+                                                  lambda: suggester.suggest(query, size)))
+    except ElasticsearchUnavailable as e:
+        return unavailable(e)
     except Exception as e:
-        logger.error(f"Error fetching suggestions from Elasticsearch: {e}")
+        logger.error(f"Error fetching suggestions from the search backend: {e}")
         return jsonify({"error": str(e)}), 500
 
-# Main entry point to optionally delete the index, reindex data, and run the Flask app
+# Route exposing the hit/miss statistics of the query cache
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Reports the query cache backend, the index generation it is keyed on and its hit rate, the size
+    and hit rate of the cached compressed responses under 'responses', and the word clouds rendered
+    and reused by this worker under 'wordclouds'.
+    """
+    return jsonify({**query_cache.stats(), 'responses': response_cache.stats(), 'wordclouds': word_clouds.stats()})
+
+# Route for the webhook of the resource repository, asking the refresh scheduler to check the source now
+@app.route('/api/refresh', methods=['POST'])
+def refresh_webhook():
+    """
+    Asks the refresh scheduler (indexer.py --watch) to check the resource source now instead of at its
+    next interval, e.g. from a push webhook of NFDI4BIOIMAGE/training.
+
+    Requests are signed like GitHub webhooks: X-Hub-Signature-256 holds the HMAC-SHA256 of the body
+    keyed with REFRESH_WEBHOOK_SECRET. Only the request is recorded here; the scheduler reindexes and
+    regenerates the word cloud if the resources actually changed.
+
+    Returns:
+        JSON response with the recorded request (202) or error message.
+    """
+    if not REFRESH_WEBHOOK_SECRET:
+        return jsonify({"error": "The refresh webhook is disabled, set REFRESH_WEBHOOK_SECRET to enable it"}), 403
+    if not verify_signature(request.get_data(), request.headers.get('X-Hub-Signature-256', '')):
+        return jsonify({"error": "Invalid signature"}), 401
+    if request.headers.get('X-GitHub-Event') == 'ping':
+        return jsonify({"status": "pong"})
+    try:
+        trigger = request_refresh('webhook')
+    except OSError as e:
+        logger.error(f"Error requesting a refresh: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"status": "accepted", "trigger": trigger}), 202
+
+# Route reporting the refresh runs of the scheduler
+@app.route('/api/refresh/status', methods=['GET'])
+def refresh_status():
+    """
+    Reports the content currently indexed and the last refresh runs, each with its trigger, outcome,
+    duration and document delta.
+    """
+    status = read_status()
+    if status is None:
+        return jsonify({"error": "No refresh has run yet"}), 404
+    return jsonify(status)
+
+# Looks up the index generation (opening the local index) and builds the suggestion prefix index
+# in every worker before it serves, so its first requests do not pay for them
+@on_worker_start
+def warm_up():
+    query_cache.generation()
+    suggester.warm_up()
+
+# Development server; in production the app is served by gunicorn (common/serving.py) and indexed by indexer.py
 if __name__ == '__main__':
-    delete_index('bioimage-training')
-    index_yaml_files()
     app.run(host='0.0.0.0', port=5000, debug=True)
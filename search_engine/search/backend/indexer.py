@@ -0,0 +1,300 @@
+"""
+Indexes the current resource snapshot into the search backend, once or as the refresh scheduler.
+
+The web workers of the search backend (index_data.py) and the chatbot only read the index; this
+command is the one process that writes it. Once, it writes a new snapshot if the resource source changed
+(common.snapshot.ingest), waits for the search backend, synchronizes the index with the snapshot (patching
+the live index, or building a new generation and swapping the alias onto it), precomputes the chatbot's
+embeddings, renders the word cloud of the tags and exits. Web workers pick up the new generation on their
+next check, so it can run while they serve.
+
+With --watch it keeps running as the refresh scheduler: at the interval, and whenever the webhook of
+the search backend asks for it, it checks the resource source with a conditional request and, only if
+the resources changed, writes a new snapshot, reindexes and renders the word cloud again (if the tag
+counts changed). Only the holder of the leader lock in REFRESH_DIR refreshes; further instances stand
+by until it goes away. Each run is reported with its duration and document delta in
+REFRESH_DIR/status.json (/api/refresh/status).
+
+Usage:
+    python indexer.py [--rebuild] [--timeout SECONDS] [--source URL]
+    python indexer.py --watch [SECONDS] [--source URL] [--metrics-port PORT]
+
+Run once while a scheduler holds the leader lock, the command asks the scheduler to refresh instead.
+Exits with status 1 if the search backend stays unreachable or indexing fails. Run from the
+search/backend directory (in the container: /app).
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+
+from prometheus_client import start_http_server
+
+from refresh import REFRESH_INTERVAL, LeaderLock, read_status, record_run, request_refresh, take_trigger
+from reindex import document_id, reindex
+from suggestions import completion_source
+from word_cloud import WordCloudService, tag_frequencies
+from common.embeddings import update_embeddings
+from common.es_client import get_es
+from common.metrics import REFRESH_DOCUMENTS, REFRESH_LATENCY
+from common.search_backend import create_search_backend
+from common.snapshot import SnapshotSource, ingest
+
+logger = logging.getLogger(__name__)
+
+# How often the scheduler checks for a requested refresh, and a standby instance for the leader lock
+TRIGGER_POLL_INTERVAL = 1
+STANDBY_INTERVAL = 10
+
+es = get_es()
+
+# The same engine the web workers read, here with the functions that write it
+backend = create_search_backend(
+    es, indexer=lambda resources, force_rebuild: reindex(es, resources, force_rebuild=force_rebuild),
+    id_func=document_id, completion_func=completion_source)
+
+# Normalized resources of the current snapshot written by the ingestion command (common/ingest.py)
+resource_source = SnapshotSource()
+
+# Word clouds in the cache the search backend serves them from (word_cloud.py)
+word_clouds = WordCloudService()
+
+# Function to index the resources of the current snapshot into the search backend
+def index_yaml_files(force_rebuild=False):
+    """
+    Reads the current resource snapshot and synchronizes it into the search backend for search functionality.
+    Only new, edited or removed resources are written to the live index unless a full rebuild is
+    needed, in which case a new index generation is built and the alias swapped onto it.
+
+    Args:
+        force_rebuild (bool): Build a new index generation even if the live index could be patched.
+
+    Returns:
+        dict: Summary of the reindex, or None if it failed.
+    """
+    try:
+        data = resource_source.resources()
+        if not data:
+            # Never let a missing snapshot wipe the live index
+            logger.error("No resources available, keeping the current index")
+        else:
+            summary = backend.sync(data, force_rebuild=force_rebuild)
+            generation = backend.generation()
+            summary['generation'] = generation
+            summary['embeddings'] = index_embeddings(generation, data)
+            summary['wordcloud'] = regenerate_wordcloud()
+            return summary
+
+    except Exception as e:
+        logger.error(f"Error indexing YAML files: {e}")
+
+# Function to precompute the dense vectors the chatbot's hybrid retrieval searches
+def index_embeddings(generation, resources):
+    """
+    Embeds the indexed resources once per index generation and stores them for the chatbot.
+
+    Vectors are keyed on the same content-derived document IDs as the index, so only new or edited
+    resources are encoded. A failure here never fails the reindex; the chatbot then keeps using
+    keyword retrieval only.
+
+    Args:
+        generation (str): The index generation the resources were written to.
+        resources (list): Resource entries from the YAML file.
+
+    Returns:
+        dict: Summary of the embedding update, or None if it failed.
+    """
+    try:
+        documents = {document_id(item): item for item in resources if isinstance(item, dict)}
+        return update_embeddings(generation, documents)
+    except Exception as e:
+        logger.error(f"Error computing embeddings: {e}")
+
+# Function to reindex once the search backend is reachable
+def index_when_available(force_rebuild=False, timeout=None):
+    """
+    Waits for the search backend (Elasticsearch on the client's backoff schedule) and then synchronizes the index.
+
+    Args:
+        force_rebuild (bool): Build a new index generation even if the live index could be patched.
+        timeout (float): Give up waiting after this many seconds; wait forever if None.
+
+    Returns:
+        dict: Summary of the reindex, or None if the backend stayed unreachable or indexing failed.
+    """
+    if not backend.wait_until_available(timeout):
+        logger.error(f"Search backend unreachable after {timeout}s, nothing indexed")
+        return None
+    return index_yaml_files(force_rebuild=force_rebuild)
+
+
+# Function to compare the documents of the live index with those of the resources about to be indexed
+def document_delta(resources):
+    """
+    Counts the documents a reindex adds and removes. Document IDs are derived from the content, so an
+    edited resource counts as one removed and one added document.
+
+    Returns:
+        dict: Number of documents 'before' and 'after', and the 'added' and 'removed' ones.
+    """
+    previous = set()
+    if backend.generation() is not None:
+        previous = {hit['_id'] for hit in backend.iter_documents(['name'])}
+    current = {document_id(item) for item in resources if isinstance(item, dict)}
+    return {'before': len(previous), 'after': len(current),
+            'added': len(current - previous), 'removed': len(previous - current)}
+
+# Function to render the word cloud of the indexed tags
+def regenerate_wordcloud():
+    """
+    Renders the word cloud of all indexed materials from a terms aggregation over their tags and publishes
+    it at static/wordcloud.png. Nothing is rendered if the tag counts did not change since a cloud was
+    last rendered. A failure never fails the indexing; the previous image is kept.
+
+    Returns:
+        dict: 'status' ('ok' or 'error'), whether the cloud was 'rendered' and the time taken.
+    """
+    started = time.perf_counter()
+    try:
+        result = word_clouds.publish(tag_frequencies(backend))
+        return {'status': 'ok', 'key': result['key'], 'rendered': result['rendered'],
+                'seconds': round(time.perf_counter() - started, 3)}
+    except Exception as e:
+        logger.error(f"Error regenerating the word cloud: {e}")
+        return {'status': 'error', 'seconds': round(time.perf_counter() - started, 3)}
+
+# Function to refresh the index and the word cloud from the resource source if it changed
+def refresh(source=None, trigger='schedule', force_rebuild=False, verify=False):
+    """
+    Checks the resource source and, only if the resources changed since the last refresh, reindexes
+    them and regenerates the word cloud.
+
+    The source is fetched with a conditional request and compared by content hash (common.snapshot.ingest),
+    and the content hash of the snapshot is compared with that of the last indexed one, recorded in the
+    refresh status; a run that failed after writing the snapshot is therefore repeated by the next one.
+    With verify, the index is synchronized even if the content did not change, so that a deployment with a
+    new index mapping or version rebuilds the index without waiting for the next change of the resources.
+
+    Args:
+        source (str): URL, file or directory of the resources; RESOURCES_YAML_URL by default.
+        trigger (str): What started the run, e.g. 'schedule' or 'webhook'.
+        force_rebuild (bool): Reindex into a new generation even if nothing changed.
+        verify (bool): Synchronize the index even if the content did not change.
+
+    Returns:
+        dict: Report of the run, also recorded in the refresh status.
+    """
+    started = time.perf_counter()
+    report = {'trigger': trigger, 'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+              'changed': False}
+    outcome, indexed_hash, documents = 'error', None, None
+    try:
+        manifest = ingest(source, resource_source.directory)
+        report['snapshot'] = manifest['version']
+        backend.wait_until_available()
+        unchanged = (manifest['content_hash'] == (read_status() or {}).get('content_hash')
+                     and backend.generation() is not None)
+        if unchanged and not (force_rebuild or verify):
+            outcome = 'unchanged'
+        else:
+            resources = resource_source.resources()
+            report['documents'] = document_delta(resources)
+            summary = index_yaml_files(force_rebuild=force_rebuild)
+            if summary is None:
+                raise RuntimeError("indexing failed, see the log above")
+            report['index'] = {key: summary.get(key) for key in ('mode', 'generation', 'indexed', 'deleted', 'seconds')}
+            report['embeddings'] = summary['embeddings']
+            report['wordcloud'] = summary['wordcloud']
+            report['changed'] = not unchanged
+            outcome, indexed_hash, documents = 'refreshed', manifest['content_hash'], report['documents']['after']
+            for change in ('added', 'removed'):
+                REFRESH_DOCUMENTS.labels(change).inc(report['documents'][change])
+    except Exception as e:
+        logger.error(f"Error refreshing from {source or 'the resource source'}: {e}")
+        report['error'] = str(e)
+    duration = time.perf_counter() - started
+    report.update(outcome=outcome, seconds=round(duration, 3))
+    REFRESH_LATENCY.labels(trigger, outcome).observe(duration)
+    logger.info(f"Refresh ({trigger}) {outcome} in {report['seconds']}s"
+                + (f": {report['documents']}" if 'documents' in report else ''))
+    record_run(report, content_hash=indexed_hash, documents=documents)
+    return report
+
+# Function to run refreshes on a schedule and on request while holding the leader lock
+def watch(interval=REFRESH_INTERVAL, source=None):
+    """
+    Refreshes at the interval and whenever a refresh is requested (refresh.request_refresh), as the
+    only refresher: an instance that cannot take the leader lock stands by until the leader goes away.
+    """
+    lock = LeaderLock()
+    if not lock.acquire():
+        logger.info("Another refresher holds the leader lock, standing by")
+        while not lock.acquire():
+            time.sleep(STANDBY_INTERVAL)
+    logger.info(f"Refresh leader, checking the resource source every {interval}s")
+    due = 0
+    # The first run always synchronizes, so a new mapping or index version of this deployment is applied
+    verified = False
+    while True:
+        trigger = take_trigger()
+        if trigger is not None or time.monotonic() >= due:
+            report = refresh(source, trigger['reason'] if trigger else 'schedule',
+                             force_rebuild=bool(trigger and trigger.get('rebuild')), verify=not verified)
+            verified = verified or report['outcome'] == 'refreshed'
+            due = time.monotonic() + interval
+        time.sleep(TRIGGER_POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rebuild', action='store_true',
+                        default=os.getenv('REINDEX_MODE', 'incremental') == 'rebuild',
+                        help="build a new index generation even if the live index could be patched")
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help="give up if the search backend is still unreachable after this long")
+    parser.add_argument('--watch', type=float, nargs='?', const=REFRESH_INTERVAL, metavar='SECONDS',
+                        help=f"keep running and refresh from the source at this interval (default {REFRESH_INTERVAL:g})")
+    parser.add_argument('--source', help="URL, YAML file or directory of YAML files to ingest from")
+    parser.add_argument('--metrics-port', type=int,
+                        help="with --watch, serve refresh and fetch metrics in Prometheus format on this port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if args.watch:
+        if args.metrics_port:
+            start_http_server(args.metrics_port)
+        watch(args.watch, args.source)
+        return 0
+
+    lock = LeaderLock()
+    if not lock.acquire():
+        trigger = request_refresh('manual', rebuild=args.rebuild)
+        logger.info(f"A refresh scheduler holds the leader lock; asked it to refresh ({trigger['id']})")
+        return 0
+    started = time.perf_counter()
+    # Index the latest resources as refresh() does; if the source is unreachable, the last snapshot
+    try:
+        ingest(args.source, resource_source.directory)
+    except Exception as e:
+        logger.error(f"Error ingesting from {args.source or 'the resource source'}: {e}")
+        if resource_source.manifest is None:
+            logger.error("No snapshot to index, nothing indexed")
+            return 1
+        logger.info(f"Indexing the last snapshot {resource_source.manifest['version']}")
+    summary = index_when_available(force_rebuild=args.rebuild, timeout=args.timeout)
+    if summary is None:
+        return 1
+    # The snapshot the resources were read from, so the scheduler knows what the index holds
+    manifest = resource_source.manifest
+    record_run({'trigger': 'manual', 'outcome': 'indexed', 'changed': True, 'index': summary.get('generation'),
+                'snapshot': manifest['version'], 'seconds': round(time.perf_counter() - started, 3)},
+               content_hash=manifest['content_hash'], documents=summary.get('indexed', 0) + summary.get('unchanged', 0))
+    print(json.dumps(summary, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from common.metrics import observe_cache
+
+logger = logging.getLogger(__name__)
+
+# Cache settings, overridable through the environment
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 2048))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 300))
+QUERY_CACHE_BACKEND = os.getenv('QUERY_CACHE_BACKEND', 'memory')
+QUERY_CACHE_URL = os.getenv('QUERY_CACHE_URL', 'redis://localhost:6379/0')
+# How often the index generation is looked up in Elasticsearch
+GENERATION_CHECK_INTERVAL = float(os.getenv('GENERATION_CHECK_INTERVAL', 5))
+
+
+class MemoryBackend:
+    """
+    Thread-safe in-process LRU store with per-entry expiry.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Store shared by all workers through Redis; eviction is left to Redis' maxmemory policy.
+    """
+
+    def __init__(self, url=QUERY_CACHE_URL, prefix='query-cache:'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, json.dumps(value, default=str), ex=max(int(ttl), 1))
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + '*'):
+            self._client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(match=self.prefix + '*'))
+
+
+def create_backend(name=QUERY_CACHE_BACKEND):
+    """
+    Creates the configured cache backend, falling back to the in-process one if Redis is unavailable.
+    """
+    if name == 'redis':
+        try:
+            return RedisBackend()
+        except ImportError:
+            logger.warning("QUERY_CACHE_BACKEND=redis but the redis package is not installed, using memory")
+    return MemoryBackend()
+
+
+def normalize_query(query):
+    """
+    Normalizes a query string so that case and whitespace variations share one cache entry.
+    """
+    return ' '.join(query.split()).casefold()
+
+
+class QueryCache:
+    """
+    Caches query responses under the current index generation.
+
+    Every key embeds the generation of the index behind the alias, so after a reindex old entries are
+    simply never hit again and age out of the LRU.
+    """
+
+    def __init__(self, generation_func, backend=None, ttl=QUERY_CACHE_TTL,
+                 check_interval=GENERATION_CHECK_INTERVAL):
+        """
+        Args:
+            generation_func (callable): Returns the current index generation as a string.
+            backend: Store implementing get/set/clear, defaults to the configured backend.
+            ttl (float): Seconds an entry is kept.
+            check_interval (float): Seconds between generation lookups.
+        """
+        self.generation_func = generation_func
+        self.backend = backend or create_backend()
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        """
+        Returns the cached index generation, refreshing it at most every check_interval seconds.
+        """
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    try:
+                        self.set_generation(self.generation_func())
+                    except Exception as e:
+                        logger.error(f"Error looking up the index generation: {e}")
+                        self._checked_at = time.monotonic()
+        return self._generation
+
+    def set_generation(self, generation):
+        """
+        Records a new index generation, e.g. right after this process reindexed.
+        """
+        if generation != self._generation:
+            logger.info(f"Index generation changed to {generation}")
+        self._generation = generation
+        self._checked_at = time.monotonic()
+
+    def key(self, endpoint, query, **params):
+        params = '&'.join(f"{name}={params[name]}" for name in sorted(params) if params[name] is not None)
+        return f"{self.generation()}|{endpoint}|{normalize_query(query)}|{params}"
+
+    def get_or_compute(self, endpoint, query, params, compute):
+        """
+        Returns the cached response for the query, computing and storing it on a miss.
+
+        Args:
+            endpoint (str): Name of the endpoint, part of the key.
+            query (str): The user query.
+            params (dict): Further parameters that change the result, e.g. exact_match.
+            compute (callable): Produces the JSON-serializable response on a miss.
+
+        Returns:
+            The cached or freshly computed response.
+        """
+        generation = self.generation()
+        if generation is None:
+            # Without a known generation nothing can be invalidated safely
+            return compute()
+
+        key = self.key(endpoint, query, **params)
+        value = self.backend.get(key)
+        observe_cache(endpoint, value is not None)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'generation': self._generation,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,164 @@
+import datetime
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import socket
+import uuid
+
+# Directory shared by the refresher (indexer.py --watch) and the web workers: leader lock, trigger and status
+REFRESH_DIR = os.getenv('REFRESH_DIR', 'data/refresh')
+# Seconds between checks of the resource source
+REFRESH_INTERVAL = float(os.getenv('REFRESH_INTERVAL', 300))
+# Shared secret of the webhook; the webhook is disabled without it
+REFRESH_WEBHOOK_SECRET = os.getenv('REFRESH_WEBHOOK_SECRET', '')
+# Runs kept in the status file
+REFRESH_HISTORY = 20
+LOCK_FILE = 'leader.lock'
+TRIGGER_FILE = 'trigger.json'
+STATUS_FILE = 'status.json'
+
+
+def _write_json(path, payload):
+    """
+    Replaces a JSON file atomically, so readers never see a partial file.
+    """
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(payload, handle, indent=2, default=str)
+    os.replace(temporary, path)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+
+
+class LeaderLock:
+    """
+    Exclusive lock on a file in the refresh directory, held by the one process allowed to refresh.
+
+    The operating system releases it when its holder exits or crashes, so a standby refresher takes
+    over without any cleanup. It covers processes sharing the directory on one host (e.g. containers
+    sharing a volume).
+    """
+
+    def __init__(self, directory=REFRESH_DIR):
+        self.path = os.path.join(directory, LOCK_FILE)
+        self._handle = None
+
+    def acquire(self):
+        """
+        Tries to take the lock without waiting.
+
+        Returns:
+            bool: Whether this process holds the lock now.
+        """
+        if self._handle is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self):
+        if self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+
+
+def request_refresh(reason, rebuild=False, directory=REFRESH_DIR):
+    """
+    Asks the refresh leader to check the source now instead of at its next interval.
+
+    Args:
+        reason (str): What asked for the refresh, e.g. 'webhook'; reported with the run.
+        rebuild (bool): Build a new index generation even if the live index could be patched.
+
+    Returns:
+        dict: The trigger written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    trigger = {'id': uuid.uuid4().hex[:12], 'reason': reason, 'rebuild': rebuild, 'requested_at': _now()}
+    _write_json(os.path.join(directory, TRIGGER_FILE), trigger)
+    return trigger
+
+
+def take_trigger(directory=REFRESH_DIR):
+    """
+    Returns the pending trigger and removes it, or None if no refresh was requested.
+
+    The file is renamed before it is read, so a trigger written meanwhile is kept for the next check.
+    """
+    path = os.path.join(directory, TRIGGER_FILE)
+    taken = f"{path}.taken"
+    try:
+        os.replace(path, taken)
+    except FileNotFoundError:
+        return None
+    try:
+        with open(taken, encoding='utf-8') as handle:
+            return json.load(handle)
+    except ValueError:
+        return {'reason': 'unknown', 'rebuild': False}
+    finally:
+        os.remove(taken)
+
+
+def read_status(directory=REFRESH_DIR):
+    """
+    Returns the refresh status written by the leader, or None before its first run.
+    """
+    try:
+        with open(os.path.join(directory, STATUS_FILE), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def record_run(report, content_hash=None, documents=None, directory=REFRESH_DIR):
+    """
+    Adds a run to the status file; with content_hash, also records the content now indexed.
+
+    Args:
+        report (dict): Report of the run.
+        content_hash (str): Content hash of the snapshot indexed by the run, if it indexed one.
+        documents (int): Number of documents indexed by the run.
+
+    Returns:
+        dict: The new status.
+    """
+    os.makedirs(directory, exist_ok=True)
+    status = read_status(directory) or {}
+    status['leader'] = {'host': socket.gethostname(), 'pid': os.getpid()}
+    if content_hash is not None:
+        status['content_hash'] = content_hash
+        status['documents'] = documents
+    status['last_run'] = report
+    status['runs'] = ([report] + status.get('runs', []))[:REFRESH_HISTORY]
+    _write_json(os.path.join(directory, STATUS_FILE), status)
+    return status
+
+
+def verify_signature(body, signature, secret=REFRESH_WEBHOOK_SECRET):
+    """
+    Checks a webhook signature in the format of GitHub's X-Hub-Signature-256 header.
+
+    Args:
+        body (bytes): Raw request body.
+        signature (str): 'sha256=' followed by the hex HMAC-SHA256 of the body.
+        secret (str): The shared secret.
+
+    Returns:
+        bool: Whether the signature matches.
+    """
+    if not secret or not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import time
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+from elasticsearch.helpers import scan
+
+from bulk_indexing import bulk_index, bulk_write
+from common.search_backend import INDEX_ALIAS, PUBLISHED_FIELD, SUGGEST_FIELD, UID_FIELD
+from common.snapshot import normalize_date
+from suggestions import completion_source
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever INDEX_MAPPING changes so that the next reindex builds a fresh index instead of patching
+MAPPING_VERSION = 5
+
+# Set up index mapping with search-as-you-type enabled for specific fields
+INDEX_MAPPING = {
+    "mappings": {
+        "_meta": {"mapping_version": MAPPING_VERSION},
+        "_source": {"excludes": [UID_FIELD, SUGGEST_FIELD, PUBLISHED_FIELD]},
+        "properties": {
+            UID_FIELD: {"type": "keyword"},
+            SUGGEST_FIELD: {"type": "completion"},
+            "name": {"type": "search_as_you_type"},
+            "description": {"type": "search_as_you_type"},
+            # Keyword subfields back the facet aggregations and filters
+            "tags": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+            "authors": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+            "type": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+            "license": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+            "url": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 2048}}},
+            # The raw dates come in many shapes; they are kept as given and filtered via PUBLISHED_FIELD
+            "publication_date": {"type": "keyword"},
+            "submission_date": {"type": "keyword"},
+            PUBLISHED_FIELD: {"type": "date", "format": "yyyy-MM-dd"},
+            "num_downloads": {"type": "long", "ignore_malformed": True}
+        }
+    }
+}
+
+
+def normalize_url(url):
+    """
+    Normalizes a resource URL so that trivially different spellings map to the same identity.
+
+    Args:
+        url (str): The URL as written in the YAML file.
+
+    Returns:
+        str: Lower-cased scheme-less host and path without 'www.' and trailing slashes.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return urlunsplit(('', host, parts.path.rstrip('/'), parts.query, '')).lstrip('/')
+
+
+def _identity(resource):
+    url = resource.get('url')
+    if isinstance(url, list):
+        url = next((u for u in url if isinstance(u, str) and u.strip()), None)
+    if isinstance(url, str) and url.strip():
+        return 'url:' + normalize_url(url)
+    return 'name:' + ' '.join(str(resource.get('name', '')).split()).casefold()
+
+
+def document_id(resource):
+    """
+    Derives a stable document ID from the resource identity (normalized URL, or name) and its content.
+
+    An unchanged resource keeps its ID across reindexes, while an edited one gets a new ID, so comparing
+    ID sets is enough to find what has to be written and what has to be deleted.
+
+    Args:
+        resource (dict): A resource entry from the YAML file.
+
+    Returns:
+        str: The document ID.
+    """
+    identity = hashlib.sha1(_identity(resource).encode('utf-8')).hexdigest()[:20]
+    content = json.dumps(resource, sort_keys=True, default=str, ensure_ascii=False)
+    return f"{identity}-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:20]}"
+
+
+def document_source(resource, doc_id):
+    """
+    Adds the index-only fields (uid, completion inputs, normalized date) to a resource before it is written.
+    """
+    source = {**resource, UID_FIELD: doc_id, SUGGEST_FIELD: completion_source(resource)}
+    published = normalize_date(resource.get('publication_date'))
+    if published and published[:4] >= '1900':
+        source[PUBLISHED_FIELD] = published
+    return source
+
+
+def resolve_alias(es, alias=INDEX_ALIAS):
+    """
+    Looks up the concrete index behind the alias.
+
+    Returns:
+        tuple: (index name or None, whether a legacy concrete index occupies the alias name)
+    """
+    if es.indices.exists_alias(name=alias):
+        indices = sorted(es.indices.get_alias(name=alias).keys())
+        return indices[-1], False
+    return None, bool(es.indices.exists(index=alias))
+
+
+def _index_meta(es, index_name):
+    mapping = es.indices.get_mapping(index=index_name)
+    return next(iter(mapping.values()), {}).get('mappings', {}).get('_meta', {})
+
+
+def _mapping_version(es, index_name):
+    return _index_meta(es, index_name).get('mapping_version')
+
+
+def _new_revision():
+    return str(int(time.time() * 1000))
+
+
+def _set_revision(es, index_name, revision):
+    # _meta is replaced as a whole, so the mapping version has to be written again
+    es.indices.put_mapping(index=index_name, body={"_meta": {"mapping_version": MAPPING_VERSION, "revision": revision}})
+
+
+def live_document_ids(es, index_name):
+    """
+    Collects the IDs of all documents in an index without fetching their sources.
+    """
+    hits = scan(es, index=index_name, query={"query": {"match_all": {}}, "_source": False}, size=5000)
+    return {hit['_id'] for hit in hits}
+
+
+def incremental_update(es, index_name, resources):
+    """
+    Brings a live index in line with the resources by writing new or edited documents and deleting removed ones.
+
+    Args:
+        es (Elasticsearch): Connected Elasticsearch client.
+        index_name (str): The concrete index currently behind the alias.
+        resources (list): Resource entries from the YAML file.
+
+    Returns:
+        dict: Bulk summary extended with the number of unchanged documents.
+    """
+    desired = {document_id(item): item for item in resources if isinstance(item, dict)}
+    live = live_document_ids(es, index_name)
+
+    to_index = [doc_id for doc_id in desired if doc_id not in live]
+    to_delete = live - desired.keys()
+
+    actions = [{'_index': index_name, '_id': doc_id, '_source': document_source(desired[doc_id], doc_id)}
+               for doc_id in to_index]
+    actions += [{'_op_type': 'delete', '_index': index_name, '_id': doc_id} for doc_id in to_delete]
+
+    if actions:
+        # Small diffs are cheaper without toggling the refresh interval
+        summary = bulk_write(es, actions, index_name, disable_refresh=len(actions) > 1000)
+        _set_revision(es, index_name, _new_revision())
+    else:
+        summary = {'indexed': 0, 'deleted': 0, 'failed': 0, 'skipped': 0, 'errors': {}, 'seconds': 0.0}
+    summary['unchanged'] = len(desired) - len(to_index)
+    return summary
+
+
+def _generation_name():
+    """
+    Names a new index generation after the time it was started, so generations sort by age. The
+    milliseconds and a random suffix keep rebuilds started within the same second apart.
+    """
+    now = time.time()
+    return f"{time.strftime('%Y%m%d%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+
+
+def rebuild(es, resources, alias=INDEX_ALIAS, keep=1):
+    """
+    Builds a new generation of the index and atomically moves the alias onto it.
+
+    Args:
+        es (Elasticsearch): Connected Elasticsearch client.
+        resources (list): Resource entries from the YAML file.
+        alias (str): The alias readers query.
+        keep (int): Number of previous generations to keep for rollback.
+
+    Returns:
+        dict: Bulk summary of the new index.
+    """
+    new_index = f"{alias}-{_generation_name()}"
+    mapping = {"mappings": {**INDEX_MAPPING["mappings"],
+                            "_meta": {"mapping_version": MAPPING_VERSION, "revision": _new_revision()}}}
+    es.indices.create(index=new_index, body=mapping)
+    summary = bulk_index(es, resources, new_index, id_func=document_id, transform=document_source)
+
+    current, legacy = resolve_alias(es, alias)
+    actions = [{"add": {"index": new_index, "alias": alias}}]
+    if current:
+        actions.insert(0, {"remove": {"index": f"{alias}-*", "alias": alias}})
+    if legacy:
+        # A plain index created before aliases were used holds the name; drop it in the same atomic step
+        actions.insert(0, {"remove_index": {"index": alias}})
+    es.indices.update_aliases(body={"actions": actions})
+    logger.info(f"Alias {alias} now points to {new_index}")
+
+    generations = sorted(index for index in es.indices.get(index=f"{alias}-*").keys() if index != new_index)
+    for old_index in generations[:max(len(generations) - keep, 0)]:
+        es.indices.delete(index=old_index, ignore_unavailable=True)
+        logger.info(f"Deleted old index generation {old_index}")
+    return summary
+
+
+def reindex(es, resources, alias=INDEX_ALIAS, force_rebuild=False):
+    """
+    Synchronizes the search index with the resources without ever exposing an empty or partial index.
+
+    Patches the index behind the alias in place when possible and falls back to a full rebuild when
+    there is no aliased index yet, the mapping version changed, or a rebuild is forced.
+
+    Args:
+        es (Elasticsearch): Connected Elasticsearch client.
+        resources (list): Resource entries from the YAML file.
+        alias (str): The alias readers query.
+        force_rebuild (bool): Always build a new index generation.
+
+    Returns:
+        dict: Summary with the mode used, the index written and the document delta.
+    """
+    started = time.perf_counter()
+    current, _ = resolve_alias(es, alias)
+
+    if current and not force_rebuild and _mapping_version(es, current) == MAPPING_VERSION:
+        summary = incremental_update(es, current, resources)
+        summary.update(mode='incremental', index=current)
+    else:
+        summary = rebuild(es, resources, alias)
+        summary.update(mode='rebuild', index=resolve_alias(es, alias)[0])
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(
+        f"Reindex ({summary['mode']}) of {summary['index']}: {summary['indexed']} written, "
+        f"{summary['deleted']} deleted, {summary.get('unchanged', 0)} unchanged in {summary['seconds']}s"
+    )
+    return summary
@@ -0,0 +1,240 @@
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Contract with the frontend: no suggestions below this many characters, clients debounce keystrokes
+SUGGEST_MIN_PREFIX = int(os.getenv('SUGGEST_MIN_PREFIX', 2))
+SUGGEST_DEFAULT_SIZE = 8
+SUGGEST_MAX_SIZE = 20
+# Prefixes up to this length are answered from the in-process index; longer ones use the completion of the
+# search backend (fuzzy in Elasticsearch)
+SUGGEST_LOCAL_MAX_PREFIX = int(os.getenv('SUGGEST_LOCAL_MAX_PREFIX', 8))
+# Number of leading words of a name that can start a suggestion ("to Napari" matches "Introduction to Napari")
+MAX_WORD_STARTS = 6
+
+TAG_ID_PREFIX = 'tag:'
+
+_WORD = re.compile(r'\S+')
+
+
+def normalize_prefix(text):
+    return ' '.join(text.split()).casefold()
+
+
+def _word_starts(text):
+    starts = [match.start() for match in _WORD.finditer(text)][:MAX_WORD_STARTS]
+    return [text[start:] for start in starts]
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def resource_weight(resource):
+    """
+    Ranks suggestions by downloads where known; every resource gets at least weight 1.
+    """
+    try:
+        return 1 + min(int(resource.get('num_downloads') or 0), 2 ** 30)
+    except (TypeError, ValueError):
+        return 1
+
+
+def completion_source(resource):
+    """
+    Builds the value of the completion field for a resource: its name from every word start, and its tags.
+
+    Args:
+        resource (dict): A resource entry from the YAML file.
+
+    Returns:
+        dict: Completion field value with inputs and weight.
+    """
+    name = ' '.join(str(resource.get('name', '')).split())
+    inputs = _word_starts(name) if name else []
+    inputs += [tag for tag in _as_list(resource.get('tags')) if isinstance(tag, str) and tag.strip()]
+    return {'input': list(dict.fromkeys(inputs)), 'weight': resource_weight(resource)}
+
+
+class PrefixIndex:
+    """
+    Compact in-process prefix index over suggestion keys.
+
+    Keys are kept in one sorted array, so every prefix maps to a contiguous range found by binary search.
+    For short prefixes, whose ranges are large, the best entries are precomputed per prefix.
+    """
+
+    def __init__(self, entries, precompute_length=3, precompute_size=SUGGEST_MAX_SIZE):
+        """
+        Args:
+            entries (iterable): Tuples of (suggestion id, display text, weight, keys).
+            precompute_length (int): Prefixes up to this length get a precomputed top list.
+            precompute_size (int): Length of each precomputed top list.
+        """
+        self.texts = {}
+        self.weights = {}
+        pairs = []
+        for entry_id, text, weight, keys in entries:
+            self.texts[entry_id] = text
+            self.weights[entry_id] = weight
+            pairs.extend((normalize_prefix(key), entry_id) for key in keys)
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = [entry_id for _, entry_id in pairs]
+
+        self.precompute_length = precompute_length
+        self.top = {}
+        candidates = {}
+        for key, entry_id in pairs:
+            for length in range(1, min(len(key), precompute_length) + 1):
+                candidates.setdefault(key[:length], set()).add(entry_id)
+        for prefix, entry_ids in candidates.items():
+            self.top[prefix] = self._best(entry_ids, precompute_size)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _best(self, entry_ids, size):
+        return heapq.nsmallest(size, entry_ids, key=lambda entry_id: (-self.weights[entry_id], self.texts[entry_id]))
+
+    def lookup(self, prefix, size=SUGGEST_DEFAULT_SIZE):
+        """
+        Returns the highest-weighted suggestions having a key that starts with the prefix.
+
+        Returns:
+            list: Dicts with the suggestion id and text.
+        """
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= self.precompute_length and size <= SUGGEST_MAX_SIZE:
+            best = self.top.get(prefix, [])[:size]
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\uffff', lo=start)
+            best = self._best(set(self.ids[start:end]), size)
+        return [{'id': entry_id, 'text': self.texts[entry_id]} for entry_id in best]
+
+
+def build_prefix_index(hits):
+    """
+    Builds the prefix index from index hits carrying name, tags and num_downloads.
+
+    Args:
+        hits (iterable): Index hits with '_id' and '_source'.
+
+    Returns:
+        PrefixIndex: Index over resource names and tags.
+    """
+    entries = []
+    tag_counts = {}
+    tag_texts = {}
+    for hit in hits:
+        source = hit['_source']
+        name = ' '.join(str(source.get('name', '')).split())
+        if name:
+            entries.append((hit['_id'], name, resource_weight(source), _word_starts(name)))
+        for tag in _as_list(source.get('tags')):
+            if isinstance(tag, str) and tag.strip():
+                key = normalize_prefix(tag)
+                tag_counts[key] = tag_counts.get(key, 0) + 1
+                tag_texts.setdefault(key, tag.strip())
+    # Tags rank by the number of resources carrying them
+    entries += [(TAG_ID_PREFIX + key, tag_texts[key], count, [key]) for key, count in tag_counts.items()]
+    return PrefixIndex(entries)
+
+
+class Suggester:
+    """
+    Serves suggestions from the in-process prefix index, falling back to the completion of the search backend.
+
+    The prefix index is rebuilt in the background whenever the index generation changes; until the
+    first build is done all prefixes go to the search backend.
+    """
+
+    def __init__(self, backend, generation_func):
+        """
+        Args:
+            backend (SearchBackend): The search backend (see common/search_backend.py).
+            generation_func (callable): Returns the current index generation.
+        """
+        self.backend = backend
+        self.generation_func = generation_func
+        self.local = None
+        self.generation = None
+        self._building = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_current(self):
+        generation = self.generation_func()
+        if generation is None or generation == self.generation:
+            return
+        with self._lock:
+            if self._building or (self._failed_at and time.monotonic() - self._failed_at < 30):
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild, args=(generation,), name='suggest-rebuild', daemon=True).start()
+
+    def _rebuild(self, generation):
+        try:
+            started = time.perf_counter()
+            local = build_prefix_index(self.backend.iter_documents(['name', 'tags', 'num_downloads']))
+            self.local, self.generation = local, generation
+            self._failed_at = None
+            logger.info(f"Built suggestion index with {len(local)} entries in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            logger.error(f"Error building suggestion index: {e}")
+        finally:
+            self._building = False
+
+    def warm_up(self):
+        """
+        Builds the prefix index of the current generation in the calling thread, e.g. before a worker serves.
+        """
+        generation = self.generation_func()
+        if generation is None or generation == self.generation:
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        self._rebuild(generation)
+
+    def suggest(self, prefix, size=SUGGEST_DEFAULT_SIZE):
+        """
+        Returns up to size suggestions for the prefix, each with only its id and text.
+        """
+        if len(normalize_prefix(prefix)) < SUGGEST_MIN_PREFIX:
+            return []
+        self._ensure_current()
+        local = self.local
+        if local is not None and len(normalize_prefix(prefix)) <= SUGGEST_LOCAL_MAX_PREFIX:
+            return local.lookup(prefix, size)
+        return self.complete(prefix, size)
+
+    def complete(self, prefix, size=SUGGEST_DEFAULT_SIZE):
+        """
+        Asks the search backend for completions and turns the matched tags and names into suggestions.
+        """
+        suggestions = []
+        for option in self.backend.complete(prefix, size):
+            source = option.get('_source', {})
+            tags = {normalize_prefix(tag): tag for tag in _as_list(source.get('tags')) if isinstance(tag, str)}
+            matched = normalize_prefix(option['text'])
+            if matched in tags:
+                suggestion = {'id': TAG_ID_PREFIX + matched, 'text': tags[matched].strip()}
+            else:
+                suggestion = {'id': option['_id'], 'text': ' '.join(str(source.get('name', '')).split())}
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return suggestions
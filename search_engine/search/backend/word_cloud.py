@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from common.facets import FACET_MAX_SIZE, count_values
+
+try:
+    from wordcloud import WordCloud
+except ImportError:  # Optional: without it word clouds cannot be rendered, only served from the cache
+    WordCloud = None
+
+logger = logging.getLogger(__name__)
+# fontTools logs every table it reads when the SVG font is subset
+logging.getLogger('fontTools').setLevel(logging.WARNING)
+
+# Content-addressed cache of rendered word clouds: one directory per frequency table, shared by all processes
+WORDCLOUD_DIR = os.getenv('WORDCLOUD_DIR', 'static/wordclouds')
+# Word clouds kept in the cache; the least recently used ones beyond this are removed
+WORDCLOUD_MAX_ENTRIES = int(os.getenv('WORDCLOUD_MAX_ENTRIES', 64))
+# The full word cloud at the path the frontend links to
+WORDCLOUD_LEGACY_PATH = 'static/wordcloud.png'
+# Every size is drawn from one layout computed at the base size, so the sizes of a cloud look alike
+WORDCLOUD_WIDTHS = (400, 800, 1600)
+WORDCLOUD_DEFAULT_WIDTH = 800
+WORDCLOUD_FORMATS = ('png', 'svg')
+BASE_WIDTH = 800
+BASE_HEIGHT = 400
+MAX_WORDS = 200
+# Fixed seed, so equal frequency tables always give the same picture
+LAYOUT_SEED = 42
+# Part of every cache key; bump it when the look of the clouds changes
+RENDER_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+# Colors of the words, picked per word, so no matplotlib colormap (and no pyplot import) is needed
+PALETTE = ['#440154', '#414487', '#2a788e', '#22a884', '#7ad151', '#1f5f8b', '#3b528b', '#21918c']
+
+
+def palette_color(word, font_size, position, orientation, random_state=None, **kwargs):
+    """
+    Color function of WordCloud; a word keeps its color in every cloud it appears in.
+    """
+    return PALETTE[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % len(PALETTE)]
+
+
+def tag_frequencies(backend, selected=None, date_range=None):
+    """
+    Counts the documents per tag with a terms aggregation of the search backend.
+
+    Args:
+        backend (SearchBackend): The search backend to aggregate in.
+        selected (dict): Selected facet values per field the documents must match (tags excluded).
+        date_range (dict): Publication date bounds 'gte' and 'lte'.
+
+    Returns:
+        dict: Tag -> number of documents.
+    """
+    selected = {field: values for field, values in (selected or {}).items() if field != 'tags'}
+    found = backend.facets('', selected=selected, date_range=date_range, size=FACET_MAX_SIZE)
+    return {bucket['key']: bucket['doc_count'] for bucket in found['facets']['tags'] if bucket['doc_count']}
+
+
+def resource_tag_frequencies(resources):
+    """
+    Counts the resources per tag in a list of resources, e.g. those of a snapshot.
+    """
+    return {bucket['key']: bucket['doc_count'] for bucket in count_values(resources, ['tags'])['tags']}
+
+
+def frequency_key(frequencies):
+    """
+    Content address of the word cloud of a frequency table: equal tables share their renderings.
+    """
+    payload = {'version': RENDER_VERSION, 'size': [BASE_WIDTH, BASE_HEIGHT], 'max_words': MAX_WORDS,
+               'frequencies': sorted(frequencies.items())}
+    return hashlib.sha1(json.dumps(payload).encode('utf-8')).hexdigest()
+
+
+class WordCloudService:
+    """
+    Renders tag frequency tables as word clouds in every width as PNG and SVG, into a content-addressed
+    directory.
+
+    A table whose cloud is already in the directory is not rendered again, whichever process rendered
+    it. Entries are complete directories moved into place, so readers never see a partial one, and the
+    least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, directory=WORDCLOUD_DIR, max_entries=WORDCLOUD_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        # Renders are CPU-bound; one at a time per process, so concurrent requests for a cloud render it once
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.reused = 0
+
+    def path(self, key, width=WORDCLOUD_DEFAULT_WIDTH, output_format='png'):
+        return os.path.join(self.directory, key, f"{width}.{output_format}")
+
+    def manifest(self, key):
+        """
+        Returns the manifest of a cached word cloud, or None if it is not in the cache.
+        """
+        try:
+            with open(os.path.join(self.directory, key, MANIFEST_FILE), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def render(self, frequencies):
+        """
+        Renders the word cloud of a frequency table in every width and format, unless it is cached.
+
+        Args:
+            frequencies (dict): Tag -> frequency.
+
+        Returns:
+            dict: 'key' of the cloud in the cache, whether it was 'rendered' now and the time taken.
+        """
+        if not frequencies:
+            raise LookupError("No tags to draw a word cloud from")
+        started = time.perf_counter()
+        key = frequency_key(frequencies)
+        with self._lock:
+            rendered = self.manifest(key) is None
+            if rendered:
+                self._render(key, frequencies)
+                self.rendered += 1
+            else:
+                self.reused += 1
+                self._touch(key)
+        if rendered:
+            self.evict()
+        return {'key': key, 'rendered': rendered, 'seconds': round(time.perf_counter() - started, 3)}
+
+    def _render(self, key, frequencies):
+        if WordCloud is None:
+            raise RuntimeError("The wordcloud package is not installed")
+        cloud = WordCloud(width=BASE_WIDTH, height=BASE_HEIGHT, background_color='white', max_words=MAX_WORDS,
+                          color_func=palette_color, random_state=LAYOUT_SEED)
+        cloud.generate_from_frequencies(frequencies)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(temporary)
+        try:
+            for width in WORDCLOUD_WIDTHS:
+                cloud.scale = width / BASE_WIDTH
+                cloud.to_image().save(os.path.join(temporary, f"{width}.png"), optimize=True)
+                with open(os.path.join(temporary, f"{width}.svg"), 'w', encoding='utf-8') as handle:
+                    # The font is embedded (subset to the characters used), so the SVG looks the same everywhere
+                    handle.write(cloud.to_svg(embed_font=True))
+            with open(os.path.join(temporary, MANIFEST_FILE), 'w', encoding='utf-8') as handle:
+                json.dump({'key': key, 'tags': len(frequencies), 'words': len(cloud.layout_),
+                           'widths': list(WORDCLOUD_WIDTHS), 'formats': list(WORDCLOUD_FORMATS)}, handle)
+            os.rename(temporary, os.path.join(self.directory, key))
+        except OSError:
+            # Another process moved the same cloud into place first
+            if self.manifest(key) is None:
+                raise
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    def _touch(self, key):
+        try:
+            os.utime(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+
+    def read(self, frequencies, width=WORDCLOUD_DEFAULT_WIDTH, output_format='png'):
+        """
+        Returns the bytes of the word cloud of a frequency table, rendering it first if it is not cached.
+
+        Args:
+            frequencies (dict): Tag -> frequency.
+            width (int): One of WORDCLOUD_WIDTHS.
+            output_format (str): 'png' or 'svg'.
+
+        Returns:
+            bytes: The image.
+        """
+        if width not in WORDCLOUD_WIDTHS or output_format not in WORDCLOUD_FORMATS:
+            raise ValueError(f"width must be one of {', '.join(map(str, WORDCLOUD_WIDTHS))} "
+                             f"and format one of {', '.join(WORDCLOUD_FORMATS)}")
+        key = self.render(frequencies)['key']
+        try:
+            with open(self.path(key, width, output_format), 'rb') as handle:
+                return handle.read()
+        except FileNotFoundError:
+            # Evicted by another process in between
+            with self._lock:
+                self._render(key, frequencies)
+            with open(self.path(key, width, output_format), 'rb') as handle:
+                return handle.read()
+
+    def publish(self, frequencies, path=WORDCLOUD_LEGACY_PATH):
+        """
+        Renders the word cloud of a frequency table if needed and copies its default size to `path`.
+
+        Returns:
+            dict: As render.
+        """
+        result = self.render(frequencies)
+        # Copied even if the cloud was cached: it may have been rendered on request, without being published
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(self.path(result['key']), temporary)
+        os.replace(temporary, path)
+        return result
+
+    def evict(self):
+        """
+        Removes the least recently used word clouds beyond max_entries.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_dir() and not entry.name.startswith('.')]
+        except FileNotFoundError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            logger.info(f"Evicted word cloud {entry.name}")
+
+    def stats(self):
+        return {'directory': self.directory, 'max_entries': self.max_entries,
+                'rendered': self.rendered, 'reused': self.reused}
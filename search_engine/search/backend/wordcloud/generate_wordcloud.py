@@ -1,31 +1,11 @@
-import requests
-import yaml
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
 import os
+import sys
 
-# URL to fetch the YAML file containing resources with associated tags
-GITHUB_YAML_URL = 'https://raw.githubusercontent.com/NFDI4BIOIMAGE/training/refs/heads/main/resources/nfdi4bioimage.yml'
-
-def fetch_yaml_data(url):
-    """
-    Fetches data from the specified YAML URL and parses it.
-    If successful, returns a list of resources; otherwise, an empty list.
-
-    Args:
-        url (str): The URL pointing to the YAML file.
-
-    Returns:
-        list: A list of resource entries from the YAML file or an empty list if fetching fails.
-    """
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        yaml_content = yaml.safe_load(response.text)
-        return yaml_content.get('resources', [])
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to fetch YAML data: {e}")
-        return []
+# The shared modules (common) and the word cloud service (word_cloud.py) are one level up, in the
+# application directory; the script is run as wordcloud/generate_wordcloud.py from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.snapshot import SnapshotSource  # noqa: E402
+from word_cloud import WordCloudService, resource_tag_frequencies  # noqa: E402
 
 def collect_tags(data):
     """
@@ -35,40 +15,33 @@ def collect_tags(data):
         data (list): A list of resource entries, each with associated tags.
 
     Returns:
-        dict: A dictionary where keys are tags, and values are their respective counts.
+        dict: A dictionary where keys are tags, and values are the number of resources carrying them.
     """
-    tag_counts = {}
-    for item in data:
-        tags = item.get('tags', [])
-        for tag in tags:
-            if tag in tag_counts:
-                tag_counts[tag] += 1
-            else:
-                tag_counts[tag] = 1
-    return tag_counts
+    return resource_tag_frequencies(data)
 
 def generate_word_cloud(tag_counts):
     """
-    Generates a word cloud image from tag frequencies and saves it locally.
+    Renders a word cloud from tag frequencies, unless one was already rendered for the same frequencies,
+    and publishes it locally.
 
     Args:
         tag_counts (dict): A dictionary of tags and their corresponding frequencies.
 
     Saves:
-        A word cloud image to 'static/wordcloud.png'.
+        The word cloud in every size as PNG and SVG under 'static/wordclouds/<hash>/', and the
+        800x400 PNG to 'static/wordcloud.png'.
     """
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate_from_frequencies(tag_counts)
-    wordcloud_path = 'static/wordcloud.png'
-    if not os.path.exists('static'):
-        os.makedirs('static')
-    wordcloud.to_file(wordcloud_path)
-    print(f"Word cloud saved to {wordcloud_path}")
+    result = WordCloudService().publish(tag_counts)
+    print(f"Word cloud {result['key']} {'rendered' if result['rendered'] else 'unchanged'}, "
+          f"saved to static/wordcloud.png")
 
 def main():
     """
-    Main execution function. Fetches YAML data, collects tag frequencies, and generates a word cloud.
+    Main execution function. Reads the resources of the current snapshot, collects tag frequencies,
+    and generates a word cloud. The indexer does the same from the index after every change; this
+    builds the word cloud from a snapshot without a search backend.
     """
-    data = fetch_yaml_data(GITHUB_YAML_URL)
+    data = SnapshotSource().resources()
     tag_counts = collect_tags(data)
     generate_word_cloud(tag_counts)
 
@@ -2,7 +2,32 @@ import React, { useState, useEffect, useRef } from 'react';
 import "../assets/styles/style.css";
 import robotAvatar from "../assets/images/avatar_robot.jpg";
 import userAvatar from "../assets/images/avatar_user.jpg";
-import axios from "axios";
+
+const CHAT_URL = "http://localhost:5002/api/chat";
+
+// Parses server-sent events from a fetch response body, calling onEvent(event, data) for each one
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      const data = [];
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data.push(line.slice(5).trim());
+      });
+      if (data.length) onEvent(event, JSON.parse(data.join("\n")));
+    }
+  }
+};
 
 const renderMessageWithLinks = (message) => {
   const urlRegex = /(https?:\/\/[^\s\)\]]*[^\s\)\]\.])/g;
@@ -33,6 +58,7 @@ const ChatbotWidget = () => {
   const [isFirstOpen, setIsFirstOpen] = useState(true);
   const [isThinking, setIsThinking] = useState(false);
   const chatContainerRef = useRef(null); 
+  const abortControllerRef = useRef(null);
 
   const toggleChatbot = () => {
     setIsOpen(!isOpen);
@@ -60,19 +86,53 @@ const ChatbotWidget = () => {
     setQuery("");
 
     let thinkingTimeout = setTimeout(() => setIsThinking(true), 1000);
-
-    try {
-      const res = await axios.post("http://localhost:5002/api/chat", { query });
+    const stopThinking = () => {
       clearTimeout(thinkingTimeout);
       setIsThinking(false);
-      setChatHistory([...newChatHistory, { sender: "bot", message: res.data.response }]);
+    };
+    const showReply = (message) => setChatHistory([...newChatHistory, { sender: "bot", message }]);
+
+    // Closing the stream (new question or widget unmounted) also stops the generation on the server
+    if (abortControllerRef.current) abortControllerRef.current.abort();
+    const controller = new AbortController();
+    abortControllerRef.current = controller;
+
+    try {
+      const res = await fetch(CHAT_URL, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+        body: JSON.stringify({ query, stream: true }),
+        signal: controller.signal,
+      });
+      if (res.status === 429 || res.status === 503) {
+        stopThinking();
+        showReply("The assistant is busy right now. Please try again in a moment.");
+        return;
+      }
+      if (!res.ok) throw new Error(`Chat request failed with status ${res.status}`);
+
+      let reply = "";
+      await readEventStream(res, (event, data) => {
+        if (event === "token") {
+          stopThinking();
+          reply += data.content;
+          showReply(reply);
+        } else if (event === "done") {
+          stopThinking();
+          showReply(data.response);
+        } else if (event === "error") {
+          throw new Error(data.error);
+        }
+      });
     } catch (error) {
-      clearTimeout(thinkingTimeout);
-      setIsThinking(false);
-      setChatHistory([...newChatHistory, { sender: "bot", message: "Error: Unable to get a response from the chatbot." }]);
+      if (error.name === "AbortError") return;
+      stopThinking();
+      showReply("Error: Unable to get a response from the chatbot.");
     }
   };
 
+  useEffect(() => () => abortControllerRef.current && abortControllerRef.current.abort(), []);
+
   const handleKeyDown = (e) => {
     if (e.key === "Enter" && !e.shiftKey) {
       e.preventDefault();
@@ -2,6 +2,11 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 
+// Suggestion contract with /api/suggest: nothing is requested below the minimum prefix length,
+// and requests are only sent once typing pauses for the debounce delay.
+const SUGGEST_MIN_PREFIX = 2;
+const SUGGEST_DEBOUNCE_MS = 150;
+
 const SearchBar = ({ onSearch }) => {
   const [query, setQuery] = useState('');
   const [suggestions, setSuggestions] = useState([]);
@@ -35,20 +40,32 @@ const SearchBar = ({ onSearch }) => {
     );
   };
 
-  // Fetch suggestions as the user types
+  // Fetch suggestions once the user pauses typing
   useEffect(() => {
-    if (query.trim() !== '') {
+    if (query.trim().length < SUGGEST_MIN_PREFIX) {
+      setSuggestions([]); // Clear suggestions if the query is too short
+      return undefined;
+    }
+
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
       axios
-        .get(`${backendUrl}/api/suggest?q=${encodeURIComponent(query)}`)  // Use the correct backend URL here
+        .get(`${backendUrl}/api/suggest`, { params: { q: query }, signal: controller.signal })
         .then((response) => {
           setSuggestions(response.data);
         })
         .catch((error) => {
-          console.error('Error fetching suggestions:', error);
+          if (!axios.isCancel(error)) {
+            console.error('Error fetching suggestions:', error);
+          }
         });
-    } else {
-      setSuggestions([]); // Clear suggestions if the query is empty
-    }
+    }, SUGGEST_DEBOUNCE_MS);
+
+    // Drop the pending request when the query changes again
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
   }, [query, backendUrl]);
 
   return (
@@ -72,15 +89,16 @@ const SearchBar = ({ onSearch }) => {
       </button>
       {suggestions.length > 0 && (
         <ul className="suggestion-list">
-          {suggestions.map((suggestion, index) => (
+          {suggestions.map((suggestion) => (
             <li 
-              key={index} 
+              key={suggestion.id} 
               onClick={() => {
-                handleSearch(suggestion.name, true);  // Pass suggestion to handleSearch with exact match
+                // Resource names are searched as exact matches, tag suggestions (ids starting with 'tag:') as regular queries
+                handleSearch(suggestion.text, !suggestion.id.startsWith('tag:'));
                 setSuggestions([]);  // Clear suggestions when one is clicked
               }}
             >
-              <span>{highlightQuery(suggestion.name || suggestion.description, query)}</span> {/* Highlight the matched part */}
+              <span>{highlightQuery(suggestion.text, query)}</span> {/* Highlight the matched part */}
             </li>
           ))}
         </ul>
@@ -15,19 +15,23 @@ const SearchResults = ({ results, hasSearched, query, selectedFilters }) => {
 
   return (
     <div>
-      {results.map((result, index) => (
-        <ResultsBox
-          key={index}
-          title={result._source.name}
-          url={result._source.url}
-          authors={result._source.authors}
-          description={result._source.description}
-          license={result._source.license}
-          type={result._source.type}
-          tags={result._source.tags}
-          highlights={highlightFields}
-        />
-      ))}
+      {results.map((result, index) => {
+        // Paged search returns flat hits, the unpaged search raw Elasticsearch hits
+        const source = result._source || result;
+        return (
+          <ResultsBox
+            key={result.id || result._id || index}
+            title={source.name}
+            url={source.url}
+            authors={source.authors}
+            description={source.description}
+            license={source.license}
+            type={source.type}
+            tags={source.tags}
+            highlights={highlightFields}
+          />
+        );
+      })}
     </div>
   );
 };
@@ -8,9 +8,16 @@ import Pagination from '../components/Pagination';
 import PagesSelection from '../components/PagesSelection';
 import { Spinner } from 'react-bootstrap';
 
+// Facets counted by the search backend; the date facets are still derived from the loaded materials
+const FACET_FIELDS = ['tags', 'type', 'license', 'authors'];
+// Values listed per facet; the filter cards list every value, so ask for the backend's maximum (FACET_MAX_SIZE)
+const FACET_SIZE = 1000;
+
 const MaterialPage = () => {
+  const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:5001';
   const [materials, setMaterials] = useState([]);
   const [facets, setFacets] = useState({});
+  const [serverFacets, setServerFacets] = useState(null);
   const [selectedFilters, setSelectedFilters] = useState({});
   const [hasLoaded, setHasLoaded] = useState(false);
   const [error, setError] = useState(null);
@@ -26,10 +33,9 @@ const MaterialPage = () => {
 
     const fetchData = async () => {
       try {
-        const response = await fetch('http://localhost:5000/api/materials', {
-          method: 'GET',
-          headers: { 'Content-Type': 'application/json' },
-        });
+        // A plain GET without custom headers needs no CORS preflight, and the browser cache revalidates it
+        // with the ETag, so unchanged materials come back as a 304 without a body
+        const response = await fetch('http://localhost:5000/api/materials');
 
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
@@ -62,11 +68,36 @@ const MaterialPage = () => {
     fetchData();
   }, []);
 
+  // Fetch facet counts for the current selection; each facet is counted with the other facets' selection applied
+  const facetSelection = JSON.stringify(
+    FACET_FIELDS.map((field) => [field, Array.isArray(selectedFilters[field]) ? selectedFilters[field] : []])
+  );
+
+  useEffect(() => {
+    const controller = new AbortController();
+    const params = new URLSearchParams({ size: FACET_SIZE });
+    JSON.parse(facetSelection).forEach(([field, values]) => {
+      values.forEach((value) => params.append(field, value));
+    });
+
+    fetch(`${backendUrl}/api/facets?${params.toString()}`, { signal: controller.signal })
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then((data) => setServerFacets(data.facets))
+      .catch((err) => {
+        if (err.name !== 'AbortError') {
+          console.error('Error fetching facets:', err);
+        }
+      });
+
+    return () => controller.abort();
+  }, [backendUrl, facetSelection]);
+
   const generateFacets = (data) => {
-    const authors = {};
-    const licenses = {};
-    const types = {};
-    const tags = {};
     const publicationDates = {};
     const submissionDates = {};
 
@@ -74,40 +105,6 @@ const MaterialPage = () => {
     let minYear = currentYear;
 
     data.forEach((item) => {
-      // Ensure fields are arrays if they are not
-      const itemAuthors = Array.isArray(item.authors)
-        ? item.authors
-        : (typeof item.authors === 'string' ? [item.authors] : []);
-      const itemLicenses = Array.isArray(item.license)
-        ? item.license.filter(Boolean)
-        : (item.license ? [item.license] : []);
-      const itemTypes = Array.isArray(item.type)
-        ? item.type.filter(Boolean)
-        : (item.type ? [item.type] : []);
-      const itemTags = Array.isArray(item.tags)
-        ? item.tags
-        : (item.tags ? [item.tags] : []);
-
-      // Authors
-      itemAuthors.forEach((author) => {
-        authors[author] = (authors[author] || 0) + 1;
-      });
-
-      // Licenses
-      itemLicenses.forEach((license) => {
-        licenses[license] = (licenses[license] || 0) + 1;
-      });
-
-      // Types
-      itemTypes.forEach((t) => {
-        types[t] = (types[t] || 0) + 1;
-      });
-
-      // Tags
-      itemTags.forEach((tag) => {
-        tags[tag] = (tags[tag] || 0) + 1;
-      });
-
       // Publication Dates
       const pubDate = item.publication_date;
       let year = null;
@@ -144,22 +141,15 @@ const MaterialPage = () => {
       max: currentYear,
     }));
 
-    const mapToArray = (obj, keyName = 'key') =>
-      Object.entries(obj).map(([key, doc_count]) => ({
-        [keyName]: key,
-        doc_count,
-      }));
-
     setFacets({
-      authors: mapToArray(authors),
-      licenses: mapToArray(licenses),
-      types: mapToArray(types),
-      tags: mapToArray(tags),
       publication_dates: Object.entries(publicationDates).map(([year, count]) => ({
         year: parseInt(year, 10),
         count,
       })),
-      submission_dates: mapToArray(submissionDates),
+      submission_dates: Object.entries(submissionDates).map(([key, doc_count]) => ({
+        key,
+        doc_count,
+      })),
     });
   };
 
@@ -252,9 +242,11 @@ const MaterialPage = () => {
   // Destructure facets with default values
   const {
     authors = [],
-    licenses = [],
-    types = [],
+    license: licenses = [],
+    type: types = [],
     tags = [],
+  } = serverFacets || {};
+  const {
     publication_dates = [],
     submission_dates = []
   } = facets;
@@ -310,7 +302,7 @@ const MaterialPage = () => {
         <div className="row">
           <div className="col-md-3">
             <h3>Filter by</h3>
-            {Object.keys(facets).length > 0 ? (
+            {serverFacets || Object.keys(facets).length > 0 ? (
               <>
                 {renderFilterCard("Licenses", licenses, "license")}
                 {renderFilterCard("Authors", authors, "authors")}
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useLocation } from 'react-router-dom';
 import axios from 'axios';
+import { DropdownButton, Dropdown } from 'react-bootstrap';
 import SearchBar from '../components/SearchBar';
 import SearchResults from '../components/SearchResults';
 import FilterCard from '../components/FilterCard';
@@ -10,6 +11,14 @@ import 'bootstrap/dist/css/bootstrap.min.css';
 import '../assets/styles/style.css';
 import bgSearchbar from '../assets/images/bg-searchbar.jpg';
 
+// Sort options offered on the results page, as sort and order parameters of /api/search
+const SORT_OPTIONS = [
+  { label: 'Relevance', sort: 'relevance', order: 'desc' },
+  { label: 'Newest first', sort: 'date', order: 'desc' },
+  { label: 'Oldest first', sort: 'date', order: 'asc' },
+  { label: 'Most downloaded', sort: 'downloads', order: 'desc' },
+];
+
 const SearchResultsPage = () => {
   const location = useLocation();
   const queryParams = new URLSearchParams(location.search);
@@ -17,113 +26,69 @@ const SearchResultsPage = () => {
   const exactMatch = queryParams.get('exact_match') === 'true';
 
   const [results, setResults] = useState([]);
+  const [totalResults, setTotalResults] = useState(0);
   const [hasSearched, setHasSearched] = useState(false);
   const [selectedFilters, setSelectedFilters] = useState({});
+  const [dateRange, setDateRange] = useState(null);
+  const [sortOption, setSortOption] = useState(SORT_OPTIONS[0]);
   const [currentPage, setCurrentPage] = useState(1);
   const [itemsPerPage, setItemsPerPage] = useState(10);
   const [facets, setFacets] = useState({
     authors: [],
-    types: [],
+    type: [],
     tags: [],
-    licenses: [],
-    publication_dates: [],
-    submission_dates: []
+    license: []
   });
+  const [publicationYears, setPublicationYears] = useState([]);
 
   const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:5001';
 
   useEffect(() => {
     setSelectedFilters({});
+    setDateRange(null);
+    setCurrentPage(1);
   }, [query]);
 
+  // Filtering, sorting and paging run in the backend; only the current page is fetched
   useEffect(() => {
     if (query) {
+      const params = new URLSearchParams({
+        q: query,
+        exact_match: exactMatch,
+        size: itemsPerPage,
+        page: currentPage,
+        facets: true,
+        sort: sortOption.sort,
+        order: sortOption.order,
+      });
+      Object.entries(selectedFilters).forEach(([field, values]) => {
+        values.forEach((value) => params.append(field, value));
+      });
+      if (dateRange) {
+        params.append('date_from', dateRange[0]);
+        params.append('date_to', dateRange[1]);
+      }
+
       axios
-        .get(`${backendUrl}/api/search?q=${encodeURIComponent(query)}&exact_match=${exactMatch}`)
+        .get(`${backendUrl}/api/search?${params.toString()}`)
         .then((response) => {
-          setResults(response.data);
+          setResults(response.data.hits);
+          setTotalResults(response.data.total);
+          setFacets(response.data.facets);
+          // Keep the slider scale of the unfiltered dates while a range is selected
+          if (!dateRange) {
+            setPublicationYears(response.data.publication_years);
+          }
           setHasSearched(true);
-
-          const authorsCount = {};
-          const licensesCount = {};
-          const typesCount = {};
-          const tagsCount = {};
-          const publicationDatesCount = {};
-          const submissionDatesCount = {};
-
-          response.data.forEach((item) => {
-            const source = item._source || {};
-            
-            // Ensure authors is an array
-            const itemAuthors = Array.isArray(source.authors)
-              ? source.authors
-              : (typeof source.authors === 'string' ? [source.authors] : []);
-
-            itemAuthors.forEach((author) => {
-              authorsCount[author] = (authorsCount[author] || 0) + 1;
-            });
-
-            // Ensure license is an array
-            const itemLicenses = Array.isArray(source.license)
-              ? source.license
-              : (source.license ? [source.license] : []);
-
-            itemLicenses.forEach((license) => {
-              licensesCount[license] = (licensesCount[license] || 0) + 1;
-            });
-
-            // Ensure type is an array
-            const itemTypes = Array.isArray(source.type)
-              ? source.type
-              : (source.type ? [source.type] : []);
-
-            itemTypes.forEach((type) => {
-              typesCount[type] = (typesCount[type] || 0) + 1;
-            });
-
-            // Ensure tags is an array
-            const itemTags = Array.isArray(source.tags)
-              ? source.tags
-              : (source.tags ? [source.tags] : []);
-
-            itemTags.forEach((tag) => {
-              tagsCount[tag] = (tagsCount[tag] || 0) + 1;
-            });
-
-            if (source.publication_date) {
-              const year = source.publication_date.toString().split('-')[0];
-              publicationDatesCount[year] = (publicationDatesCount[year] || 0) + 1;
-            }
-
-            if (source.submission_date) {
-              // Extract the full date in 'YYYY-MM-DD' format
-              const submissionDate = source.submission_date.split('T')[0];
-              submissionDatesCount[submissionDate] = (submissionDatesCount[submissionDate] || 0) + 1;
-            }
-          });
-
-          setFacets({
-            authors: Object.keys(authorsCount).map((key) => ({ key, doc_count: authorsCount[key] })),
-            licenses: Object.keys(licensesCount).map((key) => ({ key, doc_count: licensesCount[key] })),
-            types: Object.keys(typesCount).map((key) => ({ key, doc_count: typesCount[key] })),
-            tags: Object.keys(tagsCount).map((key) => ({ key, doc_count: tagsCount[key] })),
-            publication_dates: Object.keys(publicationDatesCount).map((key) => ({
-              key,
-              doc_count: publicationDatesCount[key],
-            })),
-            submission_dates: Object.keys(submissionDatesCount).map((key) => ({
-              key,
-              doc_count: submissionDatesCount[key],
-            })),
-          });
         })
         .catch((error) => {
           console.error('Error fetching search results:', error);
         });
     }
-  }, [query, exactMatch, backendUrl]);
+  }, [query, exactMatch, selectedFilters, dateRange, sortOption, currentPage, itemsPerPage, backendUrl]);
 
   const handleFilter = (field, key) => {
+    setCurrentPage(1);
     setSelectedFilters((prevFilters) => {
       const currentSelections = prevFilters[field] || [];
 
@@ -141,53 +106,25 @@ const SearchResultsPage = () => {
     });
   };
 
-  const correctFieldName = (field) => {
-    switch (field) {
-      case 'types':
-        return 'type';
-      case 'licenses':
-        return 'license';
-      case 'publication_dates':
-        return 'publication_date';
-      case 'submission_dates':
-        return 'submission_date';
-      default:
-        return field;
-    }
+  const yearBounds = {
+    min: publicationYears.length ? Math.min(...publicationYears.map((d) => d.year)) : null,
+    max: new Date().getFullYear(),
   };
 
-  const filteredResults = results.filter((result) => {
-    return Object.keys(selectedFilters).every((field) => {
-      if (!selectedFilters[field].length) return true;
-
-      const actualField = correctFieldName(field);
-      const resultField = result._source?.[actualField] || result[actualField];
-
-      if (!resultField) return false;
-
-      if (field === 'publication_dates' && resultField) {
-        const publicationYear = resultField.toString().split('-')[0];
-        return selectedFilters[field].includes(publicationYear);
-      }
-
-      if (field === 'submission_dates' && resultField) {
-        const submissionDate = resultField.toString().split('T')[0];
-        return selectedFilters[field].includes(submissionDate);
-      }
-
-      // Ensure comparison is done with arrays
-      const fieldValues = Array.isArray(resultField)
-        ? resultField
-        : (typeof resultField === 'string' ? [resultField] : []);
+  const handleDateRangeChange = (field, range) => {
+    const isFullRange = range[0] <= yearBounds.min && range[1] >= yearBounds.max;
+    setCurrentPage(1);
+    setDateRange(isFullRange ? null : range);
+  };
 
-      return selectedFilters[field].some((filter) => fieldValues.includes(filter));
-    });
-  });
+  const handleSortChange = (option) => {
+    setSortOption(option);
+    setCurrentPage(1);
+  };
 
-  const indexOfLastResult = currentPage * itemsPerPage;
-  const indexOfFirstResult = indexOfLastResult - itemsPerPage;
-  const currentResults = filteredResults.slice(indexOfFirstResult, indexOfLastResult);
-  const totalPages = Math.ceil(filteredResults.length / itemsPerPage);
+  const indexOfFirstResult = (currentPage - 1) * itemsPerPage;
+  const indexOfLastResult = indexOfFirstResult + results.length;
+  const totalPages = Math.ceil(totalResults / itemsPerPage);
 
   const handlePageChange = (pageNumber) => {
     setCurrentPage(pageNumber);
@@ -220,16 +157,22 @@ const SearchResultsPage = () => {
             <h3>Filter by</h3>
             {Object.keys(facets).length > 0 ? (
               <>
-                <FilterCard title="Licenses" items={facets.licenses || []} field="licenses" selectedFilters={selectedFilters} handleFilter={handleFilter} />
+                <FilterCard title="Licenses" items={facets.license || []} field="license" selectedFilters={selectedFilters} handleFilter={handleFilter} />
                 <FilterCard title="Authors" items={facets.authors || []} field="authors" selectedFilters={selectedFilters} handleFilter={handleFilter} />
-                <FilterCard title="Types" items={facets.types || []} field="types" selectedFilters={selectedFilters} handleFilter={handleFilter} />
+                <FilterCard title="Types" items={facets.type || []} field="type" selectedFilters={selectedFilters} handleFilter={handleFilter} />
                 <FilterCard title="Tags" items={facets.tags || []} field="tags" selectedFilters={selectedFilters} handleFilter={handleFilter} />
 
-                {facets.publication_dates && (
-                  <FilterCard title="Publication Date" items={facets.publication_dates} field="publication_dates" selectedFilters={selectedFilters} handleFilter={handleFilter} />
-                )}
-                {facets.submission_dates && (
-                  <FilterCard title="Submission Date" items={facets.submission_dates} field="submission_dates" selectedFilters={selectedFilters} handleFilter={handleFilter} />
+                {publicationYears.length > 0 && (
+                  <FilterCard
+                    title="Publication Date"
+                    field="publication_date"
+                    selectedFilters={selectedFilters}
+                    handleFilter={handleFilter}
+                    dateRange={yearBounds}
+                    onDateRangeChange={handleDateRangeChange}
+                    publicationData={publicationYears}
+                    minYear={yearBounds.min}
+                  />
                 )}
               </>
             ) : (
@@ -240,14 +183,26 @@ const SearchResultsPage = () => {
           <div className="col-md-9">
             <div className="d-flex justify-content-between align-items-center mb-3">
               <p>
-                Showing {indexOfFirstResult + 1} to{' '}
-                {indexOfLastResult > filteredResults.length ? filteredResults.length : indexOfLastResult} of{' '}
-                {filteredResults.length} results
+                Showing {totalResults ? indexOfFirstResult + 1 : 0} to {indexOfLastResult} of {totalResults} results
               </p>
-              <PagesSelection itemsPerPage={itemsPerPage} onItemsPerPageChange={handleItemsPerPageChange} />
+              <div className="d-flex">
+                <DropdownButton
+                  id="dropdown-sort-button"
+                  title={`Sort: ${sortOption.label}`}
+                  variant="outline-secondary"
+                  className="me-2"
+                >
+                  {SORT_OPTIONS.map((option) => (
+                    <Dropdown.Item key={option.label} onClick={() => handleSortChange(option)}>
+                      {option.label}
+                    </Dropdown.Item>
+                  ))}
+                </DropdownButton>
+                <PagesSelection itemsPerPage={itemsPerPage} onItemsPerPageChange={handleItemsPerPageChange} />
+              </div>
             </div>
 
-            <SearchResults results={currentResults} hasSearched={hasSearched} query={query} selectedFilters={selectedFilters} />
+            <SearchResults results={results} hasSearched={hasSearched} query={query} selectedFilters={selectedFilters} />
 
             <Pagination currentPage={currentPage} totalPages={totalPages} onPageChange={handlePageChange} />
           </div>
@@ -82,8 +82,9 @@ const SubmitMaterialsPage = () => {
 
     try {
       const response = await axios.post('http://localhost:5000/api/submit_material', formData);
-      if (response.status === 201) {
-        setSubmissionStatus('Submission successful');
+      // Submissions are queued and proposed for review in a pull request shortly after
+      if (response.status === 202) {
+        setSubmissionStatus('Submission received, it will be proposed for review shortly');
         setFormData({
           authors: '',
           license: [],
@@ -98,6 +99,11 @@ const SubmitMaterialsPage = () => {
       }
     } catch (error) {
       console.error('Error submitting material:', error);
+      if (error.response && error.response.status === 409) {
+        const existing = error.response.data.duplicates[0];
+        setSubmissionStatus(`This material is already in the catalogue as "${existing.name}"`);
+        return;
+      }
       setSubmissionStatus('Error submitting material');
     } finally {
       setIsSubmitting(false);
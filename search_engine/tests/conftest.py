@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The services are run as scripts from their own directories (see their Dockerfiles); make their modules
+# and the shared ones importable the same way
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ['appsubmitter_backend', 'chatbot', os.path.join('search', 'backend'), '']:
+    sys.path.insert(0, os.path.join(ROOT, path))
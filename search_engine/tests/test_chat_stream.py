@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+from benchmarks.llm_stub import LLMStub
+from benchmarks.synthetic import generate_resources
+from common.embeddings import EmbeddingIndex
+from common.local_search import LocalSearchBackend
+from common.snapshot import normalize_resource
+from reindex import document_id
+from suggestions import completion_source
+
+TOKENS = 5
+
+
+@pytest.fixture(scope='module')
+def llm():
+    with LLMStub(first_token_delay=0, token_delay=0, tokens=TOKENS) as stub:
+        yield stub
+
+
+@pytest.fixture(scope='module')
+def chatbot(llm, tmp_path_factory):
+    # The LLM client is configured from the environment when the chatbot is imported
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('KISSKI_API_BASE', llm.url)
+        patch.setenv('KISSKI_API_KEY', 'test')
+        import chatbot
+
+    # Retrieval from a small embedded index; without embeddings the chatbot ranks by keywords only
+    directory = str(tmp_path_factory.mktemp('search-index'))
+    resources = [normalize_resource(item) for item in generate_resources(200, seed=7)]
+    LocalSearchBackend(directory, document_id, completion_source).sync(resources, force_rebuild=True)
+    chatbot.backend = LocalSearchBackend(directory)
+    chatbot.embedding_index = EmbeddingIndex(str(tmp_path_factory.mktemp('embeddings')))
+    return chatbot
+
+
+def parse_events(body):
+    """
+    Splits a server-sent event stream into (event, data) tuples.
+    """
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        if not block.strip():
+            continue
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def chat(chatbot, query):
+    response = chatbot.app.test_client().post('/api/chat', json={'query': query, 'stream': True})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return parse_events(response.data)
+
+
+def test_stream_sends_sources_then_tokens_then_done(chatbot, llm):
+    events = chat(chatbot, 'napari segmentation tutorial')
+
+    names = [event for event, _ in events]
+    assert names == ['sources'] + ['token'] * TOKENS + ['done']
+    sources = events[0][1]
+    assert sources and all('name' in source for source in sources)
+
+    tokens = [data['content'] for event, data in events if event == 'token']
+    assert tokens == [f"token{position} " for position in range(TOKENS)]
+    done = events[-1][1]
+    assert done['response'] == ''.join(tokens).strip()
+    assert done['cached'] is False
+    assert done['timing']['first_token_ms'] <= done['timing']['total_ms']
+
+
+def test_repeated_question_is_answered_from_the_cache_as_one_token(chatbot, llm):
+    chat(chatbot, 'fiji macro course')
+    requests_before = llm.requests
+
+    events = chat(chatbot, '  Fiji   macro course ')
+
+    assert [event for event, _ in events] == ['sources', 'token', 'done']
+    assert events[-1][1]['cached'] is True
+    assert events[1][1]['content'] == events[-1][1]['response']
+    assert llm.requests == requests_before
+
+
+def test_no_documents_ends_after_the_sources(chatbot, llm):
+    requests_before = llm.requests
+
+    events = chat(chatbot, 'qqqqxyzzy')
+
+    assert events == [('sources', []), ('done', {'response': 'No relevant documents found.',
+                                                 'timing': events[-1][1]['timing']})]
+    assert llm.requests == requests_before
+
+
+def test_upstream_failure_ends_the_stream_with_an_error_event(chatbot, llm, monkeypatch):
+    monkeypatch.setattr(llm, 'error_rate', 1.0)
+    monkeypatch.setattr(llm, 'error_status', 400)
+
+    events = chat(chatbot, 'omero data management')
+
+    assert [event for event, _ in events] == ['sources', 'error']
+    assert events[0][1]
+    assert events[-1][1]['error']
+
+
+class Tokens:
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        return iter(['token0 '])
+
+    def close(self):
+        self.closed = True
+
+
+def test_disconnect_before_the_first_token_closes_the_subscription(chatbot):
+    tokens = Tokens()
+    packed = {'documents': [{'name': 'Napari basics'}], 'report': {}}
+    events = chatbot.stream_chat(packed, 1.0, None, tokens)
+
+    assert next(events).startswith('event: sources')
+    events.close()
+    assert tokens.closed
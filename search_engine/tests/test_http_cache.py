@@ -0,0 +1,64 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from common.http_cache import ResponseCache, cached_response
+
+app = Flask(__name__)
+cache = ResponseCache()
+
+
+def failing_stream(chunks):
+    yield '['
+    yield from chunks
+    raise RuntimeError("point-in-time expired")
+
+
+@app.route('/stream')
+def stream():
+    try:
+        return cached_response('v1', lambda: failing_stream(['{"name": "%d"}' % i for i in range(200)]),
+                               stream=True, cache=cache)
+    except RuntimeError as e:
+        return {'error': str(e)}, 500
+
+
+@app.route('/complete')
+def complete():
+    return cached_response('v2', lambda: [{'name': str(i)} for i in range(200)], cache=cache)
+
+
+@pytest.fixture
+def client():
+    cache.clear()
+    return app.test_client()
+
+
+def test_failed_stream_is_not_cached_for_compressing_clients(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 500
+    assert 'ETag' not in response.headers
+    assert cache.stats()['entries'] == 0
+    # The next client produces the body again instead of getting a truncated one
+    assert client.get('/stream', headers={'Accept-Encoding': 'gzip'}).status_code == 500
+
+
+def test_failed_stream_aborts_plain_clients_with_a_weak_etag(client):
+    with pytest.raises(RuntimeError):
+        response = client.get('/stream')
+        assert response.headers['ETag'] == 'W/"v1"'
+        response.get_data()
+    assert cache.stats()['entries'] == 0
+
+
+def test_complete_body_is_cached_and_revalidated(client):
+    response = client.get('/complete', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))[0] == {'name': '0'}
+    assert cache.stats()['entries'] == 1
+
+    revalidated = client.get('/complete', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
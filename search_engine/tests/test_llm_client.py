@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+from benchmarks.llm_stub import LLMStub
+from llm_client import LLMService, UpstreamError
+
+
+def service(stub, request_timeout):
+    service = LLMService(stub.url, 'test', 'test-model')
+    service.client.request_timeout = request_timeout
+    return service
+
+
+def test_slow_first_chunk_fails_at_the_request_deadline_and_frees_the_slot():
+    with LLMStub(first_token_delay=2.0, token_delay=0, tokens=3) as stub:
+        llm = service(stub, request_timeout=0.5)
+        started = time.monotonic()
+        with pytest.raises(UpstreamError, match="request timeout"):
+            llm.complete("Hello")
+
+        assert time.monotonic() - started < 1.5
+        assert llm.admission.active == 0
+
+
+def test_generation_within_the_deadline_streams_every_piece():
+    with LLMStub(first_token_delay=0, token_delay=0, tokens=3) as stub:
+        llm = service(stub, request_timeout=0.5)
+        assert llm.complete("Hello") == "token0 token1 token2 "
+        assert llm.admission.active == 0
@@ -0,0 +1,23 @@
+from elasticsearch import Elasticsearch
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.synthetic import generate_resources
+from common.snapshot import normalize_resource
+from reindex import rebuild, resolve_alias
+
+
+def test_rebuilds_within_the_same_second_get_their_own_generation():
+    resources = [normalize_resource(item) for item in generate_resources(20, seed=3)]
+    stub = ElasticsearchStub(latency=0).start()
+    try:
+        es = Elasticsearch(stub.url)
+        rebuild(es, resources, alias='materials', keep=2)
+        first, _ = resolve_alias(es, 'materials')
+        rebuild(es, resources, alias='materials', keep=2)
+        second, _ = resolve_alias(es, 'materials')
+
+        assert first != second
+        assert sorted(es.indices.get(index='materials-*').keys()) == sorted([first, second])
+        assert es.count(index='materials')['count'] == len(resources)
+    finally:
+        stub.stop()
@@ -0,0 +1,53 @@
+import threading
+import time
+import types
+
+from common.resource_source import ResourceSource
+
+YAML = b"resources:\n- name: Napari basics\n  url: https://example.org/napari"
+
+
+class Session:
+    """
+    Answers every GET with the YAML file, waiting for `release` first when one is given.
+    """
+
+    def __init__(self, release=None):
+        self.release = release
+        self.calls = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return types.SimpleNamespace(status_code=200, content=YAML, headers={}, raise_for_status=lambda: None)
+
+
+def wait_for_refreshes():
+    for thread in threading.enumerate():
+        if thread.name == 'resource-source-refresh':
+            thread.join(5)
+
+
+def test_stale_copy_is_served_while_one_refresh_runs_at_a_time():
+    release = threading.Event()
+    session = Session()
+    source = ResourceSource(url='https://example.org/resources.yml', ttl=0, session=session)
+    assert source.resources()[0]['name'] == 'Napari basics'
+    assert session.calls == 1
+
+    # Readers neither wait for the running refresh nor start another one
+    session.release = release
+    started = time.monotonic()
+    for _ in range(5):
+        assert source.resources()[0]['name'] == 'Napari basics'
+    assert time.monotonic() - started < 1
+    release.set()
+    wait_for_refreshes()
+    assert session.calls == 2
+    assert source._refreshing is False
+
+    # Once it has finished, the next stale read starts another refresh
+    source.resources()
+    wait_for_refreshes()
+    assert session.calls == 3
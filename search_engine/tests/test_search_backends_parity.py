@@ -0,0 +1,76 @@
+import random
+
+import pytest
+from elasticsearch import Elasticsearch
+
+from benchmarks.bench_search_backends import completion_texts, ids, make_queries
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.synthetic import generate_resources
+from common.local_search import LocalSearchBackend
+from common.search_backend import ElasticsearchBackend
+from common.snapshot import normalize_resource
+from reindex import document_id, reindex
+from suggestions import completion_source
+
+DOCS = 300
+QUERIES = 40
+SEED = 11
+
+
+@pytest.fixture(scope='module')
+def resources():
+    return [normalize_resource(item) for item in generate_resources(DOCS, seed=SEED)]
+
+
+@pytest.fixture(scope='module')
+def backends(resources, tmp_path_factory):
+    """
+    The same catalogue indexed into the embedded engine and into the Elasticsearch stand-in.
+    """
+    directory = str(tmp_path_factory.mktemp('local-index'))
+    LocalSearchBackend(directory, document_id, completion_source).sync(resources, force_rebuild=True)
+    stub = ElasticsearchStub(latency=0).start()
+    try:
+        es = Elasticsearch(stub.url, request_timeout=60)
+        reindex(es, resources, force_rebuild=True)
+        yield LocalSearchBackend(directory), ElasticsearchBackend(es)
+    finally:
+        stub.stop()
+
+
+@pytest.fixture(scope='module')
+def queries(resources):
+    return make_queries(resources, QUERIES, random.Random(SEED))
+
+
+@pytest.mark.parametrize('kind', ['browse', 'keyword', 'phrase'])
+def test_totals_and_facets_are_identical(backends, queries, kind):
+    local, elasticsearch = backends
+    for query in queries[kind]:
+        local_found = local.search(**{**query, 'with_facets': True})
+        es_found = elasticsearch.search(**{**query, 'with_facets': True})
+        assert local_found['total'] == es_found['total'], query
+        assert local_found['facets'] == es_found['facets'], query
+        assert local_found['publication_years'] == es_found['publication_years'], query
+
+
+def test_browse_pages_are_identical(backends, queries):
+    local, elasticsearch = backends
+    for query in queries['browse']:
+        for offset in (0, query['size']):
+            paged = {**query, 'offset': offset}
+            assert ids(local.search(**paged)) == ids(elasticsearch.search(**paged)), paged
+
+
+def test_completion_texts_are_identical(backends, resources):
+    local, elasticsearch = backends
+    rng = random.Random(SEED)
+    prefixes = [resource['name'][:rng.randint(3, 12)] for resource in rng.sample(resources, QUERIES)]
+    # Prefixes are analyzed like the inputs: case and surrounding whitespace do not matter
+    prefixes += [prefix.upper() + ' ' for prefix in prefixes[:5]]
+    suggested = 0
+    for prefix in prefixes:
+        texts = completion_texts(local, prefix)
+        assert texts == completion_texts(elasticsearch, prefix), prefix
+        suggested += bool(texts)
+    assert suggested == len(prefixes)
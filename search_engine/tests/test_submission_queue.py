@@ -0,0 +1,213 @@
+import time
+import types
+
+import pytest
+
+import submission_queue as queue_module
+from submission_queue import DONE, FAILED, PROCESSING, QUEUED, SubmissionQueue, SubmissionWorker
+
+YAML_FILE = 'nfdi4bioimage.yml'
+ORIGINAL_YAML = "resources:\n- name: Existing\n  url: https://example.org/existing"
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeRepository:
+    """
+    Records the calls create_pull_request makes on a PyGithub Repository.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.files = {f"resources/{YAML_FILE}": ORIGINAL_YAML}
+        self.refs = []
+        self.updates = []
+        self.pulls = []
+
+    def get_contents(self, path):
+        return types.SimpleNamespace(decoded_content=self.files[path].encode('utf-8'), sha='file-sha')
+
+    def get_branch(self, name):
+        return types.SimpleNamespace(commit=types.SimpleNamespace(sha='base-sha'))
+
+    def create_git_ref(self, ref, sha):
+        self.refs.append(ref)
+
+    def update_file(self, path, message, content, sha, branch):
+        self.updates.append({'path': path, 'message': message, 'content': content, 'branch': branch})
+
+    def create_pull(self, title, body, head, base):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("GitHub is unavailable")
+        self.pulls.append({'title': title, 'body': body, 'head': head, 'base': base})
+        return types.SimpleNamespace(html_url=f"https://github.com/example/training/pull/{len(self.pulls)}")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(queue_module, 'time', types.SimpleNamespace(time=clock.time, strftime=time.strftime,
+                                                                   gmtime=time.gmtime))
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SubmissionQueue(str(tmp_path / 'submissions.sqlite3'))
+
+
+@pytest.fixture
+def create_pull_request(tmp_path, monkeypatch):
+    # Should the submitter open its own queue, it must not be the one of the working directory
+    monkeypatch.setattr(queue_module, 'SUBMISSION_QUEUE_PATH', str(tmp_path / 'submitter.sqlite3'))
+    import submitter
+    return submitter.create_pull_request
+
+
+def submission(name):
+    return {'name': name, 'authors': 'Jane Doe', 'url': f"https://example.org/{name.lower()}",
+            'type': ['Tutorial'], 'tags': ['Python'], 'submission_date': '2024-05-01'}
+
+
+def worker(queue, repo, create_pull_request):
+    return SubmissionWorker(queue, lambda payloads: create_pull_request(repo, YAML_FILE, payloads), window=60)
+
+
+def test_submissions_within_the_window_are_batched(queue, clock):
+    first = queue.enqueue(submission('First'))
+    clock.advance(30)
+    second = queue.enqueue(submission('Second'))
+
+    # The oldest submission has not waited for the whole window yet
+    assert queue.claim_batch(window=60) == (None, [])
+
+    clock.advance(31)
+    queue.enqueue(submission('Late'))
+    batch_id, jobs = queue.claim_batch(window=60)
+    assert batch_id is not None
+    assert [job_id for job_id, _ in jobs][:2] == [first, second]
+    assert len(jobs) == 3
+    assert queue.claim_batch(window=60) == (None, [])
+    assert queue.counts() == {PROCESSING: 3}
+
+
+def test_full_batch_is_claimed_before_the_window_ends(queue, clock):
+    for number in range(3):
+        queue.enqueue(submission(f"Material {number}"))
+    batch_id, jobs = queue.claim_batch(window=60, limit=2)
+    assert len(jobs) == 2
+    assert queue.counts() == {PROCESSING: 2, QUEUED: 1}
+
+
+def test_one_pull_request_per_batch(queue, clock, create_pull_request):
+    repo = FakeRepository()
+    submission_worker = worker(queue, repo, create_pull_request)
+    ids = [queue.enqueue(submission(name)) for name in ('Napari basics', 'Fiji macros', 'OMERO intro')]
+
+    assert submission_worker.process_batch() is False
+    clock.advance(61)
+    assert submission_worker.process_batch() is True
+
+    assert len(repo.pulls) == 1 and len(repo.updates) == 1 and len(repo.refs) == 1
+    content = repo.updates[0]['content']
+    assert content.startswith(ORIGINAL_YAML)
+    for name in ('Napari basics', 'Fiji macros', 'OMERO intro'):
+        assert f"name: {name}" in content
+        assert f"- {name}" in repo.pulls[0]['body']
+    assert repo.updates[0]['message'] == "Add 3 new entries"
+    assert repo.pulls[0]['head'] == repo.updates[0]['branch']
+
+    jobs = [queue.get(job_id) for job_id in ids]
+    assert {job['status'] for job in jobs} == {DONE}
+    assert {job['batch_id'] for job in jobs} == {jobs[0]['batch_id']}
+    assert jobs[0]['result'] == {'pull_request': 'https://github.com/example/training/pull/1',
+                                 'branch': repo.pulls[0]['head'], 'entries': 3}
+
+    # A later submission goes into a pull request of its own
+    queue.enqueue(submission('Deep learning'))
+    clock.advance(61)
+    assert submission_worker.process_batch() is True
+    assert len(repo.pulls) == 2
+    assert repo.updates[1]['message'] == "Add 1 new entry"
+    assert "name: Napari basics" not in repo.updates[1]['content'].replace(ORIGINAL_YAML, '')
+
+
+def test_failed_batch_is_retried_with_backoff(queue, clock, create_pull_request):
+    repo = FakeRepository(failures=1)
+    submission_worker = worker(queue, repo, create_pull_request)
+    job_id = queue.enqueue(submission('Napari basics'))
+    clock.advance(61)
+
+    assert submission_worker.process_batch() is True
+    job = queue.get(job_id)
+    assert job['status'] == QUEUED and job['attempts'] == 1
+    assert "GitHub is unavailable" in job['error']
+    assert repo.pulls == []
+
+    # Not before retry_base (30s) has passed
+    clock.advance(29)
+    assert submission_worker.process_batch() is False
+    clock.advance(2)
+    assert submission_worker.process_batch() is True
+
+    job = queue.get(job_id)
+    assert job['status'] == DONE and job['attempts'] == 2 and job['error'] is None
+    assert len(repo.pulls) == 1
+
+
+def test_fail_backs_off_exponentially_and_gives_up(queue, clock):
+    job_id = queue.enqueue(submission('Napari basics'))
+    queue.claim_batch(window=0)
+    for attempt, delay in [(1, 30), (2, 60)]:
+        queue.fail([job_id], RuntimeError(f"attempt {attempt}"), max_attempts=3, retry_base=30)
+        assert queue.get(job_id)['status'] == QUEUED
+        clock.advance(delay - 1)
+        assert queue.claim_batch(window=0) == (None, [])
+        clock.advance(1)
+        _, jobs = queue.claim_batch(window=0)
+        assert [claimed for claimed, _ in jobs] == [job_id]
+
+    queue.fail([job_id], RuntimeError("attempt 3"), max_attempts=3, retry_base=30)
+    job = queue.get(job_id)
+    assert job['status'] == FAILED and job['attempts'] == 3 and job['error'] == "attempt 3"
+    clock.advance(10_000)
+    assert queue.claim_batch(window=0) == (None, [])
+
+
+def test_requeue_stale_returns_jobs_of_dead_workers(queue, clock):
+    job_id = queue.enqueue(submission('Napari basics'))
+    _, jobs = queue.claim_batch(window=0)
+    assert queue.get(job_id)['status'] == PROCESSING
+
+    clock.advance(599)
+    assert queue.requeue_stale(600) == 0
+    clock.advance(2)
+    assert queue.requeue_stale(600) == 1
+
+    job = queue.get(job_id)
+    assert job['status'] == QUEUED and job['attempts'] == 1
+    _, jobs = queue.claim_batch(window=0)
+    assert [claimed for claimed, _ in jobs] == [job_id]
+    assert queue.get(job_id)['attempts'] == 2
+
+
+def test_submitter_opens_its_queue_on_first_use(tmp_path, monkeypatch, create_pull_request):
+    import submitter
+    path = tmp_path / 'queue.sqlite3'
+    monkeypatch.setattr(queue_module, 'SUBMISSION_QUEUE_PATH', str(path))
+    monkeypatch.setattr(submitter, '_submissions', {'queue': None, 'worker': None})
+    assert not path.exists()
+
+    assert submitter.current_submission_queue().path == str(path)
+    assert path.exists()
+    assert submitter.current_submission_queue() is submitter._submissions['queue']